@@ -0,0 +1,170 @@
+"""Admission control and load shedding.
+
+Handlers are sync and run on a bounded threadpool; without a limit in
+front of it every request queues for a thread and, under overload, latency
+climbs for everyone until clients time out. ``AdmissionMiddleware`` caps
+the requests handed to the app and queues the rest per route class with a
+wait budget: reads give up quickly with 503 + Retry-After, logins and
+report uploads wait longer and have reserved slots that browsing load
+cannot take.
+
+All state lives on the event loop thread, like the metrics, so no locks.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, Mapping, Optional
+
+from metrics import REGISTRY
+
+AUTH, UPLOADS, READS = "auth", "uploads", "reads"
+# Order in which a freed shared slot is handed to waiters
+PRIORITY = (AUTH, UPLOADS, READS)
+SHARED = "shared"
+
+ADMISSION_WAIT = REGISTRY.histogram(
+    "http_admission_wait_seconds", "Time requests spent queued for admission.", ("class",)
+)
+ADMISSION_SHED = REGISTRY.counter(
+    "http_admission_shed_total", "Requests rejected with 503 by admission control.", ("class",)
+)
+ADMISSION_IN_FLIGHT = REGISTRY.gauge(
+    "http_admission_in_flight", "Admitted requests currently running.", ("class",)
+)
+
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """Admission class for a request, or None to let it through untouched."""
+    if method == "OPTIONS" or path == "/metrics" or path.startswith("/api/health/"):
+        return None
+    if method == "POST" and path in ("/api/login", "/api/usuarios"):
+        return AUTH
+    if method in ("GET", "HEAD"):
+        return READS
+    # Report uploads and the other writes share the write reservation
+    return UPLOADS
+
+
+class AdmissionController:
+    """Slots for running requests: one reserved pool per priority class
+    plus a shared pool any class may use.
+
+    A freed slot is handed straight to a waiter, so there is never a free
+    slot while a compatible request is queued.
+    """
+
+    def __init__(self, max_concurrency: int, reserved: Mapping[str, int],
+                 queue_budget_s: Mapping[str, float], max_queue: int = 256):
+        self.reserved = {cls: reserved.get(cls, 0) for cls in PRIORITY}
+        self.shared = max_concurrency - sum(self.reserved.values())
+        if self.shared < 1:
+            raise ValueError("admission max concurrency must exceed the reserved slots")
+        self.queue_budget_s = dict(queue_budget_s)
+        self.max_queue = max_queue
+        self.in_flight = {cls: 0 for cls in PRIORITY}
+        self._used = {cls: 0 for cls in PRIORITY}
+        self._used[SHARED] = 0
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {cls: deque() for cls in PRIORITY}
+
+    def _take(self, cls: str) -> Optional[str]:
+        if self._used[cls] < self.reserved[cls]:
+            self._used[cls] += 1
+            return cls
+        if self._used[SHARED] < self.shared:
+            self._used[SHARED] += 1
+            return SHARED
+        return None
+
+    def _admit(self, cls: str, pool: str) -> str:
+        self.in_flight[cls] += 1
+        ADMISSION_IN_FLIGHT.inc((cls,))
+        return pool
+
+    async def acquire(self, cls: str) -> Optional[str]:
+        """Return the pool the request runs on, or None if it was shed."""
+        pool = self._take(cls)
+        if pool is not None:
+            return self._admit(cls, pool)
+        waiters = self._waiters[cls]
+        if len(waiters) >= self.max_queue:
+            return None
+        waiter = asyncio.get_running_loop().create_future()
+        waiters.append(waiter)
+        try:
+            await asyncio.wait([waiter], timeout=self.queue_budget_s[cls])
+        except asyncio.CancelledError:
+            # Client went away while queued; give back a slot handed to us
+            if waiter.done() and not waiter.cancelled():
+                self._release_pool(waiter.result())
+            else:
+                waiters.remove(waiter)
+            raise
+        if not waiter.done():
+            waiters.remove(waiter)
+            return None
+        return self._admit(cls, waiter.result())
+
+    def release(self, cls: str, pool: str) -> None:
+        self.in_flight[cls] -= 1
+        ADMISSION_IN_FLIGHT.dec((cls,))
+        self._release_pool(pool)
+
+    def _release_pool(self, pool: str) -> None:
+        # Hand off without freeing: reserved slots go to their own class,
+        # shared slots to the highest priority class that is waiting
+        candidates = PRIORITY if pool == SHARED else (pool,)
+        for cls in candidates:
+            waiters = self._waiters[cls]
+            while waiters:
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(pool)
+                    return
+        self._used[pool] -= 1
+
+    def queued(self, cls: str) -> int:
+        return len(self._waiters[cls])
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware in front of the app; see the module docstring."""
+
+    def __init__(self, app, controller: AdmissionController, retry_after_s: int = 1):
+        self.app = app
+        self.controller = controller
+        self.retry_after_s = retry_after_s
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        cls = route_class(scope["method"], scope["path"])
+        if cls is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        pool = await self.controller.acquire(cls)
+        ADMISSION_WAIT.observe((cls,), time.perf_counter() - start)
+        if pool is None:
+            ADMISSION_SHED.inc((cls,))
+            await self._reject(send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(cls, pool)
+
+    async def _reject(self, send):
+        body = b'{"detail":"Servidor saturado, intenta de nuevo en unos segundos"}'
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(self.retry_after_s).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,139 @@
+"""Report lifecycle and archival of reports that are no longer live.
+
+A new report is ``pendiente`` until a moderator makes it ``activo`` or
+``rechazado``. An active report stays so until its author marks it
+``resuelto`` or it goes untouched for long enough to become ``expirado``.
+Reports that were rejected or left the active state and have not changed
+for ``despues`` move from ``reportes`` to ``reportes_archivo``, their
+photos optionally to a photo store (see fotos.py), so the hot collection
+and its indexes only hold recent data.
+
+The job works in small batches with a pause between them, so it never
+competes with requests for long, and only one worker across the
+deployment runs it at a time (a lease in ``trabajos``). Copying is
+idempotent: an interrupted batch is copied again and then deleted.
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+import resumenes
+from fotos import decodificar
+
+logger = logging.getLogger("recicla_contigo.archivo")
+
+PENDIENTE, RECHAZADO = "pendiente", "rechazado"
+ACTIVO, RESUELTO, EXPIRADO = "activo", "resuelto", "expirado"
+ESTADOS = (PENDIENTE, RECHAZADO, ACTIVO, RESUELTO, EXPIRADO)
+ARCHIVABLES = (RECHAZADO, RESUELTO, EXPIRADO)
+
+ARCHIVO = "reportes_archivo"
+_DUPLICADO = 11000
+
+
+def expirar(db, antes: datetime, ahora: Optional[datetime] = None, lote: int = 500) -> int:
+    """Expire active reports not modified since ``antes``, a batch at a
+    time, and move them to ``expirado`` in the daily rollups."""
+    ahora = ahora or datetime.utcnow()
+    # Mongo keeps milliseconds; the stamp is matched below
+    ahora = ahora.replace(microsecond=ahora.microsecond // 1000 * 1000)
+    candidatos = {"estado": ACTIVO, "actualizado_en": {"$lt": antes}}
+    expirados = 0
+    while True:
+        ids = [r["_id"] for r in db.reportes.find(candidatos, {"_id": 1}).limit(lote)]
+        if not ids:
+            return expirados
+        db.reportes.update_many(
+            {"_id": {"$in": ids}, **candidatos},
+            # A state change is a change: delta sync must send the tombstone
+            {"$set": {"estado": EXPIRADO, "expirado_en": ahora, "actualizado_en": ahora}},
+        )
+        # Exactly the ones this batch expired, not those resolved meanwhile
+        hechos = list(db.reportes.find(
+            {"_id": {"$in": ids}, "estado": EXPIRADO, "expirado_en": ahora}, {"fecha": 1, "zona": 1}
+        ))
+        resumenes.registrar(db, hechos, ACTIVO, EXPIRADO)
+        expirados += len(hechos)
+
+
+def _mover_foto(reporte: dict, fotos) -> None:
+    foto = reporte.get("foto_base64")
+    if not foto:
+        return
+    try:
+        contenido, tipo = decodificar(foto)
+    except ValueError:
+        logger.warning("report %s has an unreadable photo, archiving it inline", reporte["_id"])
+        return
+    reporte["foto_ref"] = fotos.guardar(f"reportes/{reporte['_id']}", contenido, tipo)
+    reporte["foto_tipo"] = tipo
+    del reporte["foto_base64"]
+
+
+def archivar(db, antes: datetime, fotos=None, lote: int = 200, pausa_s: float = 0.2,
+             max_lotes: Optional[int] = None) -> int:
+    """Move finished reports unchanged since ``antes`` to the archive."""
+    candidatos = {
+        "estado": {"$in": list(ARCHIVABLES)},
+        "actualizado_en": {"$lt": antes},
+        # Side effects still pending stay until the outbox is done with them
+        "outbox": {"$exists": False},
+    }
+    movidos = lotes = 0
+    while max_lotes is None or lotes < max_lotes:
+        reportes = list(db.reportes.find(candidatos).sort("actualizado_en", 1).limit(lote))
+        if not reportes:
+            break
+        if fotos is not None:
+            for reporte in reportes:
+                _mover_foto(reporte, fotos)
+        archivado_en = datetime.utcnow()
+        for reporte in reportes:
+            reporte["archivado_en"] = archivado_en
+        try:
+            db[ARCHIVO].insert_many(reportes, ordered=False)
+        except BulkWriteError as exc:
+            # Already copied by an interrupted run
+            if any(e["code"] != _DUPLICADO for e in exc.details["writeErrors"]):
+                raise
+        # Filtered again: a report changed since it was read stays hot
+        ids = [r["_id"] for r in reportes]
+        movidos += db.reportes.delete_many({"_id": {"$in": ids}, **candidatos}).deleted_count
+        lotes += 1
+        if len(reportes) < lote:
+            break
+        time.sleep(pausa_s)
+    return movidos
+
+
+def tomar_turno(db, trabajo: str, duracion: timedelta, ahora: Optional[datetime] = None) -> bool:
+    """Lease ``trabajo`` for ``duracion``; False if another worker holds it."""
+    ahora = ahora or datetime.utcnow()
+    try:
+        db.trabajos.find_one_and_update(
+            {"_id": trabajo, "hasta": {"$lt": ahora}},
+            {"$set": {"hasta": ahora + duracion}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # The document exists and the lease has not run out
+        return False
+    return True
+
+
+def ensure_indexes(db) -> None:
+    # Expiry and archival both scan by state and last change
+    db.reportes.create_index([("estado", 1), ("actualizado_en", 1)])
+    db[ARCHIVO].create_index([("fecha", -1)])
+    db[ARCHIVO].create_index([("zona", 1), ("fecha", -1)])
+    db[ARCHIVO].create_index([("usuario_id", 1), ("fecha", -1)])
+    db[ARCHIVO].create_index(
+        [("descripcion", "text"), ("direccion", "text")],
+        name="archivo_texto",
+        default_language="spanish",
+        weights={"descripcion": 3, "direccion": 1},
+    )
@@ -0,0 +1,85 @@
+"""Search helpers: query parsing for the report text search and highlight
+offsets computed in Python.
+
+Mongo's text index already stems Spanish and ignores accents when
+matching, but it does not say where a document matched. ``resaltar``
+approximates that: it folds accents and case the same way, applies a light
+suffix stemmer and returns character offsets into the original text, so the
+app can mark the matches without any HTML in the payload.
+"""
+
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+_PALABRA = re.compile(r"\w+")
+# Longest first; a light stemmer, close enough to Snowball for highlighting
+_SUFIJOS = ("amientos", "imientos", "amiento", "imiento", "aciones", "uciones",
+            "acion", "ucion", "mente", "idad", "ables", "ibles", "able", "ible",
+            "ados", "idos", "adas", "idas", "ado", "ido", "ada", "ida",
+            "es", "as", "os", "s", "a", "o", "e")
+_MIN_RAIZ = 3
+# Spanish stopwords (accent-folded). The text index drops them when
+# matching, so highlighting them would mark words that did not match.
+_VACIAS = frozenset("""
+a al algo algunas algunos ante antes como con contra cual cuando de del desde donde
+durante e el ella ellas ellos en entre era eran es esa esas ese eso esos esta estaba
+estan estas este esto estos fue fueron ha hay la las le les lo los mas me mi mis mucho
+muy nada ni no nos nosotros o otra otras otro otros para pero poco por porque que quien
+se sea ser si sin sobre su sus tambien tan te tiene tienen todo todos tu tus un una
+unas uno unos y ya yo
+""".split())
+
+Bbox = Tuple[float, float, float, float]
+
+
+def plegar(texto: str) -> str:
+    """Lowercase and drop accents, keeping one character per character so
+    offsets into the result are offsets into the original."""
+    return "".join(unicodedata.normalize("NFD", c)[0].lower() for c in texto)
+
+
+def raiz(palabra: str) -> str:
+    for sufijo in _SUFIJOS:
+        if palabra.endswith(sufijo) and len(palabra) - len(sufijo) >= _MIN_RAIZ:
+            return palabra[: -len(sufijo)]
+    return palabra
+
+
+def terminos(q: str) -> List[str]:
+    """Stemmed, accent-folded terms of a query, without stopwords or
+    duplicates."""
+    vistos = []
+    for palabra in _PALABRA.findall(plegar(q)):
+        if palabra in _VACIAS:
+            continue
+        r = raiz(palabra)
+        if len(r) >= 2 and r not in vistos:
+            vistos.append(r)
+    return vistos
+
+
+def resaltar(texto: Optional[str], raices: List[str]) -> List[List[int]]:
+    """[start, end) offsets of the words in ``texto`` matching any root."""
+    if not texto or not raices:
+        return []
+    return [
+        [m.start(), m.end()]
+        for m in _PALABRA.finditer(plegar(texto))
+        if any(raiz(m.group()).startswith(r) or m.group().startswith(r) for r in raices)
+    ]
+
+
+def resaltados(reporte: dict, raices: List[str], campos=("descripcion", "direccion")) -> Dict[str, List[List[int]]]:
+    return {campo: resaltar(reporte.get(campo), raices) for campo in campos}
+
+
+def parse_bbox(valor: str) -> Bbox:
+    """``minLon,minLat,maxLon,maxLat`` as in GeoJSON bounding boxes."""
+    partes = [float(p) for p in valor.split(",")]
+    if len(partes) != 4:
+        raise ValueError("bbox needs four numbers")
+    min_lon, min_lat, max_lon, max_lat = partes
+    if not (-180 <= min_lon <= max_lon <= 180 and -90 <= min_lat <= max_lat <= 90):
+        raise ValueError("bbox out of range")
+    return min_lon, min_lat, max_lon, max_lat
@@ -0,0 +1,443 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence
+
+import orjson
+
+from metrics import REGISTRY
+
+logger = logging.getLogger("recicla_contigo.cache")
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache with a per-entry time to live.
+
+    Sync handlers run on the threadpool, so every operation takes the lock;
+    loaders passed to ``get_or_set`` run outside it.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key: Hashable, loader: Callable[[], Any],
+                   ttl: Optional[float] = None) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.set(key, value, ttl)
+        return value
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution.
+
+    The first caller (the leader) runs ``fn``; callers arriving while it is
+    still running block and receive the same result or exception.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+        if leader:
+            try:
+                call.value = fn()
+            except BaseException as exc:
+                call.error = exc
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+
+# Shared (L2) stores. Values are bytes; keys are strings.
+
+class LocalSharedStore:
+    """In-process stand-in for a shared store such as Redis.
+
+    Used for single-process deployments and tests: every cache in the
+    process shares one dict and invalidation messages are delivered
+    synchronously to all subscribers.
+    """
+
+    def __init__(self):
+        self._data = TTLCache(maxsize=100_000, ttl=3600)
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        return [self._data.get(key) for key in keys]
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._data.set(key, value, ttl)
+
+    def delete(self, keys: Sequence[str]) -> None:
+        for key in keys:
+            self._data.delete(key)
+
+    def publish(self, channel: str, message: bytes) -> None:
+        with self._lock:
+            callbacks = list(self._subscribers.get(channel, ()))
+        for callback in callbacks:
+            callback(message)
+
+    def subscribe(self, channel: str, callback: Callable[[bytes], None]) -> None:
+        with self._lock:
+            callbacks = self._subscribers.setdefault(channel, [])
+            if callback not in callbacks:
+                callbacks.append(callback)
+
+    def ping(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class RedisSharedStore:
+    """Redis-backed L2 with pub/sub invalidation across workers and pods."""
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_URL points at Redis but the redis package is not installed")
+        # Short socket timeouts: a slow Redis must degrade to L1 and Mongo,
+        # not hold request threads. The pub/sub connection blocks on reads
+        # by design, so it gets its own client without them.
+        self._redis = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._bus = redis.Redis.from_url(url)
+        self._pubsub = self._bus.pubsub(ignore_subscribe_messages=True)
+        self._thread = None
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        return self._redis.mget(keys) if keys else []
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._redis.set(key, value, px=max(1, int(ttl * 1000)))
+
+    def delete(self, keys: Sequence[str]) -> None:
+        if keys:
+            self._redis.delete(*keys)
+
+    def publish(self, channel: str, message: bytes) -> None:
+        self._redis.publish(channel, message)
+
+    def subscribe(self, channel: str, callback: Callable[[bytes], None]) -> None:
+        self._pubsub.subscribe(**{channel: lambda msg: callback(msg["data"])})
+        if self._thread is None:
+            self._thread = self._pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def ping(self) -> None:
+        self._redis.ping()
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._thread.stop()
+            self._thread = None
+        self._pubsub.close()
+        self._bus.close()
+        self._redis.close()
+
+
+def open_shared_store(url: str):
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSharedStore(url)
+    return LocalSharedStore()
+
+
+# Process-wide default L2 until create_app() attaches the configured store
+LOCAL_STORE = LocalSharedStore()
+INVALIDATION_CHANNEL = "recicla_contigo:cache:invalidate"
+# Lifetime of a namespace's version key; when it lapses (or is evicted) the
+# next read starts a new version, which only costs one round of misses
+VERSION_TTL = 30 * 24 * 3600
+_caches: List["TwoLevelCache"] = []
+# Background refreshes for stale-while-revalidate; small on purpose, a
+# refresh that cannot get a thread just waits and the stale value keeps
+# being served meanwhile
+_refresher = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+
+
+class _CacheCollector:
+    name = "cache_lookups_total"
+    documentation = "Cache lookups by cache and result (l1_hit, stale, l2_hit, miss, coalesced)."
+    kind = "counter"
+
+    def samples(self) -> List[str]:
+        lines = []
+        for cache in _caches:
+            for result, value in (("l1_hit", cache.hits_l1), ("stale", cache.hits_stale),
+                                  ("l2_hit", cache.hits_l2), ("miss", cache.misses),
+                                  ("coalesced", cache.flights.coalesced)):
+                lines.append(f'{self.name}{{cache="{cache.namespace}",result="{result}"}} {value}')
+        return lines
+
+
+REGISTRY.register(_CacheCollector())
+
+
+class TwoLevelCache:
+    """In-process LRU (L1) in front of a shared store (L2).
+
+    Writers call ``invalidate``: the key is dropped from L2 and a message
+    on ``INVALIDATION_CHANNEL`` makes every worker drop it from its L1, so
+    a profile edited on one worker is not served stale by another.
+
+    L2 keys carry the namespace's current version, read in the same round
+    trip as the entries. Dropping a whole namespace writes a new version,
+    one key whatever the size of the store; entries under older versions
+    are never read again and expire on their own.
+
+    ``get_or_set`` runs at most one loader per key per worker at a time
+    (concurrent misses wait for it) and, with ``stale_ttl``, keeps serving
+    an expired L1 value while a single background refresh replaces it, so
+    an expiry never sends a burst of identical queries to Mongo.
+    Invalidated keys are never served stale.
+    """
+
+    def __init__(self, namespace: str, l1_maxsize: int = 1024, ttl: float = 60,
+                 stale_ttl: float = 0, store=None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        # L1 values are (value, fresh_until); entries live ttl + stale_ttl
+        self.l1 = TTLCache(maxsize=l1_maxsize, ttl=ttl)
+        self.flights = SingleFlight()
+        self._refreshing: set = set()
+        self._refresh_lock = threading.Lock()
+        self.hits_l1 = self.hits_stale = self.hits_l2 = self.misses = 0
+        # Bumped on every invalidation so a load that started before it
+        # does not write its (now outdated) result back
+        self._generation = 0
+        # Lets this cache skip the echo of its own invalidation messages
+        self._origen = uuid.uuid4().hex
+        self._version_key = f"{namespace}:@version"
+        # Last version seen in L2; None until the first read
+        self._version: Optional[bytes] = None
+        self.store = None
+        self.attach(store or LOCAL_STORE)
+        _caches.append(self)
+
+    def attach(self, store) -> None:
+        self.store = store
+        self._version = None
+        self._clear_l1()
+        store.subscribe(INVALIDATION_CHANNEL, self._on_message)
+
+    @staticmethod
+    def _name(key: Hashable) -> str:
+        return ":".join(map(str, key)) if isinstance(key, tuple) else str(key)
+
+    def _key(self, key: Hashable) -> str:
+        return f"{self.namespace}:{self._name(key)}"
+
+    def _store_key(self, key: Hashable, version: Optional[bytes]) -> str:
+        return f"{self.namespace}:{(version or b'-').decode()}:{self._name(key)}"
+
+    def _read(self, keys: Sequence[Hashable]) -> List[Optional[bytes]]:
+        """L2 values of ``keys`` under the current version, which is read
+        in the same call; values fetched under an outdated one are misses."""
+        version = self._version
+        found = self.store.get_many([self._version_key] + [self._store_key(k, version) for k in keys])
+        current = found[0]
+        if current is None:
+            current = self._new_version()
+        if current != version:
+            self._version = current
+            return [None] * len(keys)
+        return found[1:]
+
+    def _current_version(self, refresh: bool = False) -> bytes:
+        if refresh or self._version is None:
+            self._read([])
+        return self._version
+
+    def _new_version(self) -> bytes:
+        version = uuid.uuid4().hex[:12].encode()
+        self.store.set(self._version_key, version, VERSION_TTL)
+        return version
+
+    def _set_l1(self, key: Hashable, value: bytes, ttl: float, stale_ttl: float) -> None:
+        self.l1.set(key, (value, time.monotonic() + ttl), ttl + stale_ttl)
+
+    def _clear_l1(self) -> None:
+        self._generation += 1
+        self.l1.clear()
+
+    def get_many(self, keys: Sequence[Hashable]) -> Dict[Hashable, bytes]:
+        found = {}
+        missing = []
+        now = time.monotonic()
+        for key in keys:
+            entry = self.l1.get(key)
+            if entry is None or entry[1] <= now:
+                missing.append(key)
+            else:
+                found[key] = entry[0]
+        self.hits_l1 += len(found)
+        if missing:
+            for key, value in zip(missing, self._read(missing)):
+                if value is not None:
+                    found[key] = value
+                    self._set_l1(key, value, self.ttl, 0)
+                    self.hits_l2 += 1
+                else:
+                    self.misses += 1
+        return found
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+
+    def set(self, key: Hashable, value: bytes, ttl: Optional[float] = None,
+            stale_ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        stale_ttl = self.stale_ttl if stale_ttl is None else stale_ttl
+        self._set_l1(key, value, ttl, stale_ttl)
+        self.store.set(self._store_key(key, self._current_version()), value, ttl)
+
+    def get_or_set(self, key: Hashable, loader: Callable[[], bytes],
+                   ttl: Optional[float] = None, stale_ttl: Optional[float] = None) -> bytes:
+        ttl = self.ttl if ttl is None else ttl
+        stale_ttl = self.stale_ttl if stale_ttl is None else stale_ttl
+        entry = self.l1.get(key)
+        if entry is not None:
+            value, fresh_until = entry
+            if fresh_until > time.monotonic():
+                self.hits_l1 += 1
+                return value
+            self.hits_stale += 1
+            with self._refresh_lock:
+                start = key not in self._refreshing
+                self._refreshing.add(key)
+            if start:
+                _refresher.submit(self._refresh, key, loader, ttl, stale_ttl)
+            return value
+        return self.flights.do(key, lambda: self._load(key, loader, ttl, stale_ttl))
+
+    def _load(self, key: Hashable, loader: Callable[[], bytes], ttl: float,
+              stale_ttl: float) -> bytes:
+        generation = self._generation
+        # L2 may already hold a copy loaded by another worker
+        value = self._read([key])[0]
+        if value is not None:
+            self.hits_l2 += 1
+            if generation == self._generation:
+                self._set_l1(key, value, ttl, stale_ttl)
+            return value
+        self.misses += 1
+        value = loader()
+        if generation == self._generation:
+            self.set(key, value, ttl, stale_ttl)
+        return value
+
+    def _refresh(self, key: Hashable, loader: Callable[[], bytes], ttl: float,
+                 stale_ttl: float) -> None:
+        try:
+            self.flights.do(key, lambda: self._load(key, loader, ttl, stale_ttl))
+        except Exception as exc:
+            # Keeps serving the stale value; errors while Mongo is down are
+            # expected, so no traceback per attempt
+            logger.warning("background refresh of %s failed: %r", self._key(key), exc)
+        finally:
+            with self._refresh_lock:
+                self._refreshing.discard(key)
+
+    def invalidate(self, *keys: Hashable) -> None:
+        """Drop keys everywhere; with no keys, drop the whole namespace."""
+        if keys:
+            self._generation += 1
+            for key in keys:
+                self.l1.delete(key)
+            version = self._current_version(refresh=True)
+            self.store.delete([self._store_key(k, version) for k in keys])
+            wire_keys = [self._key(k) for k in keys]
+        else:
+            self._clear_l1()
+            self._version = self._new_version()
+            wire_keys = None
+        self.store.publish(INVALIDATION_CHANNEL, orjson.dumps({
+            "ns": self.namespace, "keys": wire_keys, "origen": self._origen,
+        }))
+
+    def _on_message(self, raw: bytes) -> None:
+        try:
+            message = orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            return
+        if message.get("ns") != self.namespace or message.get("origen") == self._origen:
+            return
+        if message.get("keys") is None:
+            self._clear_l1()
+            return
+        self._generation += 1
+        wire_keys = set(message["keys"])
+        self.l1.delete_where(lambda key: self._key(key) in wire_keys)
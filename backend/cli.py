@@ -0,0 +1,65 @@
+"""Maintenance commands, run from backend/ with the app's environment:
+
+  python cli.py reconstruir-resumenes --desde 2023-01-01
+  python cli.py sembrar-ranking
+  python cli.py sembrar-actualizado
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+import typer
+
+import archivo
+import database
+import puntajes
+import resumenes
+from config import Settings
+
+app = typer.Typer(no_args_is_help=True)
+
+
+@app.callback()
+def main():
+    database.connect(Settings.from_env().mongo)
+
+
+@app.command("reconstruir-resumenes")
+def reconstruir_resumenes(
+    desde: datetime = typer.Option(..., formats=["%Y-%m-%d"], help="First local day to rebuild."),
+    hasta: Optional[datetime] = typer.Option(None, formats=["%Y-%m-%d"], help="Last local day (today)."),
+    ventana_dias: int = typer.Option(31, min=1, help="Days rebuilt per batch."),
+):
+    """Rebuild the daily rollups from live and archived reports."""
+    fin = hasta.date() if hasta else date.fromisoformat(resumenes.dia(datetime.utcnow()))
+    db = database.get_db()
+    ini = desde.date()
+    while ini <= fin:
+        lote_fin = min(ini + timedelta(days=ventana_dias - 1), fin)
+        contados = resumenes.reconstruir(db, ini, lote_fin, ("reportes", archivo.ARCHIVO),
+                                         ventana_dias=ventana_dias)
+        typer.echo(f"{ini} .. {lote_fin}: {contados} reportes")
+        ini = lote_fin + timedelta(days=1)
+    database.close()
+
+
+@app.command("sembrar-ranking")
+def sembrar_ranking():
+    """Seed the all-time district leaderboard from balances and redemptions."""
+    typer.echo(f"{puntajes.sembrar_total(database.get_db())} usuarios")
+    database.close()
+
+
+@app.command("sembrar-actualizado")
+def sembrar_actualizado():
+    """Give reports written before delta sync existed an actualizado_en
+    (their fecha), so sync sends them. Run once; it scans the collection."""
+    resultado = database.get_db().reportes.update_many(
+        {"actualizado_en": {"$exists": False}}, [{"$set": {"actualizado_en": "$fecha"}}]
+    )
+    typer.echo(f"{resultado.modified_count} reportes")
+    database.close()
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,131 @@
+"""Columnar encodings of the map markers.
+
+The default map payload is a list of objects repeating every key for every
+marker. These layouts send one array per field instead:
+
+- coordinates as float32 (5 decimals in JSON, about a metre; float32 holds
+  no more than that at Ventanilla's longitudes)
+- dates as whole seconds, the newest one in full and then the distance to
+  the previous marker (markers are newest first, so deltas are >= 0)
+- author names once each, with one index per marker
+
+``json_columnar`` keeps it JSON. ``binario`` packs the numeric columns into
+little-endian typed arrays the app can view without parsing:
+
+  offset  type                 field
+  0       4 bytes              magic "RCM1"
+  4       uint32               n, number of markers
+  8       uint32               length of the trailing JSON
+  12      uint32               reserved (0)
+  16      int64                fecha_base, epoch seconds
+  24      float32[n]           lat
+  ..      float32[n]           lon
+  ..      uint32[n]            fecha_delta
+  ..      uint32[n]            autor
+  ..      12 bytes x n         ids (raw ObjectId bytes)
+  ..      UTF-8 JSON           {"autores", "descripcion", "direccion"}
+"""
+
+import struct
+import sys
+from array import array
+from datetime import datetime
+from typing import Dict, List
+
+import orjson
+from bson import ObjectId
+
+from serialization import dumps
+
+JSON_COLUMNAR = "application/vnd.recicla.mapa-columnar+json"
+BINARIO = "application/vnd.recicla.mapa-columnar"
+MAGIC = b"RCM1"
+_CABECERA = struct.Struct("<4sIIIq")
+EPOCH = datetime(1970, 1, 1)
+
+
+def _segundos(fecha: datetime) -> int:
+    return int((fecha - EPOCH).total_seconds())
+
+
+def columnas(reportes: List[dict]) -> Dict[str, list]:
+    """Reports (newest first) as parallel columns."""
+    autores: Dict[str, int] = {}
+    col = {k: [] for k in ("ids", "lat", "lon", "fecha_delta", "autor", "descripcion", "direccion")}
+    anterior = fecha_base = _segundos(reportes[0]["fecha"]) if reportes else 0
+    for r in reportes:
+        segundos = _segundos(r["fecha"])
+        col["ids"].append(r["_id"])
+        col["lat"].append(r["latitud"])
+        col["lon"].append(r["longitud"])
+        # Clamped so an out-of-order date cannot break the unsigned column
+        col["fecha_delta"].append(max(anterior - segundos, 0))
+        anterior = min(anterior, segundos)
+        col["autor"].append(autores.setdefault(r.get("usuario_nombre", ""), len(autores)))
+        col["descripcion"].append(r.get("descripcion"))
+        col["direccion"].append(r.get("direccion"))
+    col["fecha_base"] = fecha_base
+    col["autores"] = list(autores)
+    return col
+
+
+def json_columnar(reportes: List[dict]) -> bytes:
+    col = columnas(reportes)
+    return dumps({
+        "formato": "columnar-v1",
+        "n": len(reportes),
+        "ids": [str(i) for i in col["ids"]],
+        "lat": [round(v, 5) for v in col["lat"]],
+        "lon": [round(v, 5) for v in col["lon"]],
+        "fecha_base": col["fecha_base"],
+        "fecha_delta": col["fecha_delta"],
+        "autores": col["autores"],
+        "autor": col["autor"],
+        "descripcion": col["descripcion"],
+        "direccion": col["direccion"],
+    })
+
+
+def _le(tipo: str, valores) -> bytes:
+    datos = array(tipo, valores)
+    if sys.byteorder == "big":
+        datos.byteswap()
+    return datos.tobytes()
+
+
+def binario(reportes: List[dict]) -> bytes:
+    col = columnas(reportes)
+    cola = dumps({
+        "autores": col["autores"],
+        "descripcion": col["descripcion"],
+        "direccion": col["direccion"],
+    })
+    return b"".join((
+        _CABECERA.pack(MAGIC, len(reportes), len(cola), 0, col["fecha_base"]),
+        _le("f", col["lat"]),
+        _le("f", col["lon"]),
+        _le("I", col["fecha_delta"]),
+        _le("I", col["autor"]),
+        b"".join(ObjectId(i).binary for i in col["ids"]),
+        cola,
+    ))
+
+
+def leer_binario(datos: bytes) -> Dict[str, list]:
+    """Inverse of ``binario``; what the app does, kept for tests and tools."""
+    magic, n, largo, _, fecha_base = _CABECERA.unpack_from(datos)
+    if magic != MAGIC:
+        raise ValueError("not a columnar map payload")
+    offset = _CABECERA.size
+    col = {"fecha_base": fecha_base}
+    for campo, tipo in (("lat", "f"), ("lon", "f"), ("fecha_delta", "I"), ("autor", "I")):
+        valores = array(tipo)
+        valores.frombytes(datos[offset:offset + 4 * n])
+        if sys.byteorder == "big":
+            valores.byteswap()
+        col[campo] = valores.tolist()
+        offset += 4 * n
+    col["ids"] = [str(ObjectId(datos[o:o + 12])) for o in range(offset, offset + 12 * n, 12)]
+    offset += 12 * n
+    col.update(orjson.loads(datos[offset:offset + largo]))
+    return col
@@ -0,0 +1,126 @@
+import os
+from dataclasses import dataclass, field
+from typing import Mapping, Optional
+
+from dotenv import load_dotenv
+
+from database import MongoSettings
+
+
+@dataclass(frozen=True)
+class Settings:
+    mongo: MongoSettings = field(default_factory=MongoSettings)
+    # In development every response reports how many Mongo commands it issued
+    dev_mode: bool = False
+    slow_query_ms: float = 100
+    explain_sample_rate: float = 0.1
+    feed_page_size: int = 50
+    feed_cache_ttl_s: float = 10
+    mapa_cache_ttl_s: float = 10
+    # After the TTL a cached feed/map page is still served for this long
+    # while one background refresh per worker reloads it
+    stale_while_revalidate_s: float = 30
+    ranking_cache_ttl_s: float = 60
+    nombres_cache_ttl_s: float = 300
+    perfil_cache_ttl_s: float = 300
+    # redis://... shares L2 and invalidations across workers; empty keeps
+    # everything in process
+    cache_url: str = ""
+    # Seconds between warm-up retries while Mongo is unreachable at boot
+    warmup_retry_s: float = 5
+    # Requests handed to the threadpool at once (0 disables admission
+    # control); keep below the threadpool size, 40 by default
+    admission_max_concurrency: int = 32
+    # Slots only logins/registrations and report uploads/writes may use
+    admission_reserved_auth: int = 4
+    admission_reserved_uploads: int = 4
+    # How long a queued request may wait before it gets 503 + Retry-After
+    admission_read_budget_ms: int = 250
+    admission_write_budget_ms: int = 5000
+    # Per-IP and per-user token buckets on login, registration and reports;
+    # redis://... shares them across workers, empty keeps them per worker
+    rate_limits_enabled: bool = True
+    rate_limit_url: str = ""
+    # Background workers applying report side effects from the outbox (0
+    # leaves draining to another process), and attempts before dead-letter
+    outbox_workers: int = 4
+    outbox_max_attempts: int = 8
+    # Report lifecycle: active reports untouched this long expire, and
+    # resolved/expired ones untouched this long move to the archive
+    reporte_expira_dias: int = 90
+    archivo_despues_dias: int = 30
+    # Seconds between archival runs (0 disables the job in this process),
+    # reports moved per batch and pause between batches
+    archivo_intervalo_s: float = 3600
+    archivo_lote: int = 200
+    archivo_pausa_ms: int = 200
+    # file:///path or s3://bucket/prefix for archived photos; empty keeps
+    # them inline
+    fotos_archivo_url: str = ""
+    # How long a moderator keeps the reports they claimed
+    moderacion_reserva_s: float = 300
+    # Map tiles are invalidated precisely; the TTL only bounds a missed
+    # invalidation. A directory keeps rendered tiles across restarts.
+    tiles_cache_ttl_s: float = 3600
+    tiles_dir: str = ""
+    # Refuse reports outside the sector polygons. Off while the shipped
+    # polygons are the approximate development ones: such reports are
+    # stored with no zona instead
+    rechazar_fuera_de_zonas: bool = False
+
+    @classmethod
+    def from_env(cls, env: Optional[Mapping[str, str]] = None) -> "Settings":
+        if env is None:
+            load_dotenv()
+            env = os.environ
+        defaults = cls()
+        return cls(
+            mongo=MongoSettings.from_env(env),
+            dev_mode=env.get("APP_ENV", "production") == "development",
+            slow_query_ms=float(env.get("MONGO_SLOW_QUERY_MS", defaults.slow_query_ms)),
+            explain_sample_rate=float(
+                env.get("MONGO_EXPLAIN_SAMPLE_RATE", defaults.explain_sample_rate)
+            ),
+            feed_page_size=int(env.get("FEED_PAGE_SIZE", defaults.feed_page_size)),
+            feed_cache_ttl_s=float(env.get("FEED_CACHE_TTL_S", defaults.feed_cache_ttl_s)),
+            mapa_cache_ttl_s=float(env.get("MAPA_CACHE_TTL_S", defaults.mapa_cache_ttl_s)),
+            stale_while_revalidate_s=float(
+                env.get("STALE_WHILE_REVALIDATE_S", defaults.stale_while_revalidate_s)
+            ),
+            ranking_cache_ttl_s=float(env.get("RANKING_CACHE_TTL_S", defaults.ranking_cache_ttl_s)),
+            nombres_cache_ttl_s=float(env.get("NOMBRES_CACHE_TTL_S", defaults.nombres_cache_ttl_s)),
+            perfil_cache_ttl_s=float(env.get("PERFIL_CACHE_TTL_S", defaults.perfil_cache_ttl_s)),
+            cache_url=env.get("CACHE_URL", defaults.cache_url),
+            warmup_retry_s=float(env.get("WARMUP_RETRY_S", defaults.warmup_retry_s)),
+            admission_max_concurrency=int(
+                env.get("ADMISSION_MAX_CONCURRENCY", defaults.admission_max_concurrency)
+            ),
+            admission_reserved_auth=int(
+                env.get("ADMISSION_RESERVED_AUTH", defaults.admission_reserved_auth)
+            ),
+            admission_reserved_uploads=int(
+                env.get("ADMISSION_RESERVED_UPLOADS", defaults.admission_reserved_uploads)
+            ),
+            admission_read_budget_ms=int(
+                env.get("ADMISSION_READ_BUDGET_MS", defaults.admission_read_budget_ms)
+            ),
+            admission_write_budget_ms=int(
+                env.get("ADMISSION_WRITE_BUDGET_MS", defaults.admission_write_budget_ms)
+            ),
+            rate_limits_enabled=env.get("RATE_LIMITS_ENABLED", "1") != "0",
+            rate_limit_url=env.get("RATE_LIMIT_URL", defaults.rate_limit_url),
+            outbox_workers=int(env.get("OUTBOX_WORKERS", defaults.outbox_workers)),
+            outbox_max_attempts=int(env.get("OUTBOX_MAX_ATTEMPTS", defaults.outbox_max_attempts)),
+            reporte_expira_dias=int(env.get("REPORTE_EXPIRA_DIAS", defaults.reporte_expira_dias)),
+            archivo_despues_dias=int(env.get("ARCHIVO_DESPUES_DIAS", defaults.archivo_despues_dias)),
+            archivo_intervalo_s=float(env.get("ARCHIVO_INTERVALO_S", defaults.archivo_intervalo_s)),
+            archivo_lote=int(env.get("ARCHIVO_LOTE", defaults.archivo_lote)),
+            archivo_pausa_ms=int(env.get("ARCHIVO_PAUSA_MS", defaults.archivo_pausa_ms)),
+            fotos_archivo_url=env.get("FOTOS_ARCHIVO_URL", defaults.fotos_archivo_url),
+            moderacion_reserva_s=float(
+                env.get("MODERACION_RESERVA_S", defaults.moderacion_reserva_s)
+            ),
+            tiles_cache_ttl_s=float(env.get("TILES_CACHE_TTL_S", defaults.tiles_cache_ttl_s)),
+            tiles_dir=env.get("TILES_DIR", defaults.tiles_dir),
+            rechazar_fuera_de_zonas=env.get("RECHAZAR_FUERA_DE_ZONAS", "0") == "1",
+        )
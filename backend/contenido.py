@@ -0,0 +1,141 @@
+# Static catalogue and informational content served by the API
+
+
+INCENTIVOS = [
+    {
+        "id": "1",
+        "nombre": "Descuento en Supermercado",
+        "descripcion": "10% de descuento en productos orgánicos",
+        "puntos_requeridos": 50,
+        "categoria": "Descuentos"
+    },
+    {
+        "id": "2", 
+        "nombre": "Planta de Regalo",
+        "descripcion": "Recibe una planta nativa del Perú",
+        "puntos_requeridos": 100,
+        "categoria": "Regalos"
+    },
+    {
+        "id": "3",
+        "nombre": "Kit de Reciclaje",
+        "descripcion": "Set completo para reciclar en casa",
+        "puntos_requeridos": 200,
+        "categoria": "Productos"
+    }
+]
+
+NOTICIAS = [
+    {
+        "id": 1,
+        "titulo": "Nuevo Horario de Recolección en Ventanilla",
+        "contenido": "La Municipalidad de Ventanilla informa que el nuevo horario de recolección de residuos sólidos será de lunes a sábado de 6:00 AM a 2:00 PM en todas las zonas del distrito.",
+        "fecha": "2024-01-15",
+        "categoria": "Servicios"
+    },
+    {
+        "id": 2,
+        "titulo": "Programa de Reciclaje 'Ventanilla Verde'",
+        "contenido": "Se ha inaugurado el programa municipal 'Ventanilla Verde' que permite el intercambio de materiales reciclables por puntos canjeables en el mercado local.",
+        "fecha": "2024-01-12",
+        "categoria": "Reciclaje"
+    },
+    {
+        "id": 3,
+        "titulo": "Campaña de Limpieza de Playas",
+        "contenido": "Únete a la gran campaña de limpieza de las playas de Ventanilla este sábado 20 de enero. Punto de encuentro: Playa Costa Azul a las 8:00 AM.",
+        "fecha": "2024-01-10",
+        "categoria": "Medio Ambiente"
+    }
+]
+
+CONTENIDO_EDUCATIVO = [
+    {
+        "id": 1,
+        "titulo": "¿Cómo Separar Residuos Correctamente?",
+        "tipo": "video",
+        "contenido": "Aprende la forma correcta de separar residuos orgánicos e inorgánicos según las normas peruanas.",
+        "url": "https://example.com/video1",
+        "duracion": "5 min",
+        "categoria": "Básico"
+    },
+    {
+        "id": 2,
+        "titulo": "Horarios de Recolección en Ventanilla",
+        "tipo": "informacion",
+        "contenido": "Zona Norte: Lunes, Miércoles, Viernes (6:00 AM)\nZona Centro: Martes, Jueves, Sábado (7:00 AM)\nZona Sur: Lunes, Miércoles, Viernes (8:00 AM)",
+        "categoria": "Servicios Locales"
+    },
+    {
+        "id": 3,
+        "titulo": "Beneficios del Compostaje Casero",
+        "tipo": "articulo",
+        "contenido": "El compostaje casero reduce hasta 30% los residuos domésticos y crea abono natural para plantas.",
+        "categoria": "Avanzado"
+    }
+]
+
+# Same schedule as the "Horarios de Recolección" entry above
+HORARIOS_RECOLECCION = {
+    "Norte": {"dias": ["lunes", "miércoles", "viernes"], "hora": "06:00"},
+    "Centro": {"dias": ["martes", "jueves", "sábado"], "hora": "07:00"},
+    "Sur": {"dias": ["lunes", "miércoles", "viernes"], "hora": "08:00"},
+}
+
+TERMINOS = {
+    "app_name": "VENTANILLA RECICLA CONTIGO",
+    "version": "1.0.0",
+    "propietarios": ["Dayan Gallegos", "Maria Ferrer"],
+    "desarrollador": "Fernando Rufasto",
+    "fecha_creacion": "2024",
+    "descripcion": "Aplicación móvil para el cuidado del medio ambiente en Ventanilla, Lima, Perú. Una iniciativa ciudadana para promover la participación comunitaria en la protección ambiental.",
+    "mision": "Empoderar a los ciudadanos de Ventanilla para que participen activamente en el cuidado y protección del medio ambiente de su comunidad.",
+    "vision": "Convertir a Ventanilla en un distrito modelo de sostenibilidad ambiental a través de la tecnología y participación ciudadana.",
+    "terminos": [
+        "TÉRMINOS DE USO Y CONDICIONES GENERALES",
+        "",
+        "1. ACEPTACIÓN DE TÉRMINOS",
+        "Al descargar, instalar o usar esta aplicación, aceptas cumplir con estos términos y condiciones.",
+        "",
+        "2. USO DE LA APLICACIÓN", 
+        "• La aplicación es de uso gratuito para todos los ciudadanos de Ventanilla",
+        "• Está destinada exclusivamente para reportar problemas ambientales reales",
+        "• Los usuarios se comprometen a usar la app de manera responsable y veraz",
+        "",
+        "3. REPORTES Y CONTENIDO",
+        "• Los reportes enviados serán públicos para toda la comunidad",
+        "• Las fotos deben mostrar problemas ambientales reales (basura, contaminación, etc.)",
+        "• Está prohibido subir contenido ofensivo, falso o que no corresponda a temas ambientales",
+        "• La aplicación se reserva el derecho de moderar y eliminar contenido inapropiado",
+        "",
+        "4. SISTEMA DE PUNTOS E INCENTIVOS",
+        "• Los puntos se otorgan por reportes válidos y verificados (20 puntos por reporte)",
+        "• Los incentivos están sujetos a disponibilidad y pueden cambiar sin previo aviso",
+        "• Los puntos no tienen valor monetario y son solo para el sistema de gamificación",
+        "",
+        "5. PRIVACIDAD Y DATOS",
+        "• La información de ubicación se usa únicamente para geolocalizar reportes ambientales",
+        "• Los datos personales se mantienen seguros y no se comparten con terceros",
+        "• Las fotos pueden ser utilizadas para promover el cuidado ambiental en redes sociales oficiales",
+        "",
+        "6. RESPONSABILIDADES",
+        "• Los usuarios son responsables de la veracidad de sus reportes",
+        "• La aplicación no se hace responsable por daños derivados del uso incorrecto",
+        "• Es responsabilidad del usuario mantener actualizados sus datos de contacto",
+        "",
+        "7. MODIFICACIONES",
+        "• Estos términos pueden modificarse en cualquier momento",
+        "• Los usuarios serán notificados de cambios importantes",
+        "• El uso continuado implica aceptación de las modificaciones"
+    ],
+    "contacto": {
+        "municipalidad": "Municipalidad de Ventanilla",
+        "email_soporte": "reciclacontigo@ventanilla.gob.pe",
+        "telefono": "+51 1 234-5678",
+        "direccion": "Av. Néstor Gambetta, Ventanilla, Callao, Perú"
+    },
+    "politica_privacidad": "Tu privacidad es fundamental para nosotros. Solo recopilamos la información estrictamente necesaria para el funcionamiento de la aplicación: nombre, email, ubicación de reportes y fotos de problemas ambientales. Esta información se usa únicamente para mejorar las condiciones ambientales de Ventanilla y nunca se comparte con terceros sin tu consentimiento.",
+    "licencia": "Esta aplicación es propiedad intelectual de Dayan Gallegos y Maria Ferrer. Desarrollada por Fernando Rufasto.",
+    "derechos": "© 2024 Dayan Gallegos & Maria Ferrer. Todos los derechos reservados.",
+    "agradecimientos": "Agradecemos a la comunidad de Ventanilla por su participación activa en el cuidado del medio ambiente y a la Municipalidad de Ventanilla por su apoyo a esta iniciativa ciudadana."
+}
@@ -0,0 +1,203 @@
+"""Mongo client ownership and read routing.
+
+The primary database handles writes and any read that must see the caller's
+own writes (login right after registering, a user's own reports). Heavy
+public reads (feed, map, ranking, analytics) go through ``get_read_db()``,
+which prefers secondaries within a max-staleness bound, so read capacity
+scales by adding replica set members. On a standalone server both handles
+point at the same node.
+
+Settings come from the environment:
+
+  MONGO_URL                          connection string
+  MONGO_DB_NAME                      database name (recicla_contigo_db)
+  MONGO_MAX_POOL_SIZE                connections per worker (100)
+  MONGO_MIN_POOL_SIZE                connections kept open (0)
+  MONGO_MAX_IDLE_TIME_MS             close idle connections after this
+  MONGO_CONNECT_TIMEOUT_MS           TCP connect timeout (5000)
+  MONGO_SERVER_SELECTION_TIMEOUT_MS  wait for a usable server (5000)
+  MONGO_SOCKET_TIMEOUT_MS            per-operation socket timeout
+  MONGO_WAIT_QUEUE_TIMEOUT_MS        wait for a free pooled connection
+  MONGO_COMPRESSORS                  e.g. "zstd,snappy,zlib" (zstd needs
+                                     zstandard, snappy needs python-snappy)
+  MONGO_READ_MAX_STALENESS_S         staleness bound for secondary reads
+                                     (120, minimum 90; 0 reads from primary)
+  MONGO_READ_DEADLINE_MS             whole-operation deadline for reads (2000)
+  MONGO_WRITE_DEADLINE_MS            whole-operation deadline for writes (5000)
+  MONGO_BREAKER_FAILURES             consecutive failures that open the
+                                     circuit breaker (5)
+  MONGO_BREAKER_RESET_S              seconds open before a probe is let
+                                     through (15)
+
+Handlers wrap their Mongo work in ``guard(deadline_ms)``: while the breaker
+is open it raises ``BreakerOpen`` immediately instead of tying up a thread
+until the driver times out.
+"""
+
+import os
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Mapping, Optional, Sequence
+
+import pymongo
+from pymongo import MongoClient
+from pymongo.database import Database
+from pymongo.errors import ConnectionFailure, ExecutionTimeout, WTimeoutError
+from pymongo.read_preferences import ReadPreference, SecondaryPreferred
+
+from resilience import CircuitBreaker
+
+# MongoDB rejects maxStalenessSeconds below 90
+MIN_MAX_STALENESS_S = 90
+
+
+def _int_env(env: Mapping[str, str], name: str, default: Optional[int]) -> Optional[int]:
+    value = env.get(name)
+    if value is None or value == "":
+        return default
+    return int(value)
+
+
+@dataclass(frozen=True)
+class MongoSettings:
+    url: str = "mongodb://localhost:27017"
+    db_name: str = "recicla_contigo_db"
+    max_pool_size: int = 100
+    min_pool_size: int = 0
+    max_idle_time_ms: Optional[int] = None
+    connect_timeout_ms: int = 5000
+    server_selection_timeout_ms: int = 5000
+    socket_timeout_ms: Optional[int] = None
+    wait_queue_timeout_ms: Optional[int] = None
+    compressors: str = ""
+    read_max_staleness_s: int = 120
+    read_deadline_ms: int = 2000
+    write_deadline_ms: int = 5000
+    breaker_failures: int = 5
+    breaker_reset_s: int = 15
+
+    def __post_init__(self):
+        if 0 < self.read_max_staleness_s < MIN_MAX_STALENESS_S:
+            raise ValueError(
+                f"MONGO_READ_MAX_STALENESS_S must be 0 or at least {MIN_MAX_STALENESS_S}"
+            )
+
+    @classmethod
+    def from_env(cls, env: Mapping[str, str] = os.environ) -> "MongoSettings":
+        defaults = cls()
+        return cls(
+            url=env.get("MONGO_URL", defaults.url),
+            db_name=env.get("MONGO_DB_NAME", defaults.db_name),
+            max_pool_size=_int_env(env, "MONGO_MAX_POOL_SIZE", defaults.max_pool_size),
+            min_pool_size=_int_env(env, "MONGO_MIN_POOL_SIZE", defaults.min_pool_size),
+            max_idle_time_ms=_int_env(env, "MONGO_MAX_IDLE_TIME_MS", None),
+            connect_timeout_ms=_int_env(env, "MONGO_CONNECT_TIMEOUT_MS", defaults.connect_timeout_ms),
+            server_selection_timeout_ms=_int_env(
+                env, "MONGO_SERVER_SELECTION_TIMEOUT_MS", defaults.server_selection_timeout_ms
+            ),
+            socket_timeout_ms=_int_env(env, "MONGO_SOCKET_TIMEOUT_MS", None),
+            wait_queue_timeout_ms=_int_env(env, "MONGO_WAIT_QUEUE_TIMEOUT_MS", None),
+            compressors=env.get("MONGO_COMPRESSORS", defaults.compressors),
+            read_max_staleness_s=_int_env(
+                env, "MONGO_READ_MAX_STALENESS_S", defaults.read_max_staleness_s
+            ),
+            read_deadline_ms=_int_env(env, "MONGO_READ_DEADLINE_MS", defaults.read_deadline_ms),
+            write_deadline_ms=_int_env(env, "MONGO_WRITE_DEADLINE_MS", defaults.write_deadline_ms),
+            breaker_failures=_int_env(env, "MONGO_BREAKER_FAILURES", defaults.breaker_failures),
+            breaker_reset_s=_int_env(env, "MONGO_BREAKER_RESET_S", defaults.breaker_reset_s),
+        )
+
+    def client_options(self) -> dict:
+        options = {
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "connectTimeoutMS": self.connect_timeout_ms,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+        }
+        if self.max_idle_time_ms is not None:
+            options["maxIdleTimeMS"] = self.max_idle_time_ms
+        if self.socket_timeout_ms is not None:
+            options["socketTimeoutMS"] = self.socket_timeout_ms
+        if self.wait_queue_timeout_ms is not None:
+            options["waitQueueTimeoutMS"] = self.wait_queue_timeout_ms
+        if self.compressors:
+            options["compressors"] = self.compressors
+        return options
+
+    def read_preference(self):
+        if self.read_max_staleness_s <= 0:
+            return ReadPreference.PRIMARY
+        return SecondaryPreferred(max_staleness=self.read_max_staleness_s)
+
+
+class _Connection:
+    client = None
+    primary: Optional[Database] = None
+    lecturas: Optional[Database] = None
+
+
+_connection = _Connection()
+
+# Mongo being unreachable or too slow, as opposed to a bad query or a
+# duplicate key. NetworkTimeout and ServerSelectionTimeoutError are
+# ConnectionFailures.
+UNAVAILABLE_ERRORS = (ConnectionFailure, ExecutionTimeout, WTimeoutError)
+
+breaker = CircuitBreaker("mongo", failure_types=UNAVAILABLE_ERRORS)
+
+
+@contextmanager
+def guard(deadline_ms: int):
+    """Fail fast while the breaker is open; bound the operations inside."""
+    with breaker.guard(), pymongo.timeout(deadline_ms / 1000):
+        yield
+
+
+def ping(deadline_ms: int) -> float:
+    """Round trip to the primary in ms, through the breaker."""
+    with guard(deadline_ms):
+        get_db().command("ping")
+    return breaker.last_latency_ms
+
+
+def connect(settings: MongoSettings, event_listeners: Sequence = ()) -> MongoClient:
+    """Create the process-wide client. The driver connects lazily."""
+    client = MongoClient(settings.url, event_listeners=list(event_listeners),
+                         **settings.client_options())
+    breaker.configure(settings.breaker_failures, settings.breaker_reset_s)
+    _connection.client = client
+    _connection.primary = client.get_database(settings.db_name)
+    _connection.lecturas = client.get_database(
+        settings.db_name, read_preference=settings.read_preference()
+    )
+    for listener in event_listeners:
+        if hasattr(listener, "attach"):
+            listener.attach(client)
+    return client
+
+
+def use_databases(primary, lecturas=None) -> None:
+    """Point the app at already-open databases (in-memory stand-ins, tests)."""
+    _connection.client = getattr(primary, "client", None)
+    _connection.primary = primary
+    _connection.lecturas = lecturas if lecturas is not None else primary
+
+
+def get_client():
+    return _connection.client
+
+
+def get_db() -> Database:
+    """Primary: writes and read-your-own-write paths."""
+    return _connection.primary
+
+
+def get_read_db() -> Database:
+    """Secondary-preferred, bounded staleness: heavy public reads."""
+    return _connection.lecturas
+
+
+def close() -> None:
+    if _connection.client is not None and hasattr(_connection.client, "close"):
+        _connection.client.close()
+    _connection.client = _connection.primary = _connection.lecturas = None
@@ -0,0 +1,48 @@
+"""In-process domain events.
+
+Handlers publish what happened (a report was created, an incentive was
+redeemed, a profile changed) and subscribers react, so side effects such
+as achievements stay out of the handlers. Subscribers run synchronously in
+the publishing thread; one failing subscriber is logged and does not stop
+the others or fail the request that published the event.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List
+
+logger = logging.getLogger("recicla_contigo.eventos")
+
+REPORTE_CREADO = "reporte_creado"
+INCENTIVO_CANJEADO = "incentivo_canjeado"
+PERFIL_ACTUALIZADO = "perfil_actualizado"
+
+
+@dataclass(frozen=True)
+class Evento:
+    tipo: str
+    usuario_id: str
+    fecha: datetime
+    datos: dict = field(default_factory=dict)
+
+
+Suscriptor = Callable[[Evento], None]
+
+_suscriptores: Dict[str, List[Suscriptor]] = {}
+
+
+def suscribir(tipo: str, suscriptor: Suscriptor) -> None:
+    suscriptores = _suscriptores.setdefault(tipo, [])
+    if suscriptor not in suscriptores:
+        suscriptores.append(suscriptor)
+
+
+def publicar(evento: Evento) -> None:
+    for suscriptor in _suscriptores.get(evento.tipo, ()):
+        try:
+            suscriptor(evento)
+        except Exception:
+            logger.exception("subscriber %s failed on %s for %s",
+                             getattr(suscriptor, "__name__", suscriptor), evento.tipo,
+                             evento.usuario_id)
@@ -0,0 +1,154 @@
+"""Streaming report export: NDJSON, CSV and Parquet.
+
+Each writer takes an iterator of report documents (a Mongo cursor) and
+yields chunks of bytes as it goes, so memory stays flat whatever the size
+of the export: one batch of rows at a time, never the whole result.
+
+Photos are never inlined: every row carries ``foto_url``, the path of the
+photo endpoint, which answers 404 for a report sent without one. pyarrow
+is only imported for Parquet.
+"""
+
+import csv
+import io
+from datetime import datetime
+from itertools import islice
+from typing import Iterable, Iterator
+
+from serialization import dumps
+
+FORMATOS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+COLUMNAS = ("id", "fecha", "actualizado_en", "estado", "publico", "zona", "sector",
+            "latitud", "longitud", "direccion", "descripcion", "usuario_id", "foto_url")
+
+# Fields read from Mongo: everything a row needs and nothing heavier
+PROYECCION = {c: 1 for c in COLUMNAS if c not in ("id", "foto_url")}
+
+LOTE = 1000
+
+
+def foto_url(reporte_id) -> str:
+    return f"/api/reportes/{reporte_id}/foto"
+
+
+def fila(doc: dict) -> dict:
+    fila = {c: doc.get(c) for c in COLUMNAS}
+    fila["id"] = str(doc["_id"])
+    fila["foto_url"] = foto_url(doc["_id"])
+    return fila
+
+
+def _lotes(docs: Iterable[dict], tamano: int) -> Iterator[list]:
+    docs = iter(docs)
+    while True:
+        lote = list(islice(docs, tamano))
+        if not lote:
+            return
+        yield lote
+
+
+def ndjson(docs: Iterable[dict], lote: int = LOTE) -> Iterator[bytes]:
+    for filas in _lotes(docs, lote):
+        yield b"".join(dumps(fila(d)) + b"\n" for d in filas)
+
+
+def _celda(valor) -> str:
+    if valor is None:
+        return ""
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    return str(valor)
+
+
+def csv_filas(docs: Iterable[dict], lote: int = LOTE) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(COLUMNAS)
+    for filas in _lotes(docs, lote):
+        for d in filas:
+            f = fila(d)
+            escritor.writerow([_celda(f[c]) for c in COLUMNAS])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, for an empty export
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _Sumidero:
+    """Write-only file object for ParquetWriter; bytes are drained as they
+    are produced instead of accumulating into one file."""
+
+    closed = False
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+
+    def write(self, datos) -> int:
+        datos = bytes(datos)
+        self._partes.append(datos)
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self) -> int:
+        return self._posicion
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drenar(self) -> bytes:
+        datos = b"".join(self._partes)
+        self._partes = []
+        return datos
+
+
+def parquet(docs: Iterable[dict], lote: int = 10_000) -> Iterator[bytes]:
+    """One row group per batch; the footer comes last, as Parquet requires."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    esquema = pa.schema([
+        ("id", pa.string()),
+        ("fecha", pa.timestamp("ms")),
+        ("actualizado_en", pa.timestamp("ms")),
+        ("estado", pa.string()),
+        ("publico", pa.bool_()),
+        ("zona", pa.string()),
+        ("sector", pa.string()),
+        ("latitud", pa.float64()),
+        ("longitud", pa.float64()),
+        ("direccion", pa.string()),
+        ("descripcion", pa.string()),
+        ("usuario_id", pa.string()),
+        ("foto_url", pa.string()),
+    ])
+    sumidero = _Sumidero()
+    with pq.ParquetWriter(sumidero, esquema, compression="zstd") as escritor:
+        for filas in _lotes(docs, lote):
+            columnas = {c: [] for c in COLUMNAS}
+            for d in filas:
+                for c, valor in fila(d).items():
+                    columnas[c].append(valor)
+            escritor.write_table(pa.Table.from_pydict(columnas, schema=esquema))
+            yield sumidero.drenar()
+    yield sumidero.drenar()
+
+
+def escribir(formato: str, docs: Iterable[dict]) -> Iterator[bytes]:
+    if formato == "ndjson":
+        return ndjson(docs)
+    if formato == "csv":
+        return csv_filas(docs)
+    if formato == "parquet":
+        return parquet(docs)
+    raise ValueError(f"unknown export format {formato!r}")
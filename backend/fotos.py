@@ -0,0 +1,91 @@
+"""Photo storage outside Mongo for archived reports.
+
+Live reports keep their photo inline as a data URL (the app sends it that
+way and the feed returns it as is). When a report is archived its photo
+can move to cheaper storage, leaving a ``foto_ref`` in the document:
+
+  ""                         keep photos inline in the archive
+  file:///var/lib/fotos      a directory (or a mounted volume)
+  s3://bucket/prefix         S3, written with the infrequent-access class
+
+boto3 is only imported when an S3 store is opened.
+"""
+
+import base64
+import binascii
+from pathlib import Path
+from typing import Optional, Tuple
+from urllib.parse import urlparse
+
+_EXTENSIONES = {"image/jpeg": "jpg", "image/png": "png", "image/webp": "webp"}
+
+
+def decodificar(data_url: str) -> Tuple[bytes, str]:
+    """(bytes, content type) of a ``data:<type>;base64,...`` URL."""
+    cabecera, _, datos = data_url.partition(",")
+    if not cabecera.startswith("data:") or not cabecera.endswith(";base64"):
+        raise ValueError("not a base64 data URL")
+    try:
+        return base64.b64decode(datos, validate=True), cabecera[5:-7] or "application/octet-stream"
+    except binascii.Error as exc:
+        raise ValueError("invalid base64 payload") from exc
+
+
+def data_url(contenido: bytes, tipo: str) -> str:
+    return f"data:{tipo};base64,{base64.b64encode(contenido).decode()}"
+
+
+def nombre(clave: str, tipo: str) -> str:
+    return f"{clave}.{_EXTENSIONES.get(tipo, 'bin')}"
+
+
+class DirectorioFotos:
+    def __init__(self, raiz: str):
+        self.raiz = Path(raiz)
+
+    def guardar(self, clave: str, contenido: bytes, tipo: str) -> str:
+        ruta = self.raiz / nombre(clave, tipo)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so a crash never leaves half a photo behind
+        temporal = ruta.with_name(ruta.name + ".tmp")
+        temporal.write_bytes(contenido)
+        temporal.replace(ruta)
+        return ruta.resolve().as_uri()
+
+    def leer(self, ref: str) -> bytes:
+        return Path(urlparse(ref).path).read_bytes()
+
+
+class S3Fotos:
+    def __init__(self, bucket: str, prefijo: str = "", client=None):
+        if client is None:
+            import boto3
+            client = boto3.client("s3")
+        self.client = client
+        self.bucket = bucket
+        self.prefijo = prefijo.strip("/")
+
+    def guardar(self, clave: str, contenido: bytes, tipo: str) -> str:
+        key = "/".join(p for p in (self.prefijo, nombre(clave, tipo)) if p)
+        self.client.put_object(
+            Bucket=self.bucket, Key=key, Body=contenido, ContentType=tipo,
+            StorageClass="STANDARD_IA",
+        )
+        return f"s3://{self.bucket}/{key}"
+
+    def leer(self, ref: str) -> bytes:
+        partes = urlparse(ref)
+        respuesta = self.client.get_object(Bucket=partes.netloc, Key=partes.path.lstrip("/"))
+        return respuesta["Body"].read()
+
+
+def abrir_fotos(url: str) -> Optional[object]:
+    """Photo store for ``url``, or None to keep photos inline."""
+    if not url:
+        return None
+    partes = urlparse(url)
+    if partes.scheme == "s3":
+        return S3Fotos(partes.netloc, partes.path)
+    if partes.scheme in ("", "file"):
+        return DirectorioFotos(partes.path)
+    raise ValueError(f"unsupported photo store {url!r}")
@@ -0,0 +1,155 @@
+"""Achievements (logros) unlocked from domain events.
+
+Each user document carries a small ``logros_progreso`` state (report count,
+zones reported in, current daily streak, redemptions, ...). An event
+updates that state with one atomic pipeline update that also returns it,
+and only the rules that event can affect are evaluated against the result:
+no user history is ever rescanned.
+
+An unlock is an ``$addToSet`` guarded by ``logros: {$ne: id}``, so when two
+events race only one of them wins the update and sends the notification.
+
+Events come through the outbox at least once. Report events are counted
+once: the state remembers the last reports it counted, and the progress
+update only matches a user who has not counted this one yet.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Tuple
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from eventos import INCENTIVO_CANJEADO, PERFIL_ACTUALIZADO, REPORTE_CREADO, Evento
+from puntajes import HORA_PERU
+
+
+@dataclass(frozen=True)
+class Logro:
+    id: str
+    titulo: str
+    descripcion: str
+    eventos: Tuple[str, ...]
+    cumple: Callable[[dict], bool]
+
+
+CATALOGO = [
+    Logro("primer_reporte", "Primer reporte", "Enviaste tu primer reporte",
+          (REPORTE_CREADO,), lambda p: p.get("reportes", 0) >= 1),
+    Logro("diez_reportes", "Vecino vigilante", "Enviaste 10 reportes",
+          (REPORTE_CREADO,), lambda p: p.get("reportes", 0) >= 10),
+    Logro("tres_zonas", "Explorador de Ventanilla", "Reportaste en 3 zonas distintas",
+          (REPORTE_CREADO,), lambda p: len(p.get("zonas", [])) >= 3),
+    Logro("racha_7_dias", "Siete días seguidos", "Reportaste 7 días seguidos",
+          (REPORTE_CREADO,), lambda p: p.get("racha", 0) >= 7),
+    Logro("primer_canje", "Primer canje", "Canjeaste tu primer incentivo",
+          (INCENTIVO_CANJEADO,), lambda p: p.get("canjes", 0) >= 1),
+    Logro("perfil_completo", "Perfil completo", "Agregaste tu foto de perfil",
+          (PERFIL_ACTUALIZADO,), lambda p: p.get("foto_perfil", False)),
+]
+
+_POR_EVENTO: Dict[str, List[Logro]] = {}
+for _logro in CATALOGO:
+    for _tipo in _logro.eventos:
+        _POR_EVENTO.setdefault(_tipo, []).append(_logro)
+
+_PROGRESO = "$logros_progreso"
+# Reports remembered per user to skip redelivered events; retries come
+# long before a user sends this many more
+RECORDADOS = 20
+
+
+def _campo(nombre: str, defecto):
+    return {"$ifNull": [f"{_PROGRESO}.{nombre}", defecto]}
+
+
+def _dia_local(fecha: datetime):
+    return fecha.replace(tzinfo=timezone.utc).astimezone(HORA_PERU).date()
+
+
+def actualizacion(evento: Evento) -> dict:
+    """$set stage applying ``evento`` to the user's progress state."""
+    if evento.tipo == REPORTE_CREADO:
+        dia = _dia_local(evento.fecha)
+        hoy, ayer = dia.isoformat(), (dia - timedelta(days=1)).isoformat()
+        etapa = {
+            # reportes_enviados seeds users who reported before achievements
+            # existed, whichever of the two updates runs first
+            "logros_progreso.reportes": {"$max": [
+                {"$add": [_campo("reportes", 0), 1]}, {"$ifNull": ["$reportes_enviados", 0]},
+            ]},
+            "logros_progreso.racha": {"$cond": [
+                {"$eq": [f"{_PROGRESO}.ultimo_dia", hoy]},
+                _campo("racha", 1),
+                {"$cond": [
+                    {"$eq": [f"{_PROGRESO}.ultimo_dia", ayer]},
+                    {"$add": [_campo("racha", 0), 1]},
+                    1,
+                ]},
+            ]},
+            "logros_progreso.ultimo_dia": hoy,
+        }
+        if evento.datos.get("zona"):
+            etapa["logros_progreso.zonas"] = {
+                "$setUnion": [_campo("zonas", []), [evento.datos["zona"]]]
+            }
+        if evento.datos.get("reporte_id"):
+            etapa["logros_progreso.contados"] = {"$slice": [
+                {"$concatArrays": [_campo("contados", []), [evento.datos["reporte_id"]]]}, -RECORDADOS,
+            ]}
+        return etapa
+    if evento.tipo == INCENTIVO_CANJEADO:
+        return {"logros_progreso.canjes": {"$add": [_campo("canjes", 0), 1]}}
+    if evento.tipo == PERFIL_ACTUALIZADO:
+        if evento.datos.get("foto_perfil"):
+            return {"logros_progreso.foto_perfil": True}
+        return {}
+    raise ValueError(f"no progress rule for event {evento.tipo!r}")
+
+
+def procesar(db, evento: Evento) -> List[Logro]:
+    """Apply ``evento`` and award what it unlocks; return the new logros."""
+    candidatos = _POR_EVENTO.get(evento.tipo)
+    etapa = actualizacion(evento)
+    if not candidatos or not etapa or not ObjectId.is_valid(evento.usuario_id):
+        return []
+    oid = ObjectId(evento.usuario_id)
+    filtro = {"_id": oid}
+    if evento.datos.get("reporte_id"):
+        filtro["logros_progreso.contados"] = {"$ne": evento.datos["reporte_id"]}
+    proyeccion = {"logros": 1, "logros_progreso": 1}
+    usuario = db.usuarios.find_one_and_update(
+        filtro, [{"$set": etapa}], projection=proyeccion, return_document=ReturnDocument.AFTER,
+    )
+    if usuario is None and len(filtro) > 1:
+        # Already counted: a redelivery. The unlocks are still checked, in
+        # case the first delivery failed before awarding them
+        usuario = db.usuarios.find_one({"_id": oid}, proyeccion)
+    if usuario is None:
+        return []
+    progreso = usuario.get("logros_progreso", {})
+    obtenidos = set(usuario.get("logros", []))
+    nuevos = []
+    for logro in candidatos:
+        if logro.id in obtenidos or not logro.cumple(progreso):
+            continue
+        resultado = db.usuarios.update_one(
+            {"_id": oid, "logros": {"$ne": logro.id}},
+            {"$addToSet": {"logros": logro.id}},
+        )
+        if resultado.modified_count:
+            nuevos.append(logro)
+            db.notificaciones.insert_one({
+                "usuario_id": evento.usuario_id,
+                "tipo": "logro",
+                "logro": logro.id,
+                "mensaje": f"¡Logro desbloqueado: {logro.titulo}! {logro.descripcion}.",
+                "fecha": evento.fecha,
+                "leida": False,
+            })
+    return nuevos
+
+
+def catalogo() -> List[dict]:
+    return [{"id": l.id, "titulo": l.titulo, "descripcion": l.descripcion} for l in CATALOGO]
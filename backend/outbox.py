@@ -0,0 +1,195 @@
+"""Outbox for side effects of a write, drained by background workers.
+
+The document a handler writes carries its pending event in an ``outbox``
+field, so the event is stored by the same single-document write: there is
+no window where the report exists and its side effects are forgotten, and
+no transaction (or replica set) is needed. Workers claim due entries with a
+lease, run every side effect registered for the event type and remove the
+entry once all of them are done.
+
+Each finished side effect is recorded in ``outbox.hechos``, so a retry only
+reruns what failed. Delivery is at least once: a side effect that succeeded
+just before its worker died runs again, so side effects should be
+idempotent or tolerate a repeat. Failures back off exponentially with
+jitter; after ``max_intentos`` the entry moves to the dead-letter
+collection with its last error.
+"""
+
+import asyncio
+import logging
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from pymongo import ASCENDING, ReturnDocument
+
+from eventos import Evento
+from metrics import REGISTRY
+
+logger = logging.getLogger("recicla_contigo.outbox")
+
+CAMPO = "outbox"
+PROCESADO, REINTENTO, MUERTO = "procesado", "reintento", "muerto"
+
+OUTBOX_EVENTS = REGISTRY.counter(
+    "outbox_events_total", "Outbox entries handled by the background workers.", ("resultado",)
+)
+
+Manejador = Callable[[Evento], None]
+
+
+def pendiente(evento: Evento) -> dict:
+    """Outbox entry to embed in the document ``evento`` is about."""
+    return {
+        "tipo": evento.tipo,
+        "usuario_id": evento.usuario_id,
+        "fecha": evento.fecha,
+        "datos": evento.datos,
+        "hechos": [],
+        "intentos": 0,
+        "disponible_en": evento.fecha,
+    }
+
+
+class OutboxWorker:
+    def __init__(self, get_db: Callable, coleccion: str,
+                 manejadores: Dict[str, Dict[str, Manejador]],
+                 max_intentos: int = 8, backoff_s: float = 1, max_backoff_s: float = 600,
+                 lease_s: float = 60, poll_s: float = 5, muertos: str = "outbox_muertos"):
+        self._get_db = get_db
+        self.coleccion = coleccion
+        self.manejadores = manejadores
+        self.max_intentos = max_intentos
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.lease = timedelta(seconds=lease_s)
+        self.poll_s = poll_s
+        self.muertos = muertos
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._despertar: Optional[asyncio.Event] = None
+        self._tareas: List[asyncio.Task] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def ensure_indexes(self):
+        # Sparse: only documents with a pending entry are indexed
+        self._get_db()[self.coleccion].create_index(
+            [(f"{CAMPO}.disponible_en", ASCENDING)], sparse=True
+        )
+
+    def backoff(self, intentos: int) -> timedelta:
+        espera = min(self.max_backoff_s, self.backoff_s * 2 ** (intentos - 1))
+        return timedelta(seconds=espera * random.uniform(0.5, 1))
+
+    def procesar_uno(self, ahora: Optional[datetime] = None) -> Optional[str]:
+        """Claim one due entry and run it; None when nothing is due."""
+        ahora = ahora or datetime.utcnow()
+        db = self._get_db()
+        coleccion = db[self.coleccion]
+        # The lease hides the entry from other workers; if this one dies the
+        # entry becomes due again when the lease runs out
+        doc = coleccion.find_one_and_update(
+            {f"{CAMPO}.disponible_en": {"$lte": ahora}},
+            {"$set": {f"{CAMPO}.disponible_en": ahora + self.lease}},
+            sort=[(f"{CAMPO}.disponible_en", ASCENDING)],
+            projection={CAMPO: 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is None:
+            return None
+        entrada = doc[CAMPO]
+        evento = Evento(entrada["tipo"], entrada["usuario_id"], entrada["fecha"], entrada.get("datos", {}))
+        manejadores = self.manejadores.get(evento.tipo)
+        if manejadores is None:
+            return self._fallo(db, doc["_id"], entrada, None, f"no handlers for {evento.tipo!r}", final=True)
+        hechos = set(entrada.get("hechos", []))
+        for nombre, manejador in manejadores.items():
+            if nombre in hechos:
+                continue
+            try:
+                manejador(evento)
+            except Exception as exc:
+                logger.warning("outbox handler %s failed for %s %s: %r",
+                               nombre, self.coleccion, doc["_id"], exc)
+                return self._fallo(db, doc["_id"], entrada, nombre, repr(exc), ahora=ahora)
+            coleccion.update_one({"_id": doc["_id"]}, {"$addToSet": {f"{CAMPO}.hechos": nombre}})
+        coleccion.update_one({"_id": doc["_id"]}, {"$unset": {CAMPO: ""}})
+        return PROCESADO
+
+    def _fallo(self, db, doc_id, entrada: dict, manejador: Optional[str], error: str,
+               ahora: Optional[datetime] = None, final: bool = False) -> str:
+        intentos = entrada.get("intentos", 0) + 1
+        if final or intentos >= self.max_intentos:
+            db[self.muertos].insert_one({
+                "coleccion": self.coleccion,
+                "documento_id": doc_id,
+                "evento": {k: entrada.get(k) for k in ("tipo", "usuario_id", "fecha", "datos", "hechos")},
+                "manejador": manejador,
+                "error": error,
+                "intentos": intentos,
+                "fecha": datetime.utcnow(),
+            })
+            db[self.coleccion].update_one({"_id": doc_id}, {"$unset": {CAMPO: ""}})
+            logger.error("outbox entry for %s %s dead-lettered after %d attempts",
+                         self.coleccion, doc_id, intentos)
+            return MUERTO
+        db[self.coleccion].update_one({"_id": doc_id}, {"$set": {
+            f"{CAMPO}.intentos": intentos,
+            f"{CAMPO}.disponible_en": (ahora or datetime.utcnow()) + self.backoff(intentos),
+            f"{CAMPO}.ultimo_error": error,
+        }})
+        return REINTENTO
+
+    def drenar(self) -> int:
+        """Run every due entry in the calling thread (tests, scripts)."""
+        procesadas = 0
+        while self.procesar_uno() is not None:
+            procesadas += 1
+        return procesadas
+
+    def avisar(self) -> None:
+        """Wake the workers after a write; safe to call from any thread."""
+        loop, despertar = self._loop, self._despertar
+        if loop is None or despertar is None:
+            return
+        try:
+            loop.call_soon_threadsafe(despertar.set)
+        except RuntimeError:
+            pass  # loop already closed
+
+    async def start(self, concurrency: int) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._despertar = asyncio.Event()
+        # Own threads, so draining a backlog never takes request threads
+        self._executor = ThreadPoolExecutor(concurrency, "outbox")
+        self._tareas = [asyncio.create_task(self._bucle()) for _ in range(concurrency)]
+
+    async def stop(self) -> None:
+        for tarea in self._tareas:
+            tarea.cancel()
+        await asyncio.gather(*self._tareas, return_exceptions=True)
+        self._tareas = []
+        self._loop = self._despertar = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def _bucle(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            # Cleared before claiming, so a wake-up during the claim is kept
+            self._despertar.clear()
+            try:
+                resultado = await loop.run_in_executor(self._executor, self.procesar_uno)
+            except Exception as exc:
+                # Mongo unreachable: try again on the next poll
+                logger.warning("outbox claim failed: %r", exc)
+                await asyncio.sleep(self.poll_s)
+                continue
+            if resultado is not None:
+                OUTBOX_EVENTS.inc((resultado,))
+                continue
+            try:
+                await asyncio.wait_for(self._despertar.wait(), self.poll_s)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,115 @@
+"""Windowed and per-zone leaderboards kept as counter buckets.
+
+Every point award increments one document per (ventana, zona, usuario_id)
+in ``puntajes``: this week, this month and all time, each for the zone the
+report was made in and for the whole district. A new week simply starts
+writing to new keys, so rollover costs nothing, and the top N of any
+window is a range read on (ventana, zona, puntos desc). Weekly and monthly
+buckets carry ``expira_en`` for the TTL index.
+
+Leaderboards count points earned; redemptions only lower the balance in
+``usuarios``.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+# Peru has no daylight saving time; weeks and months roll over at local midnight
+HORA_PERU = timezone(timedelta(hours=-5))
+ZONA_TODAS = "todas"
+PERIODOS = ("semana", "mes", "total")
+
+# Reports remembered per bucket to skip retried awards
+RECORDADOS = 20
+_DUPLICADO = 11000
+
+RETENCION_SEMANAS = timedelta(days=400)
+RETENCION_MESES = timedelta(days=3 * 366)
+
+
+def ventana(periodo: str, fecha: datetime) -> Tuple[str, Optional[datetime]]:
+    """Bucket key for the window containing ``fecha`` (naive UTC) and when
+    the bucket may be deleted."""
+    local = fecha.replace(tzinfo=timezone.utc).astimezone(HORA_PERU)
+    if periodo == "semana":
+        anio, semana, _ = local.isocalendar()
+        return f"semana:{anio}-W{semana:02d}", fecha + RETENCION_SEMANAS
+    if periodo == "mes":
+        return f"mes:{local.year}-{local.month:02d}", fecha + RETENCION_MESES
+    if periodo == "total":
+        return "total", None
+    raise ValueError(f"unknown period {periodo!r}")
+
+
+def incrementos(usuario_id: str, zona: Optional[str], puntos: int,
+                fecha: datetime, reporte_id: Optional[str] = None) -> List[UpdateOne]:
+    """Upserts adding ``puntos`` to every bucket the award counts for.
+
+    With ``reporte_id`` each bucket remembers the last reports it counted
+    and skips one it has seen, so a retried award does not count twice:
+    the upsert then collides with the existing bucket instead (see
+    ``aplicar``).
+    """
+    zonas = [ZONA_TODAS] + ([zona] if zona else [])
+    operaciones = []
+    for periodo in PERIODOS:
+        clave, expira_en = ventana(periodo, fecha)
+        for z in zonas:
+            filtro = {"ventana": clave, "zona": z, "usuario_id": usuario_id}
+            actualizacion = {"$inc": {"puntos": puntos}}
+            if reporte_id is not None:
+                filtro["reportes"] = {"$ne": reporte_id}
+                actualizacion["$push"] = {"reportes": {"$each": [reporte_id], "$slice": -RECORDADOS}}
+            if expira_en is not None:
+                actualizacion["$setOnInsert"] = {"expira_en": expira_en}
+            operaciones.append(UpdateOne(filtro, actualizacion, upsert=True))
+    return operaciones
+
+
+def aplicar(db, operaciones: List[UpdateOne]) -> None:
+    try:
+        db.puntajes.bulk_write(operaciones, ordered=False)
+    except BulkWriteError as exc:
+        # Buckets that had already counted the report
+        if any(e["code"] != _DUPLICADO for e in exc.details["writeErrors"]):
+            raise
+
+
+def sembrar_total(db, lote: int = 1000) -> int:
+    """Set every user's all-time district bucket to the points they have
+    earned: their balance plus what they redeemed. For deployments whose
+    history predates the bucket; safe to run again."""
+    canjeados = {c["_id"]: c["puntos"] for c in db.canjes.aggregate([
+        {"$group": {"_id": "$usuario_id", "puntos": {"$sum": "$puntos"}}},
+    ])}
+    operaciones, sembrados = [], 0
+    for usuario in db.usuarios.find({}, {"puntos": 1}, batch_size=lote):
+        usuario_id = str(usuario["_id"])
+        ganados = usuario.get("puntos", 0) + canjeados.get(usuario_id, 0)
+        if not ganados:
+            continue
+        operaciones.append(UpdateOne(
+            {"ventana": "total", "zona": ZONA_TODAS, "usuario_id": usuario_id},
+            {"$set": {"puntos": ganados}},
+            upsert=True,
+        ))
+        if len(operaciones) >= lote:
+            db.puntajes.bulk_write(operaciones, ordered=False)
+            sembrados += len(operaciones)
+            operaciones = []
+    if operaciones:
+        db.puntajes.bulk_write(operaciones, ordered=False)
+        sembrados += len(operaciones)
+    return sembrados
+
+
+def top(db, periodo: str, zona: Optional[str], limite: int,
+        fecha: Optional[datetime] = None) -> List[dict]:
+    clave, _ = ventana(periodo, fecha or datetime.utcnow())
+    return list(db.puntajes.find(
+        {"ventana": clave, "zona": zona or ZONA_TODAS},
+        {"_id": 0, "usuario_id": 1, "puntos": 1},
+    ).sort([("puntos", -1), ("usuario_id", 1)]).limit(limite))
@@ -0,0 +1,218 @@
+import contextvars
+import logging
+from contextlib import contextmanager
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+
+from pymongo import monitoring
+
+from metrics import REGISTRY, route_label
+
+logger = logging.getLogger("recicla_contigo.mongo")
+
+# Commands that are driver housekeeping rather than application queries.
+IGNORED_COMMANDS = frozenset({
+    "hello", "isMaster", "ismaster", "ping", "buildInfo", "saslStart",
+    "saslContinue", "endSessions", "killCursors", "explain",
+})
+EXPLAINABLE_COMMANDS = frozenset({
+    "find", "aggregate", "count", "distinct", "findAndModify", "update", "delete",
+})
+# Keys the driver adds to every command that must not be sent back in explain.
+_DRIVER_KEYS = frozenset({
+    "lsid", "$db", "$clusterTime", "$readPreference", "txnNumber",
+    "autocommit", "startTransaction", "readConcern", "writeConcern",
+})
+
+HTTP_MONGO_QUERIES = REGISTRY.histogram(
+    "http_request_mongo_queries", "Mongo commands issued per HTTP request.",
+    ("method", "route"), buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100, 250),
+)
+
+
+class RequestQueryStats:
+    __slots__ = ("count", "time_ms")
+
+    def __init__(self):
+        self.count = 0
+        self.time_ms = 0.0
+
+
+# Holds the stats object of the HTTP request being served. Sync handlers run
+# in the threadpool with a copy of the request's context, so they see the same
+# object and the listener (which runs on the calling thread) can update it.
+_current_stats: contextvars.ContextVar[Optional[RequestQueryStats]] = contextvars.ContextVar(
+    "mongo_query_stats", default=None
+)
+
+
+def current_stats() -> Optional[RequestQueryStats]:
+    return _current_stats.get()
+
+
+@contextmanager
+def track_queries():
+    """Count the Mongo commands issued inside the block (jobs, tests)."""
+    stats = RequestQueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def filter_shape(value: Any) -> Any:
+    """Strip literal values from a query so similar queries group together."""
+    if isinstance(value, dict):
+        return {k: filter_shape(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(v, dict) for v in value):
+            return [filter_shape(v) for v in value]
+        return "<list>"
+    return f"<{type(value).__name__}>"
+
+
+def command_shape(command_name: str, command: dict) -> Any:
+    if command_name == "find":
+        return {"filter": filter_shape(command.get("filter", {})), "sort": command.get("sort")}
+    if command_name == "aggregate":
+        return filter_shape(command.get("pipeline", []))
+    if command_name in ("count", "distinct", "findAndModify"):
+        return filter_shape(command.get("query", {}))
+    if command_name == "update":
+        updates = command.get("updates") or [{}]
+        return filter_shape(updates[0].get("q", {}))
+    if command_name == "delete":
+        deletes = command.get("deletes") or [{}]
+        return filter_shape(deletes[0].get("q", {}))
+    return None
+
+
+def _plan_stages(plan: dict) -> str:
+    stages = []
+    while plan:
+        stage = plan.get("stage", "?")
+        if plan.get("indexName"):
+            stage += f"({plan['indexName']})"
+        stages.append(stage)
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return " <- ".join(stages)
+
+
+class QueryMonitor(monitoring.CommandListener):
+    """Attributes Mongo commands to the current request and logs slow ones.
+
+    Commands slower than ``slow_ms`` are logged with their filter shape; a
+    ``explain_sample_rate`` fraction of them also get a queryPlanner explain,
+    run off the request path on a single background thread.
+    """
+
+    def __init__(self, slow_ms: float = 100, explain_sample_rate: float = 0.1,
+                 max_pending_explains: int = 8):
+        self.slow_ms = slow_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.max_pending_explains = max_pending_explains
+        self._client = None
+        self._inflight = {}
+        self._explains_pending = 0
+        self._explain_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mongo-explain")
+
+    def attach(self, client) -> None:
+        self._client = client
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        self._inflight[(event.connection_id, event.request_id)] = (
+            event.database_name, event.command
+        )
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finished(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finished(event)
+
+    def _finished(self, event) -> None:
+        started = self._inflight.pop((event.connection_id, event.request_id), None)
+        if started is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.count += 1
+            stats.time_ms += duration_ms
+        if duration_ms >= self.slow_ms:
+            self._report_slow(event.command_name, started[0], started[1], duration_ms)
+
+    def _report_slow(self, command_name: str, database: str, command: dict,
+                     duration_ms: float) -> None:
+        collection = command.get(command_name)
+        logger.warning(
+            "slow mongo command %s on %s.%s took %.1f ms shape=%s",
+            command_name, database, collection, duration_ms,
+            command_shape(command_name, command),
+        )
+        if (
+            self._client is None
+            or command_name not in EXPLAINABLE_COMMANDS
+            or random.random() >= self.explain_sample_rate
+        ):
+            return
+        with self._explain_lock:
+            if self._explains_pending >= self.max_pending_explains:
+                return
+            self._explains_pending += 1
+        explain_target = {k: v for k, v in command.items() if k not in _DRIVER_KEYS}
+        self._executor.submit(self._explain, command_name, database, collection, explain_target)
+
+    def _explain(self, command_name: str, database: str, collection: str,
+                 command: dict) -> None:
+        try:
+            result = self._client[database].command(
+                {"explain": command, "verbosity": "queryPlanner"}
+            )
+            planner = result.get("queryPlanner", {})
+            logger.warning(
+                "explain %s on %s.%s: winning plan %s",
+                command_name, database, collection,
+                _plan_stages(planner.get("winningPlan", {})),
+            )
+        except Exception:
+            logger.exception("explain failed for slow %s on %s.%s", command_name, database, collection)
+        finally:
+            with self._explain_lock:
+                self._explains_pending -= 1
+
+
+class QueryStatsMiddleware:
+    """Opens a per-request query counter; optionally reports it in headers."""
+
+    def __init__(self, app, expose_headers: bool = False):
+        self.app = app
+        self.expose_headers = expose_headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueryStats()
+        token = _current_stats.set(stats)
+
+        async def send_wrapper(message):
+            if self.expose_headers and message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-mongo-queries", str(stats.count).encode()))
+                headers.append((b"x-mongo-time-ms", f"{stats.time_ms:.1f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_stats.reset(token)
+            HTTP_MONGO_QUERIES.observe((scope["method"], route_label(scope)), stats.count)
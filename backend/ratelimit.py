@@ -0,0 +1,237 @@
+"""Token-bucket rate limiting.
+
+Each bucket is kept as a single float, the time at which it will be full
+again (the GCRA formulation of a token bucket): taking a token pushes that
+time forward by one emission interval and a request is refused when it
+would land more than a full bucket ahead of now. A bucket whose time is in
+the past is full and carries no information, which is what the periodic
+eviction drops.
+
+Per-IP limits run in ``RateLimitMiddleware`` before the body is read or
+parsed; per-user limits are checked in the handlers before any database
+work. Behind a proxy, run uvicorn with ``--proxy-headers`` so the client
+address is the caller's, not the ingress's.
+"""
+
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Mapping, Optional, Tuple
+
+import orjson
+from starlette.concurrency import run_in_threadpool
+
+from metrics import REGISTRY
+from resilience import BreakerOpen, CircuitBreaker
+
+logger = logging.getLogger("recicla_contigo.ratelimit")
+
+RATE_LIMITED = REGISTRY.counter(
+    "http_rate_limited_total", "Requests refused by a rate limit rule.", ("rule",)
+)
+
+
+@dataclass(frozen=True)
+class Rule:
+    """``capacity`` requests at once, refilled evenly over ``period_s``."""
+    name: str
+    capacity: int
+    period_s: float
+
+    @property
+    def interval(self) -> float:
+        return self.period_s / self.capacity
+
+
+class LocalBuckets:
+    """Buckets for one worker process: a dict of floats behind a lock."""
+
+    def __init__(self, max_keys: int = 200_000, sweep_interval_s: float = 60):
+        self.max_keys = max_keys
+        self.sweep_interval_s = sweep_interval_s
+        self._full_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._next_sweep = time.monotonic() + sweep_interval_s
+
+    def take(self, rule: Rule, key: str) -> float:
+        """Take one token; return 0 if allowed, else seconds until allowed."""
+        now = time.monotonic()
+        bucket = f"{rule.name}:{key}"
+        with self._lock:
+            if now >= self._next_sweep or len(self._full_at) >= self.max_keys:
+                self._sweep(now)
+            full_at = max(self._full_at.get(bucket, now), now) + rule.interval
+            excess = full_at - now - rule.period_s
+            if excess > 0:
+                return excess
+            self._full_at[bucket] = full_at
+            return 0.0
+
+    def reset(self, rule: Rule, key: str) -> None:
+        """Refill the bucket, e.g. once a login has succeeded."""
+        with self._lock:
+            self._full_at.pop(f"{rule.name}:{key}", None)
+
+    def _sweep(self, now: float) -> None:
+        self._full_at = {k: t for k, t in self._full_at.items() if t > now}
+        # Still over the cap (e.g. a spray of spoofed keys): forget the
+        # oldest-inserted buckets rather than grow without bound
+        overflow = len(self._full_at) - self.max_keys // 2
+        if overflow > 0:
+            for key in list(self._full_at)[:overflow]:
+                del self._full_at[key]
+        self._next_sweep = now + self.sweep_interval_s
+
+    def __len__(self) -> int:
+        return len(self._full_at)
+
+    def close(self) -> None:
+        pass
+
+
+# KEYS[1] bucket, ARGV: now, interval, period, ttl ms
+_GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local full_at = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now) + tonumber(ARGV[2])
+local excess = full_at - now - tonumber(ARGV[3])
+if excess > 0 then
+  return tostring(excess)
+end
+redis.call('SET', KEYS[1], tostring(full_at), 'PX', ARGV[4])
+return '0'
+"""
+
+
+class RedisBuckets:
+    """Buckets shared by every worker, one Redis key per bucket.
+
+    Keys expire once the bucket is full again, so Redis does the eviction.
+    If Redis is unreachable the worker falls back to its own buckets:
+    limits get looser for a while, but logins keep working. The breaker
+    keeps an outage from costing a socket timeout per request.
+    """
+
+    def __init__(self, url: str, prefix: str = "recicla_contigo:rl:"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_URL points at Redis but the redis package is not installed")
+        self._redis = redis.Redis.from_url(url, socket_timeout=0.25, socket_connect_timeout=0.25)
+        self._script = self._redis.register_script(_GCRA_SCRIPT)
+        self._prefix = prefix
+        self._fallback = LocalBuckets()
+        self._breaker = CircuitBreaker("rate_limit", reset_timeout_s=5)
+
+    def take(self, rule: Rule, key: str) -> float:
+        try:
+            with self._breaker.guard():
+                result = self._script(
+                    keys=[f"{self._prefix}{rule.name}:{key}"],
+                    args=[time.time(), rule.interval, rule.period_s,
+                          int(rule.period_s * 1000) + 1000],
+                )
+        except BreakerOpen:
+            return self._fallback.take(rule, key)
+        except Exception as exc:
+            logger.warning("rate limit store unavailable, using local buckets: %r", exc)
+            return self._fallback.take(rule, key)
+        return float(result)
+
+    def reset(self, rule: Rule, key: str) -> None:
+        self._fallback.reset(rule, key)
+        try:
+            with self._breaker.guard():
+                self._redis.delete(f"{self._prefix}{rule.name}:{key}")
+        except BreakerOpen:
+            pass
+        except Exception as exc:
+            logger.warning("rate limit store unavailable, bucket not reset: %r", exc)
+
+    def close(self) -> None:
+        self._redis.close()
+
+
+def open_buckets(url: str):
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBuckets(url)
+    return LocalBuckets()
+
+
+class RateLimited(Exception):
+    def __init__(self, rule: Rule, retry_after_s: float):
+        super().__init__(f"rate limit {rule.name} exceeded")
+        self.rule = rule
+        self.retry_after_s = retry_after_s
+
+
+class RateLimiter:
+    def __init__(self, buckets=None, enabled: bool = True):
+        # Not ``buckets or ...``: empty LocalBuckets are falsy
+        self.buckets = buckets if buckets is not None else LocalBuckets()
+        self.enabled = enabled
+
+    def check(self, rule: Rule, key: str) -> None:
+        """Raise RateLimited if ``key`` has no token left under ``rule``."""
+        if not self.enabled:
+            return
+        wait = self.buckets.take(rule, key)
+        if wait > 0:
+            raise RateLimited(rule, wait)
+
+    def reset(self, rule: Rule, key: str) -> None:
+        if self.enabled:
+            self.buckets.reset(rule, key)
+
+
+def client_ip(scope) -> str:
+    client = scope.get("client")
+    return client[0] if client else "desconocido"
+
+
+class RateLimitMiddleware:
+    """Per-IP limits keyed by (method, path), applied before the request
+    body is read, so refused requests cost no parsing and no queries."""
+
+    def __init__(self, app, limiter: RateLimiter, rules: Mapping[Tuple[str, str], Rule]):
+        self.app = app
+        self.limiter = limiter
+        self.rules = dict(rules)
+
+    async def __call__(self, scope, receive, send):
+        rule: Optional[Rule] = None
+        if scope["type"] == "http":
+            rule = self.rules.get((scope["method"], scope["path"]))
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            # Off the event loop: with Redis buckets this is a network round trip
+            await run_in_threadpool(self.limiter.check, rule, client_ip(scope))
+        except RateLimited as exc:
+            RATE_LIMITED.inc((rule.name,))
+            await send_too_many_requests(send, exc.retry_after_s)
+            return
+        await self.app(scope, receive, send)
+
+
+TOO_MANY_REQUESTS_DETAIL = "Demasiadas solicitudes, intenta de nuevo en unos minutos"
+
+
+def retry_after_header(retry_after_s: float) -> str:
+    return str(max(1, math.ceil(retry_after_s)))
+
+
+async def send_too_many_requests(send, retry_after_s: float) -> None:
+    body = orjson.dumps({"detail": TOO_MANY_REQUESTS_DETAIL})
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", retry_after_header(retry_after_s).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,203 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Hashable, List, Optional, Sequence, Tuple, Type
+
+from cache import TTLCache
+from metrics import REGISTRY
+
+CLOSED, HALF_OPEN, OPEN = "cerrado", "semiabierto", "abierto"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+logger = logging.getLogger("recicla_contigo.resilience")
+
+_breakers: List["CircuitBreaker"] = []
+
+
+class BreakerOpen(Exception):
+    """Raised instead of calling a dependency whose breaker is open."""
+
+    def __init__(self, dependency: str, retry_after_s: float):
+        super().__init__(f"{dependency} no disponible")
+        self.dependency = dependency
+        self.retry_after_s = retry_after_s
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one dependency.
+
+    After ``failure_threshold`` failures in a row the breaker opens and
+    ``guard`` raises ``BreakerOpen`` without touching the dependency. Once
+    ``reset_timeout_s`` has passed a single probe call is let through: if
+    it succeeds the breaker closes, otherwise it stays open for another
+    period. Only exceptions in ``failure_types`` count as failures; a bad
+    request or a 404 says nothing about the dependency's health.
+    """
+
+    def __init__(self, name: str, failure_types: Tuple[Type[BaseException], ...] = (Exception,),
+                 failure_threshold: int = 5, reset_timeout_s: float = 15):
+        self.name = name
+        self.failure_types = failure_types
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_total = 0
+        self.last_latency_ms: Optional[float] = None
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        _breakers.append(self)
+
+    def configure(self, failure_threshold: int, reset_timeout_s: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+
+    def retry_after_s(self) -> float:
+        return max(0.0, self._opened_at + self.reset_timeout_s - time.monotonic())
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN and self.retry_after_s() == 0:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            raise BreakerOpen(self.name, self.retry_after_s() or self.reset_timeout_s)
+
+    def record_success(self, latency_ms: float) -> None:
+        with self._lock:
+            self.last_latency_ms = latency_ms
+            self.failures = 0
+            self.state = CLOSED
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.opened_total += 1
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+
+    @contextmanager
+    def guard(self):
+        self.before_call()
+        start = time.perf_counter()
+        try:
+            yield
+        except self.failure_types:
+            self.record_failure()
+            raise
+        except BaseException:
+            self.record_success((time.perf_counter() - start) * 1000)
+            raise
+        self.record_success((time.perf_counter() - start) * 1000)
+
+    def status(self) -> dict:
+        latency = self.last_latency_ms
+        return {
+            "estado": self.state,
+            "latencia_ms": None if latency is None else round(latency, 2),
+            "fallos_consecutivos": self.failures,
+        }
+
+
+class _BreakerCollector:
+    name = "circuit_breaker_state"
+    documentation = "Circuit breaker state per dependency (0 closed, 1 half-open, 2 open)."
+    kind = "gauge"
+
+    def samples(self) -> List[str]:
+        return [f'{self.name}{{dependency="{b.name}"}} {_STATE_VALUES[b.state]}'
+                for b in _breakers]
+
+
+class _BreakerOpenedCollector:
+    name = "circuit_breaker_opened_total"
+    documentation = "Times each dependency's circuit breaker has opened."
+    kind = "counter"
+
+    def samples(self) -> List[str]:
+        return [f'{self.name}{{dependency="{b.name}"}} {b.opened_total}' for b in _breakers]
+
+
+REGISTRY.register(_BreakerCollector())
+REGISTRY.register(_BreakerOpenedCollector())
+
+
+class Snapshots:
+    """Last good payload per key, kept long after any cache TTL.
+
+    Read endpoints save what they serve here so that, while a dependency is
+    down, they can answer with the last known data instead of an error.
+    """
+
+    def __init__(self, maxsize: int = 4096, max_age_s: float = 24 * 3600):
+        self._data = TTLCache(maxsize=maxsize, ttl=max_age_s)
+
+    def save(self, key: Hashable, body: bytes) -> None:
+        self._data.set(key, (body, time.time()))
+
+    def get(self, key: Hashable) -> Optional[Tuple[bytes, float]]:
+        """Return (body, age in seconds) or None."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        body, saved_at = entry
+        return body, max(0.0, time.time() - saved_at)
+
+
+_FAILED = object()
+
+
+class GuardedStore:
+    """Shared cache store behind a circuit breaker.
+
+    The L2 is an optimisation: when it fails or its breaker is open, reads
+    behave as misses and writes are dropped, so requests fall through to
+    the in-process L1 and Mongo instead of failing.
+    """
+
+    def __init__(self, store, breaker: CircuitBreaker):
+        self.store = store
+        self.breaker = breaker
+
+    def _call(self, fallback, fn, *args):
+        try:
+            with self.breaker.guard():
+                return fn(*args)
+        except BreakerOpen:
+            return fallback
+        except Exception:
+            logger.warning("shared cache store call %s failed", fn.__name__, exc_info=True)
+            return fallback
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        return self._call([None] * len(keys), self.store.get_many, keys)
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._call(None, self.store.set, key, value, ttl)
+
+    def delete(self, keys: Sequence[str]) -> None:
+        self._call(None, self.store.delete, keys)
+
+    def publish(self, channel: str, message: bytes) -> None:
+        self._call(None, self.store.publish, channel, message)
+
+    def subscribe(self, channel: str, callback: Callable[[bytes], None]) -> None:
+        self.store.subscribe(channel, callback)
+
+    def ping(self) -> Optional[float]:
+        """Round trip in ms, or None if the store is unavailable."""
+        if self._call(_FAILED, self.store.ping) is _FAILED:
+            return None
+        return self.breaker.last_latency_ms
+
+    def close(self) -> None:
+        self.store.close()
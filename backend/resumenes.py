@@ -0,0 +1,186 @@
+"""Daily report rollups for the analytics dashboards.
+
+One counter document per (dia, zona) in ``resumenes_diarios``, plus one per
+day for the whole district under ``ZONA_TODAS``, as in the leaderboards. A
+report counts on the day it was made (Lima time) whatever happens to it
+later: the row of a day says how many of that day's reports are active,
+resolved, rejected or expired now, and how long the resolved ones took.
+Every state change moves one unit between two estado counters, so a year
+of dashboard is a range read of 366 small documents no matter how many
+reports there are.
+
+Reports enter the rollups once moderated; pending ones are not counted.
+
+``reconstruir`` recomputes whole days from the reports themselves, live
+and archived, one window of days at a time. It is the backfill, and the
+repair for counters that drifted.
+"""
+
+from collections import Counter, defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from puntajes import HORA_PERU, ZONA_TODAS
+
+COLECCION = "resumenes_diarios"
+PENDIENTE = "pendiente"
+# Reports remembered per row to skip retried outbox entries; a busy day
+# and zone approves far fewer than this between retries
+RECORDADOS = 100
+_DUPLICADO = 11000
+
+Clave = Tuple[str, str]
+
+
+def dia(fecha: datetime) -> str:
+    """Local day of ``fecha`` (naive UTC) as YYYY-MM-DD."""
+    return fecha.replace(tzinfo=timezone.utc).astimezone(HORA_PERU).date().isoformat()
+
+
+def inicio(d: date) -> datetime:
+    """Naive UTC instant at which local day ``d`` starts."""
+    return datetime.combine(d, time(), HORA_PERU).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class _Suma:
+    def __init__(self):
+        self.inc: Dict[Clave, Counter] = defaultdict(Counter)
+        self.max_s: Dict[Clave, float] = {}
+
+    def mover(self, reporte: dict, de: Optional[str], a: str,
+              resuelto_en: Optional[datetime] = None) -> None:
+        zonas = [ZONA_TODAS] + ([reporte["zona"]] if reporte.get("zona") else [])
+        for zona in zonas:
+            clave = (dia(reporte["fecha"]), zona)
+            inc = self.inc[clave]
+            inc[f"estados.{a}"] += 1
+            if de is None:
+                inc["total"] += 1
+            else:
+                inc[f"estados.{de}"] -= 1
+            if resuelto_en is not None:
+                segundos = max((resuelto_en - reporte["fecha"]).total_seconds(), 0.0)
+                inc["resolucion.n"] += 1
+                inc["resolucion.suma_s"] += segundos
+                self.max_s[clave] = max(self.max_s.get(clave, 0.0), segundos)
+
+
+def incrementos(reportes: Iterable[dict], de: Optional[str], a: str,
+                resuelto_en: Optional[datetime] = None,
+                reporte_id: Optional[str] = None) -> List[UpdateOne]:
+    """Upserts moving ``reportes`` (with ``fecha`` and ``zona``) from estado
+    ``de`` to ``a``; ``de=None`` counts them for the first time. Pass
+    ``resuelto_en`` when they were resolved, to add their resolution time.
+
+    With ``reporte_id`` (a single report) each row remembers the last
+    reports it counted and skips one it has seen, so a retried outbox
+    entry does not count twice: the upsert then collides with the
+    existing row instead (see ``registrar``).
+    """
+    suma = _Suma()
+    for reporte in reportes:
+        suma.mover(reporte, de, a, resuelto_en)
+    operaciones = []
+    for (d, zona), inc in suma.inc.items():
+        filtro = {"dia": d, "zona": zona}
+        actualizacion = {"$inc": dict(inc)}
+        if (d, zona) in suma.max_s:
+            actualizacion["$max"] = {"resolucion.max_s": suma.max_s[(d, zona)]}
+        if reporte_id is not None:
+            filtro["reportes"] = {"$ne": reporte_id}
+            actualizacion["$push"] = {"reportes": {"$each": [reporte_id], "$slice": -RECORDADOS}}
+        operaciones.append(UpdateOne(filtro, actualizacion, upsert=True))
+    return operaciones
+
+
+def registrar(db, reportes: Iterable[dict], de: Optional[str], a: str,
+              resuelto_en: Optional[datetime] = None, reporte_id: Optional[str] = None) -> None:
+    operaciones = incrementos(reportes, de, a, resuelto_en, reporte_id)
+    if not operaciones:
+        return
+    try:
+        db[COLECCION].bulk_write(operaciones, ordered=False)
+    except BulkWriteError as exc:
+        # Rows that had already counted the report
+        if any(e["code"] != _DUPLICADO for e in exc.details["writeErrors"]):
+            raise
+
+
+def _documento(d: str, zona: str, inc: Counter, max_s: Optional[float]) -> dict:
+    doc = {"dia": d, "zona": zona, "total": inc["total"], "estados": {}}
+    for campo, valor in inc.items():
+        if campo.startswith("estados."):
+            doc["estados"][campo[len("estados."):]] = valor
+    if inc["resolucion.n"]:
+        doc["resolucion"] = {"n": inc["resolucion.n"], "suma_s": inc["resolucion.suma_s"], "max_s": max_s}
+    return doc
+
+
+def reconstruir(db, desde: date, hasta: date, colecciones: Sequence[str] = ("reportes",),
+                ventana_dias: int = 31, lote: int = 1000) -> int:
+    """Recompute the rollups of local days ``desde``..``hasta`` (inclusive)
+    from the reports in ``colecciones``. Each window of days is read with
+    one cursor per collection and then replaced as a whole; increments
+    landing while a window is rebuilt may be lost, so run it off-peak.
+    Returns the number of reports counted."""
+    contados = 0
+    ini = desde
+    while ini <= hasta:
+        fin = min(ini + timedelta(days=ventana_dias), hasta + timedelta(days=1))
+        suma = _Suma()
+        query = {"fecha": {"$gte": inicio(ini), "$lt": inicio(fin)}, "estado": {"$ne": PENDIENTE}}
+        for coleccion in colecciones:
+            cursor = db[coleccion].find(
+                query, {"fecha": 1, "zona": 1, "estado": 1, "resuelto_en": 1}, batch_size=lote
+            )
+            for reporte in cursor:
+                suma.mover(reporte, None, reporte["estado"], reporte.get("resuelto_en"))
+                contados += 1
+        db[COLECCION].delete_many({"dia": {"$gte": ini.isoformat(), "$lt": fin.isoformat()}})
+        documentos = [_documento(d, zona, inc, suma.max_s.get((d, zona)))
+                      for (d, zona), inc in sorted(suma.inc.items())]
+        if documentos:
+            db[COLECCION].insert_many(documentos, ordered=False)
+        ini = fin
+    return contados
+
+
+def serie(db, desde: date, hasta: date, zona: Optional[str] = None) -> List[dict]:
+    """Rows of one zone (or the district) for the days in range, oldest first."""
+    return list(db[COLECCION].find(
+        {"dia": {"$gte": desde.isoformat(), "$lte": hasta.isoformat()}, "zona": zona or ZONA_TODAS},
+        {"_id": 0, "reportes": 0},
+    ).sort("dia", 1))
+
+
+def por_zona(db, desde: date, hasta: date) -> List[dict]:
+    """Totals per zone over the days in range."""
+    totales: Dict[str, dict] = {}
+    for fila in db[COLECCION].find(
+        {"dia": {"$gte": desde.isoformat(), "$lte": hasta.isoformat()}, "zona": {"$ne": ZONA_TODAS}},
+        {"_id": 0, "reportes": 0},
+    ):
+        total = totales.setdefault(fila["zona"], {"zona": fila["zona"], "total": 0, "estados": Counter(),
+                                                  "resolucion": {"n": 0, "suma_s": 0.0, "max_s": 0.0}})
+        total["total"] += fila.get("total", 0)
+        total["estados"].update(fila.get("estados", {}))
+        resolucion = fila.get("resolucion")
+        if resolucion:
+            total["resolucion"]["n"] += resolucion["n"]
+            total["resolucion"]["suma_s"] += resolucion["suma_s"]
+            total["resolucion"]["max_s"] = max(total["resolucion"]["max_s"], resolucion.get("max_s") or 0.0)
+    return sorted(totales.values(), key=lambda t: t["zona"])
+
+
+def con_promedio(fila: dict) -> dict:
+    """Row as served: plain estado counts and the mean resolution in hours."""
+    resolucion = fila.pop("resolucion", None) or {}
+    fila["estados"] = {k: v for k, v in dict(fila.get("estados", {})).items() if v}
+    fila["resolucion_media_h"] = (
+        round(resolucion["suma_s"] / resolucion["n"] / 3600, 2) if resolucion.get("n") else None
+    )
+    fila["resolucion_max_h"] = round(resolucion["max_s"] / 3600, 2) if resolucion.get("n") else None
+    return fila
@@ -0,0 +1,40 @@
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from fastapi.responses import JSONResponse
+
+# orjson serializes datetime, date, UUID and dataclasses natively; everything
+# else Mongo hands back is resolved here so handlers can return raw documents.
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        obj = obj.to_decimal()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class MongoJSONResponse(JSONResponse):
+    """JSON response rendered with orjson, aware of ObjectId and Decimal.
+
+    Returning an instance directly from a handler skips FastAPI's
+    ``jsonable_encoder`` pass entirely, which is where most of the time goes
+    on large report lists.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
@@ -1,30 +1,185 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pymongo import MongoClient
+from fastapi.responses import StreamingResponse
+from pymongo import ASCENDING, DESCENDING, TEXT, ReturnDocument
+from bson import ObjectId
 from pydantic import BaseModel
-from datetime import datetime, timedelta
-from typing import Optional, List
-import os
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta, timezone
+from functools import partial
+from typing import Annotated, Callable, Hashable, Literal, Optional, List
+import asyncio
+import base64
 import hashlib
+import importlib.util
+import logging
+import math
+import time
 import jwt
-from dotenv import load_dotenv
+import archivo
+import columnar
+import database
+import eventos
+import exportar
+import logros
+import outbox
+import puntajes
+import resumenes
+import tiles
+from admission import AUTH, READS, UPLOADS, AdmissionController, AdmissionMiddleware
+from busqueda import parse_bbox, resaltados, terminos
+from cache import LOCAL_STORE, TwoLevelCache, open_shared_store
+from ratelimit import (
+    TOO_MANY_REQUESTS_DETAIL, LocalBuckets, RATE_LIMITED, RateLimited, RateLimiter,
+    RateLimitMiddleware, Rule, client_ip, open_buckets, retry_after_header,
+)
+from resilience import BreakerOpen, CircuitBreaker, GuardedStore, Snapshots
+from config import Settings
+from fotos import abrir_fotos, decodificar
+from serialization import MongoJSONResponse, dumps
+from metrics import REGISTRY, PROMETHEUS_CONTENT_TYPE, MetricsMiddleware
+from query_monitor import QueryMonitor, QueryStatsMiddleware
+from database import get_db, get_read_db
+from contenido import INCENTIVOS, NOTICIAS, CONTENIDO_EDUCATIVO, TERMINOS, HORARIOS_RECOLECCION
+from zonas import indice as indice_zonas
 
-load_dotenv()
+logger = logging.getLogger("recicla_contigo")
 
-app = FastAPI(title="VENTANILLA RECICLA CONTIGO API")
+router = APIRouter()
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Replaced by create_app(); module default keeps handlers callable directly
+settings = Settings()
+
+# Hot payloads kept rendered as JSON bytes, filled during warm-up
+_prerendered: dict = {}
+
+# Two-level caches (per-worker L1, shared L2); writes invalidate across workers
+# Feed and map also coalesce concurrent identical requests (single-flight)
+# and serve stale while revalidating, see TwoLevelCache.get_or_set
+feed_cache = TwoLevelCache("feed", l1_maxsize=256)
+mapa_cache = TwoLevelCache("mapa", l1_maxsize=8)
+ranking_cache = TwoLevelCache("ranking", l1_maxsize=16)
+nombres_cache = TwoLevelCache("nombres", l1_maxsize=10_000)
+# Profiles without the avatar, which is served from its own URL
+perfiles_cache = TwoLevelCache("perfiles", l1_maxsize=10_000)
+# Invalidated tile by tile, so the TTL is only a safety net
+tiles_cache = TwoLevelCache("tiles", l1_maxsize=4096)
+# Set by the lifespan when TILES_DIR is configured
+tiles_disk = None
+
+# Last good payloads, served with a Warning header while Mongo is down.
+# Sized per endpoint: feed and map bodies are large, profiles are small.
+feed_snapshots = Snapshots(maxsize=32)
+mapa_snapshots = Snapshots(maxsize=4)
+ranking_snapshots = Snapshots(maxsize=64)
+perfil_snapshots = Snapshots(maxsize=10_000)
+
+cache_breaker = CircuitBreaker("cache", reset_timeout_s=5)
+
+MONGO_DOWN = (BreakerOpen, *database.UNAVAILABLE_ERRORS)
+
+# Rate limits. Per IP is lenient because mobile carriers put many users
+# behind one address; per account/user is what stops brute force and
+# point farming. Login attempts are counted per (IP, account), so failing
+# on purpose from elsewhere cannot lock the owner out of their account.
+LOGIN_POR_IP = Rule("login_ip", capacity=30, period_s=60)
+LOGIN_POR_CUENTA = Rule("login_cuenta", capacity=5, period_s=300)
+REGISTRO_POR_IP = Rule("registro_ip", capacity=10, period_s=3600)
+REPORTE_POR_IP = Rule("reporte_ip", capacity=60, period_s=3600)
+REPORTE_POR_USUARIO = Rule("reporte_usuario", capacity=10, period_s=3600)
+
+rate_limiter = RateLimiter()
+
+PUNTOS_REPORTE = 20
+
+def otorgar_logros(evento: eventos.Evento):
+    logros.procesar(get_db(), evento)
+    perfiles_cache.invalidate(evento.usuario_id)
+
+for _tipo in (eventos.INCENTIVO_CANJEADO, eventos.PERFIL_ACTUALIZADO):
+    eventos.suscribir(_tipo, otorgar_logros)
 
-# MongoDB connection
-MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
-client = MongoClient(MONGO_URL)
-db = client.recicla_contigo_db
+# Report side effects, run by the outbox workers after the insert
+def premiar_reporte(evento: eventos.Evento):
+    if not ObjectId.is_valid(evento.usuario_id):
+        return
+    reporte_id = evento.datos["reporte_id"]
+    # The user remembers the last reports it was paid for, so a retried
+    # entry does not pay twice
+    get_db().usuarios.update_one(
+        {"_id": ObjectId(evento.usuario_id), "reportes_premiados": {"$ne": reporte_id}},
+        {
+            "$inc": {"puntos": PUNTOS_REPORTE, "reportes_enviados": 1},
+            "$push": {"reportes_premiados": {"$each": [reporte_id], "$slice": -20}},
+        },
+    )
+    ranking_cache.invalidate()
+    perfiles_cache.invalidate(evento.usuario_id)
+
+def sumar_puntajes(evento: eventos.Evento):
+    puntajes.aplicar(get_db(), puntajes.incrementos(
+        evento.usuario_id, evento.datos.get("zona"), PUNTOS_REPORTE, evento.fecha,
+        reporte_id=evento.datos["reporte_id"],
+    ))
+    ranking_cache.invalidate()
+
+def resumir_reporte(evento: eventos.Evento):
+    resumenes.registrar(get_db(), [{"fecha": evento.fecha, "zona": evento.datos.get("zona")}],
+                        None, archivo.ACTIVO, reporte_id=evento.datos["reporte_id"])
+
+outbox_worker = outbox.OutboxWorker(get_db, "reportes", {
+    eventos.REPORTE_CREADO: {
+        "puntos": premiar_reporte,
+        "puntajes": sumar_puntajes,
+        "logros": otorgar_logros,
+        "resumen": resumir_reporte,
+    },
+})
+
+def ensure_indexes():
+    db = get_db()
+    db.usuarios.create_index([("email", ASCENDING)])
+    db.usuarios.create_index([("puntos", DESCENDING)])
+    db.reportes.create_index([
+        ("publico", ASCENDING), ("estado", ASCENDING), ("fecha", DESCENDING), ("_id", DESCENDING)
+    ])
+    db.reportes.create_index([("usuario_id", ASCENDING), ("fecha", DESCENDING)])
+    # Keyword search; Spanish stemming, and version 3 text indexes ignore
+    # case and accents. Only one text index per collection is allowed.
+    db.reportes.create_index(
+        [("descripcion", TEXT), ("direccion", TEXT)],
+        name="reportes_texto",
+        default_language="spanish",
+        weights={"descripcion": 3, "direccion": 1},
+    )
+    # Leaderboard buckets: one upsert target per award, top N is a range read
+    db.puntajes.create_index(
+        [("ventana", ASCENDING), ("zona", ASCENDING), ("usuario_id", ASCENDING)], unique=True
+    )
+    db.puntajes.create_index([
+        ("ventana", ASCENDING), ("zona", ASCENDING), ("puntos", DESCENDING), ("usuario_id", ASCENDING)
+    ])
+    db.puntajes.create_index([("expira_en", ASCENDING)], expireAfterSeconds=0)
+    db[resumenes.COLECCION].create_index([("dia", ASCENDING), ("zona", ASCENDING)], unique=True)
+    # Delta sync walks reports in modification order
+    db.reportes.create_index([("actualizado_en", ASCENDING), ("_id", ASCENDING)])
+    db.notificaciones.create_index([("usuario_id", ASCENDING), ("fecha", DESCENDING)])
+    # Map tiles are bounding-box reads over visible reports only
+    db.reportes.create_index(
+        [("latitud", ASCENDING), ("longitud", ASCENDING)],
+        name="mapa_tiles",
+        partialFilterExpression={"publico": True, "estado": archivo.ACTIVO},
+    )
+    # Moderation queue, oldest first; only pending reports are indexed
+    db.reportes.create_index(
+        [("fecha", ASCENDING), ("_id", ASCENDING)],
+        name="cola_moderacion",
+        partialFilterExpression={"estado": archivo.PENDIENTE},
+    )
+    outbox_worker.ensure_indexes()
+    archivo.ensure_indexes(db)
+    # Reports from before delta sync: python cli.py sembrar-actualizado
 
 # JWT Configuration
 SECRET_KEY = "recicla_contigo_secret_key_2024"
@@ -56,7 +211,6 @@ class ReporteCreate(BaseModel):
 
 class CanjearIncentivo(BaseModel):
     incentivo_id: str
-    usuario_id: str
 
 # Helper Functions
 def hash_password(password: str) -> str:
@@ -75,13 +229,137 @@ def verify_token(token: str) -> dict:
     except jwt.PyJWTError:
         return None
 
+ROL_MODERADOR = "moderador"
+ROL_ANALISTA = "analista"
+
+def usuario_actual(authorization: Annotated[Optional[str], Header()] = None) -> str:
+    """Id of the user whose Bearer token came with the request."""
+    esquema, _, token = (authorization or "").partition(" ")
+    payload = verify_token(token) if esquema.lower() == "bearer" else None
+    if not payload or not ObjectId.is_valid(payload.get("user_id", "")):
+        raise HTTPException(status_code=401, detail="Token inválido o ausente",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return payload["user_id"]
+
+def ip_cliente(request: Request) -> str:
+    return client_ip(request.scope)
+
+def usuario_con_rol(authorization: Optional[str], roles, detalle: str) -> str:
+    user_id = usuario_actual(authorization)
+    # The role is read on every call so revoking it takes effect at once
+    db = get_db()
+    with database.guard(settings.mongo.read_deadline_ms):
+        usuario = db.usuarios.find_one({"_id": ObjectId(user_id)}, {"rol": 1})
+    if usuario is None or usuario.get("rol") not in roles:
+        raise HTTPException(status_code=403, detail=detalle)
+    return user_id
+
+def moderador_actual(authorization: Annotated[Optional[str], Header()] = None) -> str:
+    return usuario_con_rol(authorization, (ROL_MODERADOR,), "Se requiere rol de moderador")
+
+def analista_actual(authorization: Annotated[Optional[str], Header()] = None) -> str:
+    return usuario_con_rol(authorization, (ROL_ANALISTA, ROL_MODERADOR), "Se requiere rol de analista")
+
+def static_response(name: str, payload) -> Response:
+    body = _prerendered.get(name)
+    if body is None:
+        body = _prerendered[name] = dumps(payload)
+    return Response(body, media_type="application/json")
+
+def etag_response(body: bytes, if_none_match: Optional[str], media_type: str = "application/json",
+                  cache_control: str = "public, no-cache") -> Response:
+    # no-cache: clients and proxies keep the body but revalidate, which is
+    # a 304 with no body while it has not changed
+    etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if if_none_match:
+        candidatos = {c.strip().removeprefix("W/") for c in if_none_match.split(",")}
+        if etag in candidatos or "*" in candidatos:
+            return Response(status_code=304, headers=headers)
+    return Response(body, media_type=media_type, headers=headers)
+
+def usuario_nombres(ids: set) -> dict:
+    nombres = {uid: raw.decode() for uid, raw in nombres_cache.get_many(list(ids)).items()}
+    faltantes = [ObjectId(uid) for uid in ids if uid not in nombres]
+    if faltantes:
+        # One $in lookup for the whole page instead of a find_one per report.
+        # From the primary: a miss often follows a rename's invalidation, and
+        # a lagging secondary would put the old name back for the whole TTL
+        db = get_db()
+        for user in db.usuarios.find({"_id": {"$in": faltantes}}, {"nombre": 1}):
+            if user.get("nombre") is not None:
+                uid = str(user["_id"])
+                nombres[uid] = user["nombre"]
+                nombres_cache.set(uid, user["nombre"].encode(), settings.nombres_cache_ttl_s)
+    return nombres
+
+def add_usuario_nombres(reportes: list, default: str):
+    ids = {r["usuario_id"] for r in reportes if ObjectId.is_valid(r.get("usuario_id") or "")}
+    nombres = usuario_nombres(ids) if ids else {}
+    for reporte in reportes:
+        if reporte.get("usuario_id"):
+            reporte["usuario_nombre"] = nombres.get(reporte["usuario_id"], default)
+
+def invalidate_tiles(*puntos):
+    """Drop the tiles showing markers at these (lat, lon) points."""
+    claves = {tiles.clave(t) for lat, lon in puntos for t in tiles.afectados(lat, lon)}
+    tiles_cache.invalidate(*claves)
+    if tiles_disk is not None:
+        tiles_disk.invalidate(claves)
+
+# Graceful degradation
+def read_mongo(load: Callable, *args):
+    with database.guard(settings.mongo.read_deadline_ms):
+        return load(*args)
+
+def degradable_read(snapshots: Snapshots, key: Hashable, load: Callable[[], bytes],
+                    media_type: str = "application/json", headers: Optional[dict] = None) -> Response:
+    """Serve load(); while Mongo is failing, the last good body instead."""
+    headers = dict(headers or {})
+    try:
+        body = load()
+    except MONGO_DOWN:
+        snapshot = snapshots.get(key)
+        if snapshot is None:
+            raise
+        body, age = snapshot
+        headers.update({"Warning": '110 - "Response is Stale"', "Age": str(int(age))})
+        return Response(body, media_type=media_type, headers=headers)
+    snapshots.save(key, body)
+    return Response(body, media_type=media_type, headers=headers)
+
+async def rate_limited(request: Request, exc: RateLimited):
+    RATE_LIMITED.inc((exc.rule.name,))
+    return MongoJSONResponse(
+        {"detail": TOO_MANY_REQUESTS_DETAIL},
+        status_code=429,
+        headers={"Retry-After": retry_after_header(exc.retry_after_s)},
+    )
+
+async def dependency_unavailable(request: Request, exc: Exception):
+    retry_after = exc.retry_after_s if isinstance(exc, BreakerOpen) else settings.mongo.breaker_reset_s
+    return MongoJSONResponse(
+        {"detail": "Servicio temporalmente no disponible, intenta de nuevo en unos segundos"},
+        status_code=503,
+        headers={"Retry-After": str(math.ceil(retry_after))},
+    )
+
 # Routes
-@app.get("/")
+@router.get("/")
 def read_root():
     return {"message": "VENTANILLA RECICLA CONTIGO API - Cuidando nuestro planeta"}
 
-@app.post("/api/usuarios")
+@router.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return Response(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@router.post("/api/usuarios")
 def register_user(user: UserRegister):
+    with database.guard(settings.mongo.write_deadline_ms):
+        return create_usuario(user)
+
+def create_usuario(user: UserRegister):
+    db = get_db()
     # Check if user exists
     existing_user = db.usuarios.find_one({"email": user.email})
     if existing_user:
@@ -89,6 +367,10 @@ def register_user(user: UserRegister):
     
     # Create new user
     hashed_password = hash_password(user.password)
+    # Users may register from outside the district; they just get no zone
+    sector = None
+    if user.latitud is not None and user.longitud is not None:
+        sector = indice_zonas().localizar(user.latitud, user.longitud)
     new_user = {
         "nombre": user.nombre,
         "email": user.email,
@@ -96,6 +378,8 @@ def register_user(user: UserRegister):
         "latitud": user.latitud,
         "longitud": user.longitud,
         "foto_perfil": user.foto_perfil,
+        "zona": sector.zona if sector else None,
+        "sector": sector.sector if sector else None,
         "puntos": 0,
         "reportes_enviados": 0,
         "fecha_registro": datetime.utcnow(),
@@ -120,10 +404,14 @@ def register_user(user: UserRegister):
         }
     }
 
-@app.post("/api/login")
-def login_user(login_data: UserLogin):
+@router.post("/api/login")
+def login_user(login_data: UserLogin, ip: Annotated[str, Depends(ip_cliente)]):
+    intento = f"{ip}:{login_data.email.strip().lower()}"
+    rate_limiter.check(LOGIN_POR_CUENTA, intento)
+    db = get_db()
     # Find user
-    user = db.usuarios.find_one({"email": login_data.email})
+    with database.guard(settings.mongo.read_deadline_ms):
+        user = db.usuarios.find_one({"email": login_data.email})
     if not user:
         raise HTTPException(status_code=401, detail="Credenciales inválidas")
     
@@ -132,6 +420,8 @@ def login_user(login_data: UserLogin):
     if user["password"] != hashed_password:
         raise HTTPException(status_code=401, detail="Credenciales inválidas")
     
+    # Only failed attempts count against the account
+    rate_limiter.reset(LOGIN_POR_CUENTA, intento)
     # Create token
     user_id = str(user["_id"])
     token = create_access_token(user_id)
@@ -143,36 +433,103 @@ def login_user(login_data: UserLogin):
         "usuario": {
             "id": user_id,
             "nombre": user["nombre"],
+            "rol": user.get("rol"),
             "email": user["email"],
             "puntos": user.get("puntos", 0)
         }
     }
 
-@app.get("/api/usuarios/{user_id}")
-def get_user(user_id: str):
-    from bson import ObjectId
-    try:
-        user = db.usuarios.find_one({"_id": ObjectId(user_id)})
-        if not user:
-            raise HTTPException(status_code=404, detail="Usuario no encontrado")
-        
-        return {
-            "id": str(user["_id"]),
-            "nombre": user["nombre"],
-            "email": user["email"],
-            "puntos": user.get("puntos", 0),
-            "reportes_enviados": user.get("reportes_enviados", 0),
-            "logros": user.get("logros", []),
-            "foto_perfil": user.get("foto_perfil", None),
-            "fecha_registro": user.get("fecha_registro")
-        }
-    except Exception:
+def foto_perfil_ref(user_id: str, foto: Optional[str]) -> Optional[str]:
+    """Where the avatar is served from. Inline photos get a URL versioned
+    by their content, so clients can cache it for good; anything else is
+    already a URL."""
+    if not foto:
+        return None
+    if not foto.startswith("data:"):
+        return foto
+    return f"/api/usuarios/{user_id}/foto?v={version_foto(foto)}"
+
+
+def version_foto(foto: str) -> str:
+    return hashlib.blake2b(foto.encode(), digest_size=8).hexdigest()
+
+def perfil_body(user: dict) -> bytes:
+    user_id = str(user["_id"])
+    return dumps({
+        "id": user_id,
+        "nombre": user["nombre"],
+        "email": user["email"],
+        "puntos": user.get("puntos", 0),
+        "reportes_enviados": user.get("reportes_enviados", 0),
+        "logros": user.get("logros", []),
+        "foto_perfil": foto_perfil_ref(user_id, user.get("foto_perfil")),
+        "fecha_registro": user.get("fecha_registro")
+    })
+
+def load_perfil(user_id: str) -> bytes:
+    db = get_db()
+    user = db.usuarios.find_one({"_id": ObjectId(user_id)}, {"reportes_premiados": 0})
+    if not user:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    return perfil_body(user)
+
+def refresh_perfil(user: dict) -> None:
+    # Write-through: other workers drop their copy, this one and the shared
+    # store get the new profile without another read
+    user_id = str(user["_id"])
+    perfiles_cache.invalidate(user_id)
+    perfiles_cache.set(user_id, perfil_body(user), settings.perfil_cache_ttl_s)
+
+# Profiles carry the email, so only the user's own client may keep them
+PERFIL_CACHE_CONTROL = "private, no-cache"
+
+@router.get("/api/usuarios/{user_id}")
+def get_user(user_id: str, if_none_match: Annotated[Optional[str], Header()] = None):
+    if not ObjectId.is_valid(user_id):
         raise HTTPException(status_code=400, detail="ID de usuario inválido")
+    try:
+        body = perfiles_cache.get_or_set(
+            user_id, partial(read_mongo, load_perfil, user_id), settings.perfil_cache_ttl_s
+        )
+    except MONGO_DOWN:
+        snapshot = perfil_snapshots.get(user_id)
+        if snapshot is None:
+            raise
+        body, age = snapshot
+        respuesta = etag_response(body, if_none_match, cache_control=PERFIL_CACHE_CONTROL)
+        respuesta.headers.update({"Warning": '110 - "Response is Stale"', "Age": str(int(age))})
+        return respuesta
+    perfil_snapshots.save(user_id, body)
+    return etag_response(body, if_none_match, cache_control=PERFIL_CACHE_CONTROL)
 
-@app.put("/api/usuarios/{user_id}")
-def update_user(user_id: str, user_update: UserUpdate):
-    from bson import ObjectId
+@router.get("/api/usuarios/{user_id}/foto")
+def get_foto_perfil(user_id: str, v: Optional[str] = None):
+    if not ObjectId.is_valid(user_id):
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    # The primary: a secondary that lags behind a new photo would pin the
+    # old one under the new URL
+    db = get_db()
+    with database.guard(settings.mongo.read_deadline_ms):
+        user = db.usuarios.find_one({"_id": ObjectId(user_id)}, {"foto_perfil": 1})
+    foto = (user or {}).get("foto_perfil") or ""
     try:
+        contenido, tipo = decodificar(foto)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Foto no encontrada")
+    # The profile links a URL versioned by content: a new photo is a new URL.
+    # Only the version of the stored photo is cached for good
+    if v == version_foto(foto):
+        cache_control = "public, max-age=31536000, immutable"
+    else:
+        cache_control = "no-cache"
+    return Response(contenido, media_type=tipo, headers={"Cache-Control": cache_control})
+
+@router.put("/api/usuarios/{user_id}")
+def update_user(user_id: str, user_update: UserUpdate):
+    db = get_db()
+    if not ObjectId.is_valid(user_id):
+        raise HTTPException(status_code=400, detail="ID de usuario inválido")
+    with database.guard(settings.mongo.write_deadline_ms):
         update_data = {}
         
         if user_update.nombre is not None:
@@ -191,9 +548,21 @@ def update_user(user_id: str, user_update: UserUpdate):
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
+        
+        if "nombre" in update_data:
+            # Names are denormalized into cached feed pages and the ranking
+            nombres_cache.invalidate(user_id)
+            feed_cache.invalidate()
+            mapa_cache.invalidate()
+            ranking_cache.invalidate()
+        eventos.publicar(eventos.Evento(
+            eventos.PERFIL_ACTUALIZADO, user_id, datetime.utcnow(),
+            {"campos": sorted(update_data), "foto_perfil": bool(update_data.get("foto_perfil"))},
+        ))
             
         # Return updated user data
         updated_user = db.usuarios.find_one({"_id": ObjectId(user_id)})
+        refresh_perfil(updated_user)
         return {
             "id": str(updated_user["_id"]),
             "nombre": updated_user["nombre"],
@@ -201,89 +570,503 @@ def update_user(user_id: str, user_update: UserUpdate):
             "puntos": updated_user.get("puntos", 0),
             "reportes_enviados": updated_user.get("reportes_enviados", 0),
             "logros": updated_user.get("logros", []),
-            "foto_perfil": updated_user.get("foto_perfil", None),
+            "foto_perfil": foto_perfil_ref(str(updated_user["_id"]), updated_user.get("foto_perfil")),
             "fecha_registro": updated_user.get("fecha_registro"),
             "message": "Perfil actualizado exitosamente"
         }
-        
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error actualizando usuario: {str(e)}")
 
-class ReporteCreateWithUser(BaseModel):
-    descripcion: str
-    foto_base64: str
-    latitud: float
-    longitud: float
-    direccion: Optional[str] = None
-    usuario_id: str
+@router.post("/api/reportes")
+def create_reporte(
+    reporte: ReporteCreate,
+    usuario_id: Annotated[str, Depends(usuario_actual)],
+):
+    # Checked before the rate limit so a bad location does not spend a token
+    sector = indice_zonas().localizar(reporte.latitud, reporte.longitud)
+    if sector is None and settings.rechazar_fuera_de_zonas:
+        raise HTTPException(status_code=400, detail="La ubicación del reporte está fuera de Ventanilla")
+    rate_limiter.check(REPORTE_POR_USUARIO, usuario_id)
+    with database.guard(settings.mongo.write_deadline_ms):
+        return insert_reporte(usuario_id, reporte, sector)
 
-@app.post("/api/reportes")
-def create_reporte(reporte: ReporteCreateWithUser):
-    from bson import ObjectId
+def insert_reporte(usuario_id: str, reporte: ReporteCreate, sector):
+    db = get_db()
     
     # Create new report
     new_reporte = {
+        "_id": ObjectId(),
         "descripcion": reporte.descripcion,
         "foto_base64": reporte.foto_base64,
         "latitud": reporte.latitud,
         "longitud": reporte.longitud,
         "direccion": reporte.direccion,
-        "usuario_id": reporte.usuario_id,
+        "usuario_id": usuario_id,
+        # None outside the sector polygons, which are not official yet
+        "zona": sector.zona if sector else None,
+        "sector": sector.sector if sector else None,
         "fecha": datetime.utcnow(),
-        "estado": "activo",
-        "publico": True
+        # Hidden until a moderator approves it (see the moderation queue)
+        "estado": archivo.PENDIENTE,
+        "publico": False
     }
+    # Every write to a report must bump actualizado_en, or delta sync misses it
+    new_reporte["actualizado_en"] = new_reporte["fecha"]
+    # Claimable by a moderator from now on
+    new_reporte["revision_hasta"] = new_reporte["fecha"]
     
-    result = db.reportes.insert_one(new_reporte)
-    
-    # Award 20 points to user
-    try:
-        db.usuarios.update_one(
-            {"_id": ObjectId(reporte.usuario_id)},
-            {
-                "$inc": {"puntos": 20, "reportes_enviados": 1}
-            }
-        )
-    except Exception as e:
-        print(f"Error updating user points: {e}")
+    db.reportes.insert_one(new_reporte)
     
     return {
-        "message": "Reporte enviado exitosamente y publicado para la comunidad",
-        "reporte_id": str(result.inserted_id),
-        "puntos_ganados": 20
+        "message": "Reporte enviado exitosamente, se publicará cuando un moderador lo apruebe",
+        "reporte_id": str(new_reporte["_id"]),
+        # Points are paid on approval; a rejected report earns none
+        "puntos_ganados": 0,
+        "puntos_pendientes": PUNTOS_REPORTE,
     }
 
-@app.get("/api/reportes/{usuario_id}")
+def naive_utc(fecha: Optional[datetime]) -> Optional[datetime]:
+    # Stored dates are naive UTC; clients may send an offset
+    if fecha is not None and fecha.tzinfo is not None:
+        fecha = fecha.astimezone(timezone.utc).replace(tzinfo=None)
+    return fecha
+
+# Declared before /api/reportes/{usuario_id} so "buscar" is not taken as an id
+@router.get("/api/reportes/buscar")
+def buscar_reportes(
+    q: Annotated[str, Query(min_length=2, max_length=100)],
+    bbox: Optional[str] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    pagina: Annotated[int, Query(ge=1, le=50)] = 1,
+    limite: Annotated[int, Query(ge=1, le=50)] = 20,
+):
+    query = {
+        "$text": {"$search": q, "$language": "spanish"},
+        "publico": True,
+        "estado": "activo",
+    }
+    if bbox:
+        try:
+            min_lon, min_lat, max_lon, max_lat = parse_bbox(bbox)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="bbox inválido, usa minLon,minLat,maxLon,maxLat")
+        query["latitud"] = {"$gte": min_lat, "$lte": max_lat}
+        query["longitud"] = {"$gte": min_lon, "$lte": max_lon}
+    fechas = {}
+    if desde:
+        fechas["$gte"] = naive_utc(desde)
+    if hasta:
+        fechas["$lt"] = naive_utc(hasta)
+    if fechas:
+        query["fecha"] = fechas
+
+    db = get_read_db()
+    with database.guard(settings.mongo.read_deadline_ms):
+        # Results are a list to pick from: photos stay out of the payload
+        reportes = list(db.reportes.find(
+            query, {"foto_base64": 0, outbox.CAMPO: 0, "score": {"$meta": "textScore"}}
+        ).sort(
+            [("score", {"$meta": "textScore"}), ("_id", DESCENDING)]
+        ).skip((pagina - 1) * limite).limit(limite + 1))
+        hay_mas = len(reportes) > limite
+        reportes = reportes[:limite]
+        add_usuario_nombres(reportes, "Usuario Anónimo")
+
+    raices = terminos(q)
+    for reporte in reportes:
+        reporte["resaltados"] = resaltados(reporte, raices)
+    return MongoJSONResponse({"reportes": reportes, "pagina": pagina, "hay_mas": hay_mas})
+
+@router.get("/api/reportes/{usuario_id}")
 def get_user_reportes(usuario_id: str):
-    reportes = list(db.reportes.find({"usuario_id": usuario_id}, {"_id": 0}))
-    return {"reportes": reportes}
+    # Primary on purpose: users expect to see the report they just sent
+    db = get_db()
+    with database.guard(settings.mongo.read_deadline_ms):
+        reportes = list(db.reportes.find({"usuario_id": usuario_id}, {"_id": 0, outbox.CAMPO: 0}))
+    return MongoJSONResponse({"reportes": reportes})
 
-@app.get("/api/reportes-publicos")
-def get_reportes_publicos():
-    # Get all public reports with user info INCLUDING photos
-    reportes = list(db.reportes.find(
-        {"publico": True, "estado": "activo"}
-        # Include foto_base64 so users can see the photos
-    ))
+class ReporteEstado(BaseModel):
+    estado: Literal["resuelto"]
+
+@router.put("/api/reportes/{reporte_id}/estado")
+def update_reporte_estado(
+    reporte_id: str,
+    cambio: ReporteEstado,
+    usuario_id: Annotated[str, Depends(usuario_actual)],
+):
+    if not ObjectId.is_valid(reporte_id):
+        raise HTTPException(status_code=400, detail="ID de reporte inválido")
+    db = get_db()
+    ahora = datetime.utcnow()
+    # Mongo keeps milliseconds; the rollups must add the stored resuelto_en
+    ahora = ahora.replace(microsecond=ahora.microsecond // 1000 * 1000)
+    with database.guard(settings.mongo.write_deadline_ms):
+        reporte = db.reportes.find_one_and_update(
+            {"_id": ObjectId(reporte_id), "usuario_id": usuario_id, "estado": archivo.ACTIVO},
+            {"$set": {"estado": cambio.estado, "resuelto_en": ahora, "actualizado_en": ahora}},
+            projection={"latitud": 1, "longitud": 1, "fecha": 1, "zona": 1},
+        )
+        if reporte is None:
+            actual = db.reportes.find_one({"_id": ObjectId(reporte_id)}, {"usuario_id": 1})
+            if actual is None:
+                raise HTTPException(status_code=404, detail="Reporte no encontrado")
+            if actual.get("usuario_id") != usuario_id:
+                raise HTTPException(status_code=403, detail="Solo el autor puede cambiar el estado del reporte")
+            raise HTTPException(status_code=409, detail="El reporte ya no está activo")
+        resumenes.registrar(db, [reporte], archivo.ACTIVO, cambio.estado, resuelto_en=ahora)
+    feed_cache.invalidate()
+    mapa_cache.invalidate()
+    invalidate_tiles((reporte["latitud"], reporte["longitud"]))
+    return {"message": "Reporte marcado como resuelto", "estado": cambio.estado}
+
+# Moderation queue. Moderators claim the oldest pending reports with a
+# lease; until it runs out nobody else gets them, and if a moderator walks
+# away they return to the queue on their own.
+@router.post("/api/moderacion/reclamar")
+def reclamar_reportes(
+    moderador: Annotated[str, Depends(moderador_actual)],
+    limite: Annotated[int, Query(ge=1, le=50)] = 10,
+):
+    db = get_db()
+    ahora = datetime.utcnow()
+    hasta = ahora + timedelta(seconds=settings.moderacion_reserva_s)
+    reportes = []
+    with database.guard(settings.mongo.write_deadline_ms):
+        # One atomic claim per report: concurrent moderators never get the
+        # same one, and each claim walks the partial index from the front
+        for _ in range(limite):
+            reporte = db.reportes.find_one_and_update(
+                {"estado": archivo.PENDIENTE, "revision_hasta": {"$lte": ahora}},
+                {"$set": {"revision_hasta": hasta, "revisor": moderador}},
+                sort=[("fecha", ASCENDING), ("_id", ASCENDING)],
+                projection={outbox.CAMPO: 0},
+                return_document=ReturnDocument.AFTER,
+            )
+            if reporte is None:
+                break
+            reportes.append(reporte)
+        add_usuario_nombres(reportes, "Usuario Anónimo")
+    return MongoJSONResponse({"reportes": reportes, "reserva_hasta": hasta})
+
+class Decision(BaseModel):
+    decision: Literal["aprobar", "rechazar"]
+    motivo: Optional[str] = None
+
+@router.post("/api/moderacion/reportes/{reporte_id}")
+def moderar_reporte(
+    reporte_id: str,
+    decision: Decision,
+    moderador: Annotated[str, Depends(moderador_actual)],
+):
+    if not ObjectId.is_valid(reporte_id):
+        raise HTTPException(status_code=400, detail="ID de reporte inválido")
+    db = get_db()
+    ahora = datetime.utcnow()
+    # Claimed by this moderator, or by nobody right now
+    filtro = {
+        "_id": ObjectId(reporte_id),
+        "estado": archivo.PENDIENTE,
+        "$or": [{"revisor": moderador}, {"revision_hasta": {"$lte": ahora}}],
+    }
+    cambios = {"actualizado_en": ahora, "moderado_por": moderador, "moderado_en": ahora}
+    with database.guard(settings.mongo.write_deadline_ms):
+        reporte = db.reportes.find_one(
+            filtro, {"usuario_id": 1, "fecha": 1, "zona": 1, "latitud": 1, "longitud": 1}
+        )
+        if reporte is not None:
+            if decision.decision == "aprobar":
+                cambios.update(estado=archivo.ACTIVO, publico=True)
+                # Points, leaderboards and achievements ride along in the
+                # same write and are applied by the outbox workers
+                cambios[outbox.CAMPO] = outbox.pendiente(eventos.Evento(
+                    eventos.REPORTE_CREADO, reporte["usuario_id"], reporte["fecha"],
+                    {"reporte_id": reporte_id, "zona": reporte.get("zona")},
+                ))
+            else:
+                cambios.update(estado=archivo.RECHAZADO, publico=False, motivo_rechazo=decision.motivo)
+            resultado = db.reportes.update_one(
+                filtro, {"$set": cambios, "$unset": {"revision_hasta": "", "revisor": ""}}
+            )
+            if resultado.modified_count == 0:
+                reporte = None  # taken by someone else in between
+        if reporte is None:
+            actual = db.reportes.find_one({"_id": ObjectId(reporte_id)}, {"estado": 1})
+            if actual is None:
+                raise HTTPException(status_code=404, detail="Reporte no encontrado")
+            if actual.get("estado") != archivo.PENDIENTE:
+                raise HTTPException(status_code=409, detail="El reporte ya fue moderado")
+            raise HTTPException(status_code=409, detail="Otro moderador está revisando este reporte")
+        if decision.decision == "rechazar":
+            resumenes.registrar(db, [reporte], None, archivo.RECHAZADO)
+            db.notificaciones.insert_one({
+                "usuario_id": reporte["usuario_id"],
+                "tipo": "moderacion",
+                "mensaje": "Tu reporte no fue publicado"
+                           + (f": {decision.motivo}" if decision.motivo else "."),
+                "fecha": ahora,
+                "leida": False,
+            })
+    if decision.decision == "aprobar":
+        feed_cache.invalidate()
+        mapa_cache.invalidate()
+        invalidate_tiles((reporte["latitud"], reporte["longitud"]))
+        outbox_worker.avisar()
+    return {"message": "Reporte moderado", "estado": cambios["estado"]}
+
+@router.get("/api/archivo/reportes")
+def buscar_archivo(
+    q: Annotated[Optional[str], Query(min_length=2, max_length=100)] = None,
+    zona: Optional[str] = None,
+    usuario_id: Optional[str] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    pagina: Annotated[int, Query(ge=1, le=50)] = 1,
+    limite: Annotated[int, Query(ge=1, le=50)] = 20,
+):
+    if zona is not None and zona not in indice_zonas().zonas:
+        raise HTTPException(status_code=400, detail="Zona desconocida")
+    query = {"publico": True}
+    proyeccion = {"foto_base64": 0, "foto_ref": 0, "foto_tipo": 0}
+    orden = [("fecha", DESCENDING), ("_id", DESCENDING)]
+    if q:
+        query["$text"] = {"$search": q, "$language": "spanish"}
+        proyeccion["score"] = {"$meta": "textScore"}
+        orden = [("score", {"$meta": "textScore"}), ("_id", DESCENDING)]
+    if zona:
+        query["zona"] = zona
+    if usuario_id:
+        query["usuario_id"] = usuario_id
+    fechas = {}
+    if desde:
+        fechas["$gte"] = naive_utc(desde)
+    if hasta:
+        fechas["$lt"] = naive_utc(hasta)
+    if fechas:
+        query["fecha"] = fechas
+
+    db = get_read_db()
+    with database.guard(settings.mongo.read_deadline_ms):
+        reportes = list(db[archivo.ARCHIVO].find(query, proyeccion).sort(orden)
+                        .skip((pagina - 1) * limite).limit(limite + 1))
+        hay_mas = len(reportes) > limite
+        reportes = reportes[:limite]
+        add_usuario_nombres(reportes, "Usuario Anónimo")
+
+    if q:
+        raices = terminos(q)
+        for reporte in reportes:
+            reporte["resaltados"] = resaltados(reporte, raices)
+    return MongoJSONResponse({"reportes": reportes, "pagina": pagina, "hay_mas": hay_mas})
+
+def filtro_export(desde, hasta, zona, estado) -> dict:
+    if zona is not None and zona not in indice_zonas().zonas:
+        raise HTTPException(status_code=400, detail="Zona desconocida")
+    if estado is not None and estado not in archivo.ESTADOS:
+        raise HTTPException(status_code=400, detail="Estado desconocido")
+    query = {}
+    if zona:
+        query["zona"] = zona
+    if estado:
+        query["estado"] = estado
+    fechas = {}
+    if desde:
+        fechas["$gte"] = naive_utc(desde)
+    if hasta:
+        fechas["$lt"] = naive_utc(hasta)
+    if fechas:
+        query["fecha"] = fechas
+    return query
+
+def reportes_export(query: dict, incluir_archivo: bool):
+    # Cursors rather than lists: the driver fetches one batch at a time as
+    # the response is written, so an export of every report keeps only a
+    # batch in memory. No deadline either, a full export takes what it takes.
+    db = get_read_db()
+    colecciones = ("reportes", archivo.ARCHIVO) if incluir_archivo else ("reportes",)
+    for coleccion in colecciones:
+        yield from db[coleccion].find(query, exportar.PROYECCION, batch_size=exportar.LOTE)
+
+@router.get("/api/export/reportes")
+def exportar_reportes(
+    analista: Annotated[str, Depends(analista_actual)],
+    formato: Literal["ndjson", "csv", "parquet"] = "ndjson",
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    zona: Optional[str] = None,
+    estado: Optional[str] = None,
+    incluir_archivo: bool = True,
+):
+    query = filtro_export(desde, hasta, zona, estado)
+    if formato == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        raise HTTPException(status_code=501, detail="Exportación Parquet no disponible")
+    logger.info("Export %s de reportes por %s: %s", formato, analista, query)
+    return StreamingResponse(
+        exportar.escribir(formato, reportes_export(query, incluir_archivo)),
+        media_type=exportar.FORMATOS[formato],
+        headers={"Content-Disposition": f'attachment; filename="reportes.{formato}"'},
+    )
+
+@router.get("/api/reportes/{reporte_id}/foto")
+def get_foto_reporte(reporte_id: str):
+    """The photo of a public report, live (inline data URL) or archived
+    (inline or in the photo store). Exports link here instead of carrying
+    the photos."""
+    if not ObjectId.is_valid(reporte_id):
+        raise HTTPException(status_code=404, detail="Reporte no encontrado")
+    query = {"_id": ObjectId(reporte_id), "publico": True}
+    db = get_read_db()
+    with database.guard(settings.mongo.read_deadline_ms):
+        reporte = db.reportes.find_one(query, {"foto_base64": 1})
+        if reporte is None:
+            reporte = db[archivo.ARCHIVO].find_one(
+                query, {"foto_base64": 1, "foto_ref": 1, "foto_tipo": 1})
+    if reporte is None or not (reporte.get("foto_base64") or reporte.get("foto_ref")):
+        raise HTTPException(status_code=404, detail="Foto no encontrada")
+    if reporte.get("foto_ref"):
+        tienda = fotos_archivo or abrir_fotos(reporte["foto_ref"])
+        contenido, tipo = tienda.leer(reporte["foto_ref"]), reporte.get("foto_tipo", "image/jpeg")
+    else:
+        try:
+            contenido, tipo = decodificar(reporte["foto_base64"])
+        except ValueError:
+            raise HTTPException(status_code=404, detail="Foto no encontrada")
+    # A report's photo never changes
+    return Response(contenido, media_type=tipo, headers={"Cache-Control": "public, max-age=86400"})
+
+EPOCH = datetime(1970, 1, 1)
+
+def encode_cursor(reporte: dict) -> str:
+    millis = (reporte["fecha"] - EPOCH) // timedelta(milliseconds=1)
+    raw = f"{millis}:{reporte['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        millis, oid = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        fecha = EPOCH + timedelta(milliseconds=int(millis))
+        oid = ObjectId(oid)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    # Keyset pagination on (fecha, _id), newest first
+    return {"$or": [
+        {"fecha": {"$lt": fecha}},
+        {"fecha": fecha, "_id": {"$lt": oid}},
+    ]}
+
+def load_feed_page(limite: int, cursor: Optional[str]) -> bytes:
+    db = get_read_db()
+    query = {"publico": True, "estado": "activo"}
+    if cursor:
+        query.update(decode_cursor(cursor))
+    # Get public reports with user info INCLUDING photos
+    reportes = list(db.reportes.find(query, {outbox.CAMPO: 0}).sort(
+        [("fecha", DESCENDING), ("_id", DESCENDING)]
+    ).limit(limite + 1))
+    siguiente = None
+    if len(reportes) > limite:
+        reportes = reportes[:limite]
+        siguiente = encode_cursor(reportes[-1])
     
     # Add user names to reports
-    for reporte in reportes:
-        if reporte.get("usuario_id"):
-            from bson import ObjectId
-            try:
-                user = db.usuarios.find_one(
-                    {"_id": ObjectId(reporte["usuario_id"])},
-                    {"nombre": 1}
-                )
-                reporte["usuario_nombre"] = user.get("nombre", "Usuario Anónimo") if user else "Usuario Anónimo"
-            except:
-                reporte["usuario_nombre"] = "Usuario Anónimo"
-        reporte["_id"] = str(reporte["_id"])
+    add_usuario_nombres(reportes, "Usuario Anónimo")
     
-    return {"reportes": reportes}
+    return dumps({"reportes": reportes, "siguiente": siguiente})
+
+@router.get("/api/reportes-publicos")
+def get_reportes_publicos(
+    limite: Annotated[Optional[int], Query(ge=1, le=200)] = None,
+    cursor: Optional[str] = None,
+):
+    limite = limite or settings.feed_page_size
+    key = ("pagina", limite, cursor or "")
+    return degradable_read(feed_snapshots, key, lambda: feed_cache.get_or_set(
+        key, partial(read_mongo, load_feed_page, limite, cursor),
+        settings.feed_cache_ttl_s, settings.stale_while_revalidate_s,
+    ))
+
+# Delta sync for the app's offline copy. The token is the (actualizado_en,
+# _id) of the last change the client has seen; each call returns what
+# changed after it, oldest first, with retired reports as tombstones.
+# Photos are not inlined: each report carries foto_url, fetched (and
+# cached) by the app on its own.
+SYNC_TOKEN_PREFIX = "s1"
+# Writes can commit slightly out of actualizado_en order, so a finished
+# sync hands back a token this far in the past: the next sync sees those
+# recent changes again (the app upserts by id) instead of skipping one
+SYNC_OVERLAP = timedelta(seconds=5)
+ZERO_OID = ObjectId("0" * 24)
+
+def encode_sync_token(actualizado_en: datetime, oid: ObjectId) -> str:
+    millis = (actualizado_en - EPOCH) // timedelta(milliseconds=1)
+    raw = f"{SYNC_TOKEN_PREFIX}:{millis}:{oid}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_sync_token(token: str):
+    try:
+        prefix, millis, oid = base64.urlsafe_b64decode(token.encode()).decode().split(":")
+        if prefix != SYNC_TOKEN_PREFIX:
+            raise ValueError(prefix)
+        return EPOCH + timedelta(milliseconds=int(millis)), ObjectId(oid)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Token de sincronización inválido")
+
+def es_visible(reporte: dict) -> bool:
+    return reporte.get("publico") is True and reporte.get("estado") == "activo"
+
+@router.get("/api/sync/reportes")
+def sync_reportes(
+    since: Optional[str] = None,
+    limite: Annotated[int, Query(ge=1, le=200)] = 100,
+):
+    reinicio = False
+    if since:
+        desde = decode_sync_token(since)
+        # Reports are archived this long after their last change: an older
+        # token may have missed tombstones that are no longer in reportes
+        if desde[0] < datetime.utcnow() - timedelta(days=settings.archivo_despues_dias):
+            since, reinicio = None, True
+    if since:
+        query = {"$or": [
+            {"actualizado_en": {"$gt": desde[0]}},
+            {"actualizado_en": desde[0], "_id": {"$gt": desde[1]}},
+        ]}
+    else:
+        # First sync (or a reset): the client keeps nothing from before
+        desde = None
+        query = {"publico": True, "estado": "activo"}
+    # Primary: a lagging secondary would let the token move past writes it
+    # has not replicated yet
+    db = get_db()
+    with database.guard(settings.mongo.read_deadline_ms):
+        docs = list(db.reportes.find(query, {outbox.CAMPO: 0, "foto_base64": 0}).sort(
+            [("actualizado_en", ASCENDING), ("_id", ASCENDING)]
+        ).limit(limite + 1))
+        hay_mas = len(docs) > limite
+        docs = docs[:limite]
+        cambios = [d for d in docs if es_visible(d)]
+        add_usuario_nombres(cambios, "Usuario Anónimo")
+    for reporte in cambios:
+        reporte["foto_url"] = exportar.foto_url(reporte["_id"])
+
+    ultimo = (docs[-1]["actualizado_en"], docs[-1]["_id"]) if docs else desde
+    if not hay_mas:
+        horizonte = (datetime.utcnow() - SYNC_OVERLAP, ZERO_OID)
+        ultimo = min(ultimo, horizonte) if ultimo else horizonte
+    return Response(dumps({
+        "reportes": cambios,
+        "eliminados": [str(d["_id"]) for d in docs if not es_visible(d)],
+        "token": encode_sync_token(*ultimo),
+        "hay_mas": hay_mas,
+        "reinicio": reinicio,
+    }), media_type="application/json")
 
-@app.get("/api/mapa-reportes")
-def get_mapa_reportes():
+MAPA_FORMATOS = {
+    "json": "application/json",
+    "columnar": columnar.JSON_COLUMNAR,
+    "binario": columnar.BINARIO,
+}
+
+def load_mapa(formato: str = "json") -> bytes:
+    db = get_read_db()
     # Get reports for map visualization
     reportes = list(db.reportes.find(
         {"publico": True, "estado": "activo"},
@@ -295,208 +1078,417 @@ def get_mapa_reportes():
             "direccion": 1,
             "usuario_id": 1
         }
-    ))
+    ).sort("fecha", DESCENDING))
     
     # Add user names for map markers
-    for reporte in reportes:
-        if reporte.get("usuario_id"):
-            from bson import ObjectId
-            try:
-                user = db.usuarios.find_one(
-                    {"_id": ObjectId(reporte["usuario_id"])},
-                    {"nombre": 1}
-                )
-                reporte["usuario_nombre"] = user.get("nombre", "Usuario") if user else "Usuario"
-            except:
-                reporte["usuario_nombre"] = "Usuario"
-        reporte["_id"] = str(reporte["_id"])
+    add_usuario_nombres(reportes, "Usuario")
     
-    return {"reportes": reportes}
+    if formato == "columnar":
+        return columnar.json_columnar(reportes)
+    if formato == "binario":
+        return columnar.binario(reportes)
+    return dumps({"reportes": reportes})
+
+def formato_mapa(format: Optional[str], accept: Optional[str]) -> str:
+    if format is not None:
+        return format
+    # Only the columnar types are matched; anything else keeps the original
+    # layout, so existing clients are unaffected
+    for formato, media_type in MAPA_FORMATOS.items():
+        if formato != "json" and media_type in (accept or ""):
+            return formato
+    return "json"
+
+@router.get("/api/mapa-reportes")
+def get_mapa_reportes(
+    format: Optional[Literal["json", "columnar", "binario"]] = None,
+    accept: Annotated[Optional[str], Header()] = None,
+):
+    formato = formato_mapa(format, accept)
+    # Each format is cached on its own; invalidating the map drops them all
+    return degradable_read(mapa_snapshots, formato, lambda: mapa_cache.get_or_set(
+        formato, partial(read_mongo, load_mapa, formato),
+        settings.mapa_cache_ttl_s, settings.stale_while_revalidate_s,
+    ), media_type=MAPA_FORMATOS[formato], headers={"Vary": "Accept"})
 
-@app.get("/api/incentivos")
+def load_tile(z: int, x: int, y: int) -> bytes:
+    clave = tiles.clave((z, x, y))
+    if tiles_disk is not None:
+        body = tiles_disk.get(clave)
+        if body is not None:
+            return body
+    leido_en = time.time()
+    # Primary: a tile lives until it is invalidated, so one rendered from a
+    # lagging secondary would keep a stale marker set
+    db = get_db()
+    reportes = db.reportes.find(tiles.consulta(z, x, y), tiles.CAMPOS).sort(
+        "fecha", DESCENDING
+    ).limit(tiles.MAX_MARCADORES)
+    body = tiles.render(reportes)
+    if tiles_disk is not None:
+        tiles_disk.put(clave, body, leido_en)
+    return body
+
+@router.get("/api/tiles/{z}/{x}/{y}")
+def get_tile(
+    z: int, x: int, y: int,
+    if_none_match: Annotated[Optional[str], Header()] = None,
+):
+    if not tiles.valida(z, x, y):
+        raise HTTPException(status_code=404, detail="Tile inexistente")
+    min_lon, min_lat, max_lon, max_lat = tiles.limites(z, x, y)
+    distrito = indice_zonas()
+    if (max_lon < distrito.min_lon or min_lon > distrito.max_lon
+            or max_lat < distrito.min_lat or min_lat > distrito.max_lat):
+        body = tiles.VACIA
+    else:
+        body = tiles_cache.get_or_set(
+            tiles.clave((z, x, y)), partial(read_mongo, load_tile, z, x, y), settings.tiles_cache_ttl_s
+        )
+    return etag_response(body, if_none_match, media_type="application/geo+json")
+
+@router.get("/api/incentivos")
 def get_incentivos():
-    incentivos = [
-        {
-            "id": "1",
-            "nombre": "Descuento en Supermercado",
-            "descripcion": "10% de descuento en productos orgánicos",
-            "puntos_requeridos": 50,
-            "categoria": "Descuentos"
-        },
-        {
-            "id": "2", 
-            "nombre": "Planta de Regalo",
-            "descripcion": "Recibe una planta nativa del Perú",
-            "puntos_requeridos": 100,
-            "categoria": "Regalos"
-        },
-        {
-            "id": "3",
-            "nombre": "Kit de Reciclaje",
-            "descripcion": "Set completo para reciclar en casa",
-            "puntos_requeridos": 200,
-            "categoria": "Productos"
-        }
-    ]
-    return {"incentivos": incentivos}
+    return static_response("incentivos", {"incentivos": INCENTIVOS})
+
+@router.post("/api/canjear")
+def canjear_incentivo(
+    canje: CanjearIncentivo,
+    usuario_id: Annotated[str, Depends(usuario_actual)],
+):
+    incentivo = next((i for i in INCENTIVOS if i["id"] == canje.incentivo_id), None)
+    if incentivo is None:
+        raise HTTPException(status_code=404, detail="Incentivo no encontrado")
+    with database.guard(settings.mongo.write_deadline_ms):
+        return canjear(usuario_id, canje, incentivo)
 
-@app.post("/api/canjear")
-def canjear_incentivo(canje: CanjearIncentivo):
+def canjear(usuario_id: str, canje: CanjearIncentivo, incentivo: dict):
+    db = get_db()
+    
+    # Deduct atomically: the filter only matches if the user can afford it
+    costo = incentivo["puntos_requeridos"]
+    usuario = db.usuarios.find_one_and_update(
+        {"_id": ObjectId(usuario_id), "puntos": {"$gte": costo}},
+        {"$inc": {"puntos": -costo}},
+        projection={"puntos": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if usuario is None:
+        if db.usuarios.count_documents({"_id": ObjectId(usuario_id)}, limit=1) == 0:
+            raise HTTPException(status_code=404, detail="Usuario no encontrado")
+        raise HTTPException(status_code=400, detail="Puntos insuficientes para este incentivo")
+    
+    fecha_canje = datetime.utcnow()
+    db.canjes.insert_one({
+        "usuario_id": usuario_id,
+        "incentivo_id": canje.incentivo_id,
+        "puntos": costo,
+        "fecha": fecha_canje,
+    })
+    ranking_cache.invalidate()
+    perfiles_cache.invalidate(usuario_id)
+    eventos.publicar(eventos.Evento(
+        eventos.INCENTIVO_CANJEADO, usuario_id, fecha_canje,
+        {"incentivo_id": canje.incentivo_id},
+    ))
+    
     return {
         "message": "Incentivo canjeado exitosamente",
-        "fecha_canje": datetime.utcnow()
+        "fecha_canje": fecha_canje,
+        "puntos_restantes": usuario["puntos"]
     }
 
-@app.get("/api/noticias")
+@router.get("/api/noticias")
 def get_noticias():
-    noticias = [
-        {
-            "id": 1,
-            "titulo": "Nuevo Horario de Recolección en Ventanilla",
-            "contenido": "La Municipalidad de Ventanilla informa que el nuevo horario de recolección de residuos sólidos será de lunes a sábado de 6:00 AM a 2:00 PM en todas las zonas del distrito.",
-            "fecha": "2024-01-15",
-            "categoria": "Servicios"
-        },
-        {
-            "id": 2,
-            "titulo": "Programa de Reciclaje 'Ventanilla Verde'",
-            "contenido": "Se ha inaugurado el programa municipal 'Ventanilla Verde' que permite el intercambio de materiales reciclables por puntos canjeables en el mercado local.",
-            "fecha": "2024-01-12",
-            "categoria": "Reciclaje"
-        },
-        {
-            "id": 3,
-            "titulo": "Campaña de Limpieza de Playas",
-            "contenido": "Únete a la gran campaña de limpieza de las playas de Ventanilla este sábado 20 de enero. Punto de encuentro: Playa Costa Azul a las 8:00 AM.",
-            "fecha": "2024-01-10",
-            "categoria": "Medio Ambiente"
-        }
-    ]
-    return {"noticias": noticias}
+    return static_response("noticias", {"noticias": NOTICIAS})
 
-@app.get("/api/educacion")
+@router.get("/api/educacion")
 def get_educacion_ambiental():
-    contenido_educativo = [
-        {
-            "id": 1,
-            "titulo": "¿Cómo Separar Residuos Correctamente?",
-            "tipo": "video",
-            "contenido": "Aprende la forma correcta de separar residuos orgánicos e inorgánicos según las normas peruanas.",
-            "url": "https://example.com/video1",
-            "duracion": "5 min",
-            "categoria": "Básico"
-        },
-        {
-            "id": 2,
-            "titulo": "Horarios de Recolección en Ventanilla",
-            "tipo": "informacion",
-            "contenido": "Zona Norte: Lunes, Miércoles, Viernes (6:00 AM)\nZona Centro: Martes, Jueves, Sábado (7:00 AM)\nZona Sur: Lunes, Miércoles, Viernes (8:00 AM)",
-            "categoria": "Servicios Locales"
-        },
-        {
-            "id": 3,
-            "titulo": "Beneficios del Compostaje Casero",
-            "tipo": "articulo",
-            "contenido": "El compostaje casero reduce hasta 30% los residuos domésticos y crea abono natural para plantas.",
-            "categoria": "Avanzado"
-        }
-    ]
-    return {"contenido": contenido_educativo}
+    return static_response("contenido_educativo", {"contenido": CONTENIDO_EDUCATIVO})
 
-@app.get("/api/ranking")
-def get_ranking():
-    # Simulate ranking data
+def load_ranking(periodo: str = "total", zona: Optional[str] = None, limite: int = 10) -> bytes:
+    db = get_read_db()
+    # Points earned, from the buckets: usuarios.puntos is the balance and
+    # drops with every redemption
+    filas = puntajes.top(db, periodo, zona, limite)
+    nombres = usuario_nombres({f["usuario_id"] for f in filas if ObjectId.is_valid(f["usuario_id"])})
     ranking = [
-        {"posicion": 1, "nombre": "María González", "puntos": 450},
-        {"posicion": 2, "nombre": "Carlos Ruiz", "puntos": 380},
-        {"posicion": 3, "nombre": "Ana Torres", "puntos": 320},
-        {"posicion": 4, "nombre": "Luis Mendoza", "puntos": 280},
-        {"posicion": 5, "nombre": "Patricia López", "puntos": 250}
+        {"posicion": posicion, "nombre": nombres.get(f["usuario_id"], "Usuario"), "puntos": f["puntos"]}
+        for posicion, f in enumerate(filas, start=1)
     ]
-    return {"ranking": ranking}
+    return dumps({"ranking": ranking, "periodo": periodo, "zona": zona})
+
+@router.get("/api/ranking")
+def get_ranking(
+    periodo: Literal["semana", "mes", "total"] = "total",
+    zona: Optional[str] = None,
+    limite: Annotated[int, Query(ge=1, le=50)] = 10,
+):
+    if zona is not None and zona not in indice_zonas().zonas:
+        raise HTTPException(status_code=400, detail="Zona desconocida")
+    key = (periodo, zona or "", limite)
+    return degradable_read(ranking_snapshots, key, lambda: ranking_cache.get_or_set(
+        key, partial(read_mongo, load_ranking, periodo, zona, limite), settings.ranking_cache_ttl_s
+    ))
+
+# Analytics dashboards, read from the daily rollups (see resumenes.py) so
+# their cost depends on the range asked for, not on the history kept
+DASHBOARD_MAX_DIAS = 3 * 366
+
+def rango_dashboard(desde: Optional[date], hasta: Optional[date]):
+    hasta = hasta or date.fromisoformat(resumenes.dia(datetime.utcnow()))
+    desde = desde or hasta - timedelta(days=29)
+    if desde > hasta or (hasta - desde).days >= DASHBOARD_MAX_DIAS:
+        raise HTTPException(status_code=400, detail="Rango de fechas inválido")
+    return desde, hasta
+
+@router.get("/api/dashboard/diario")
+def get_dashboard_diario(
+    analista: Annotated[str, Depends(analista_actual)],
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    zona: Optional[str] = None,
+):
+    if zona is not None and zona not in indice_zonas().zonas:
+        raise HTTPException(status_code=400, detail="Zona desconocida")
+    desde, hasta = rango_dashboard(desde, hasta)
+    db = get_read_db()
+    with database.guard(settings.mongo.read_deadline_ms):
+        filas = resumenes.serie(db, desde, hasta, zona)
+    return {"desde": desde, "hasta": hasta, "zona": zona or puntajes.ZONA_TODAS,
+            "dias": [resumenes.con_promedio(f) for f in filas]}
 
-@app.get("/api/notificaciones/{usuario_id}")
+@router.get("/api/dashboard/zonas")
+def get_dashboard_zonas(
+    analista: Annotated[str, Depends(analista_actual)],
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+):
+    desde, hasta = rango_dashboard(desde, hasta)
+    db = get_read_db()
+    with database.guard(settings.mongo.read_deadline_ms):
+        totales = resumenes.por_zona(db, desde, hasta)
+    return {"desde": desde, "hasta": hasta, "zonas": [resumenes.con_promedio(t) for t in totales]}
+
+@router.get("/api/notificaciones/{usuario_id}")
 def get_notificaciones(usuario_id: str):
-    notificaciones = [
-        {
-            "id": 1,
-            "mensaje": "¡Felicitaciones! Has ganado 10 puntos por tu último reporte",
-            "fecha": datetime.utcnow() - timedelta(hours=2),
-            "leida": False
-        },
-        {
-            "id": 2,
-            "mensaje": "Nueva campaña de reciclaje disponible en tu zona",
-            "fecha": datetime.utcnow() - timedelta(days=1),
-            "leida": False
-        }
-    ]
+    db = get_read_db()
+    with database.guard(settings.mongo.read_deadline_ms):
+        notificaciones = [
+            {
+                "id": str(n["_id"]),
+                "tipo": n.get("tipo"),
+                "mensaje": n["mensaje"],
+                "fecha": n["fecha"],
+                "leida": n.get("leida", False),
+            }
+            for n in db.notificaciones.find({"usuario_id": usuario_id})
+                                      .sort("fecha", DESCENDING).limit(50)
+        ]
     return {"notificaciones": notificaciones}
 
-@app.delete("/api/notificaciones/{notif_id}")
+@router.delete("/api/notificaciones/{notif_id}")
 def delete_notificacion(notif_id: str):
+    if not ObjectId.is_valid(notif_id):
+        raise HTTPException(status_code=400, detail="ID de notificación inválido")
+    db = get_db()
+    with database.guard(settings.mongo.write_deadline_ms):
+        result = db.notificaciones.delete_one({"_id": ObjectId(notif_id)})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Notificación no encontrada")
     return {"message": "Notificación eliminada"}
 
-@app.get("/api/terminos")
-def get_terminos():
-    terminos = {
-        "app_name": "VENTANILLA RECICLA CONTIGO",
-        "version": "1.0.0",
-        "propietarios": ["Dayan Gallegos", "Maria Ferrer"],
-        "desarrollador": "Fernando Rufasto",
-        "fecha_creacion": "2024",
-        "descripcion": "Aplicación móvil para el cuidado del medio ambiente en Ventanilla, Lima, Perú. Una iniciativa ciudadana para promover la participación comunitaria en la protección ambiental.",
-        "mision": "Empoderar a los ciudadanos de Ventanilla para que participen activamente en el cuidado y protección del medio ambiente de su comunidad.",
-        "vision": "Convertir a Ventanilla en un distrito modelo de sostenibilidad ambiental a través de la tecnología y participación ciudadana.",
-        "terminos": [
-            "TÉRMINOS DE USO Y CONDICIONES GENERALES",
-            "",
-            "1. ACEPTACIÓN DE TÉRMINOS",
-            "Al descargar, instalar o usar esta aplicación, aceptas cumplir con estos términos y condiciones.",
-            "",
-            "2. USO DE LA APLICACIÓN", 
-            "• La aplicación es de uso gratuito para todos los ciudadanos de Ventanilla",
-            "• Está destinada exclusivamente para reportar problemas ambientales reales",
-            "• Los usuarios se comprometen a usar la app de manera responsable y veraz",
-            "",
-            "3. REPORTES Y CONTENIDO",
-            "• Los reportes enviados serán públicos para toda la comunidad",
-            "• Las fotos deben mostrar problemas ambientales reales (basura, contaminación, etc.)",
-            "• Está prohibido subir contenido ofensivo, falso o que no corresponda a temas ambientales",
-            "• La aplicación se reserva el derecho de moderar y eliminar contenido inapropiado",
-            "",
-            "4. SISTEMA DE PUNTOS E INCENTIVOS",
-            "• Los puntos se otorgan por reportes válidos y verificados (20 puntos por reporte)",
-            "• Los incentivos están sujetos a disponibilidad y pueden cambiar sin previo aviso",
-            "• Los puntos no tienen valor monetario y son solo para el sistema de gamificación",
-            "",
-            "5. PRIVACIDAD Y DATOS",
-            "• La información de ubicación se usa únicamente para geolocalizar reportes ambientales",
-            "• Los datos personales se mantienen seguros y no se comparten con terceros",
-            "• Las fotos pueden ser utilizadas para promover el cuidado ambiental en redes sociales oficiales",
-            "",
-            "6. RESPONSABILIDADES",
-            "• Los usuarios son responsables de la veracidad de sus reportes",
-            "• La aplicación no se hace responsable por daños derivados del uso incorrecto",
-            "• Es responsabilidad del usuario mantener actualizados sus datos de contacto",
-            "",
-            "7. MODIFICACIONES",
-            "• Estos términos pueden modificarse en cualquier momento",
-            "• Los usuarios serán notificados de cambios importantes",
-            "• El uso continuado implica aceptación de las modificaciones"
-        ],
-        "contacto": {
-            "municipalidad": "Municipalidad de Ventanilla",
-            "email_soporte": "reciclacontigo@ventanilla.gob.pe",
-            "telefono": "+51 1 234-5678",
-            "direccion": "Av. Néstor Gambetta, Ventanilla, Callao, Perú"
-        },
-        "politica_privacidad": "Tu privacidad es fundamental para nosotros. Solo recopilamos la información estrictamente necesaria para el funcionamiento de la aplicación: nombre, email, ubicación de reportes y fotos de problemas ambientales. Esta información se usa únicamente para mejorar las condiciones ambientales de Ventanilla y nunca se comparte con terceros sin tu consentimiento.",
-        "licencia": "Esta aplicación es propiedad intelectual de Dayan Gallegos y Maria Ferrer. Desarrollada por Fernando Rufasto.",
-        "derechos": "© 2024 Dayan Gallegos & Maria Ferrer. Todos los derechos reservados.",
-        "agradecimientos": "Agradecemos a la comunidad de Ventanilla por su participación activa en el cuidado del medio ambiente y a la Municipalidad de Ventanilla por su apoyo a esta iniciativa ciudadana."
+@router.get("/api/logros")
+def get_logros():
+    return static_response("logros", {"logros": logros.catalogo()})
+
+@router.get("/api/zonas/{lat}/{lon}")
+def get_zona(lat: float, lon: float):
+    sector = indice_zonas().localizar(lat, lon)
+    if sector is None:
+        raise HTTPException(status_code=404, detail="La ubicación está fuera de Ventanilla")
+    return {
+        "zona": sector.zona,
+        "sector": sector.sector,
+        "horario": HORARIOS_RECOLECCION.get(sector.zona),
     }
-    return terminos
+
+@router.get("/api/terminos")
+def get_terminos():
+    return static_response("terminos", TERMINOS)
+
+@router.get("/api/health/live", include_in_schema=False)
+def get_live():
+    # Only says the worker answers: restarting it would not fix a Mongo outage
+    return {"estado": "vivo"}
+
+@router.get("/api/health/ready", include_in_schema=False)
+def get_ready(request: Request):
+    try:
+        database.ping(settings.mongo.read_deadline_ms)
+    except MONGO_DOWN:
+        pass
+    dependencias = {"mongo": database.breaker.status()}
+    store = getattr(request.app.state, "cache_store", None)
+    if store is not None:
+        store.ping()
+        dependencias["cache"] = cache_breaker.status()
+    if not getattr(request.app.state, "ready", False):
+        return MongoJSONResponse(
+            {"estado": "calentando", "dependencias": dependencias}, status_code=503
+        )
+    # Stays ready while Mongo is down: this worker still serves cached reads,
+    # and pulling every pod out of the load balancer would serve nothing
+    degradado = any(d["estado"] != "cerrado" for d in dependencias.values())
+    return {"estado": "degradado" if degradado else "listo", "dependencias": dependencias}
+
+# App factory
+def warm_up():
+    indice_zonas()
+    ensure_indexes()
+    static_response("incentivos", {"incentivos": INCENTIVOS})
+    static_response("noticias", {"noticias": NOTICIAS})
+    static_response("contenido_educativo", {"contenido": CONTENIDO_EDUCATIVO})
+    static_response("terminos", TERMINOS)
+    static_response("logros", {"logros": logros.catalogo()})
+    get_ranking()
+    get_reportes_publicos()
+
+# Set by the lifespan; None keeps archived photos inline
+fotos_archivo = None
+
+def run_archival(ahora: Optional[datetime] = None) -> dict:
+    db = get_db()
+    ahora = ahora or datetime.utcnow()
+    # One worker per run across the deployment; the lease ends before the
+    # next tick so whichever worker gets there first takes it
+    if not archivo.tomar_turno(db, "archivo", timedelta(seconds=settings.archivo_intervalo_s * 0.9), ahora):
+        return {"expirados": 0, "archivados": 0}
+    expirados = archivo.expirar(db, ahora - timedelta(days=settings.reporte_expira_dias), ahora)
+    if expirados:
+        feed_cache.invalidate()
+        mapa_cache.invalidate()
+        # A batch job touching reports anywhere: drop every tile at once
+        tiles_cache.invalidate()
+        if tiles_disk is not None:
+            tiles_disk.clear()
+    archivados = archivo.archivar(
+        db, ahora - timedelta(days=settings.archivo_despues_dias), fotos_archivo,
+        lote=settings.archivo_lote, pausa_s=settings.archivo_pausa_ms / 1000,
+    )
+    logger.info("archival run: %d expired, %d archived", expirados, archivados)
+    return {"expirados": expirados, "archivados": archivados}
+
+async def archive_periodically():
+    while True:
+        await asyncio.sleep(settings.archivo_intervalo_s)
+        try:
+            # Default executor, not the request threadpool: a run can take a while
+            await asyncio.to_thread(run_archival)
+        except Exception:
+            logger.exception("archival run failed")
+
+async def warm_up_until_ready(app: FastAPI):
+    while True:
+        try:
+            await run_in_threadpool(warm_up)
+            app.state.ready = True
+            logger.info("warm-up complete, worker ready")
+            return
+        except Exception:
+            logger.exception("warm-up failed, retrying in %ss", settings.warmup_retry_s)
+            await asyncio.sleep(settings.warmup_retry_s)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global fotos_archivo, tiles_disk
+    # Tests and the load harness may have wired in their own databases
+    owns_connection = get_db() is None
+    if owns_connection:
+        monitor = QueryMonitor(settings.slow_query_ms, settings.explain_sample_rate)
+        database.connect(settings.mongo, event_listeners=[monitor])
+    store = GuardedStore(open_shared_store(settings.cache_url), cache_breaker)
+    for cache in (feed_cache, mapa_cache, ranking_cache, nombres_cache, perfiles_cache, tiles_cache):
+        cache.attach(store)
+    app.state.cache_store = store
+    rate_limiter.buckets = open_buckets(settings.rate_limit_url)
+    app.state.ready = False
+    # Try once before accepting traffic; if Mongo is not reachable yet keep
+    # retrying in the background while readiness stays red
+    warm_task = asyncio.create_task(warm_up_until_ready(app))
+    if settings.outbox_workers > 0:
+        outbox_worker.max_intentos = settings.outbox_max_attempts
+        await outbox_worker.start(settings.outbox_workers)
+    fotos_archivo = abrir_fotos(settings.fotos_archivo_url)
+    tiles_disk = tiles.DiskTiles(settings.tiles_dir) if settings.tiles_dir else None
+    archive_task = (asyncio.create_task(archive_periodically())
+                    if settings.archivo_intervalo_s > 0 else None)
+    await asyncio.wait([warm_task], timeout=settings.mongo.server_selection_timeout_ms / 1000 + 1)
+    try:
+        yield
+    finally:
+        warm_task.cancel()
+        if archive_task is not None:
+            archive_task.cancel()
+        fotos_archivo = None
+        tiles_disk = None
+        await outbox_worker.stop()
+        app.state.ready = False
+        for cache in (feed_cache, mapa_cache, ranking_cache, nombres_cache, perfiles_cache, tiles_cache):
+            cache.attach(LOCAL_STORE)
+        store.close()
+        rate_limiter.buckets.close()
+        rate_limiter.buckets = LocalBuckets()
+        if owns_connection:
+            database.close()
+
+def create_app(app_settings: Optional[Settings] = None) -> FastAPI:
+    global settings
+    settings = app_settings or Settings.from_env()
+
+    app = FastAPI(
+        title="VENTANILLA RECICLA CONTIGO API",
+        default_response_class=MongoJSONResponse,
+        lifespan=lifespan,
+    )
+    app.state.settings = settings
+    app.state.ready = False
+    for error in MONGO_DOWN:
+        app.add_exception_handler(error, dependency_unavailable)
+    app.add_exception_handler(RateLimited, rate_limited)
+    app.add_middleware(QueryStatsMiddleware, expose_headers=settings.dev_mode)
+    if settings.admission_max_concurrency > 0:
+        write_budget_s = settings.admission_write_budget_ms / 1000
+        app.add_middleware(AdmissionMiddleware, controller=AdmissionController(
+            settings.admission_max_concurrency,
+            reserved={AUTH: settings.admission_reserved_auth,
+                      UPLOADS: settings.admission_reserved_uploads},
+            queue_budget_s={AUTH: write_budget_s, UPLOADS: write_budget_s,
+                            READS: settings.admission_read_budget_ms / 1000},
+        ))
+    rate_limiter.enabled = settings.rate_limits_enabled
+    if settings.rate_limits_enabled:
+        # Outside admission control: abusive requests never take a slot
+        app.add_middleware(RateLimitMiddleware, limiter=rate_limiter, rules={
+            ("POST", "/api/login"): LOGIN_POR_IP,
+            ("POST", "/api/usuarios"): REGISTRO_POR_IP,
+            ("POST", "/api/reportes"): REPORTE_POR_IP,
+        })
+    # Outside admission control and rate limiting, so a 503 or 429 carries
+    # CORS headers and browser clients can read its status and Retry-After
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["Retry-After"],
+    )
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(router)
+    return app
+
+app = create_app()
 
 if __name__ == "__main__":
     import uvicorn
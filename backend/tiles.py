@@ -0,0 +1,140 @@
+"""Map tiles of report markers, as GeoJSON in slippy-map (z/x/y) tiles.
+
+A report lives in exactly one tile per zoom level, so creating or changing
+one touches ``MAX_ZOOM + 1`` tiles and those are the only ones invalidated.
+That lets tiles stay cached for a long time: in memory and in the shared
+store through a TwoLevelCache, and on disk so a restarted worker does not
+rebuild the whole map from Mongo.
+"""
+
+import math
+import os
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from serialization import dumps
+
+MAX_ZOOM = 20
+# Low zooms cover the whole district; past this many markers only the
+# newest are drawn
+MAX_MARCADORES = 5000
+CAMPOS = {"latitud": 1, "longitud": 1, "descripcion": 1, "fecha": 1, "zona": 1}
+
+Tile = Tuple[int, int, int]
+VACIA = dumps({"type": "FeatureCollection", "features": []})
+
+
+def valida(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def _lat(y: float, n: int) -> float:
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+
+
+def limites(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """(min_lon, min_lat, max_lon, max_lat) of a tile, Web Mercator."""
+    n = 2 ** z
+    return x / n * 360 - 180, _lat(y + 1, n), (x + 1) / n * 360 - 180, _lat(y, n)
+
+
+def tile(lat: float, lon: float, z: int) -> Tile:
+    n = 2 ** z
+    x = int((lon + 180) / 360 * n)
+    rad = math.radians(lat)
+    y = int((1 - math.asinh(math.tan(rad)) / math.pi) / 2 * n)
+    return z, min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def afectados(lat: float, lon: float) -> List[Tile]:
+    """Every tile showing a marker at (lat, lon), one per zoom."""
+    return [tile(lat, lon, z) for z in range(MAX_ZOOM + 1)]
+
+
+def clave(t: Tile) -> str:
+    return "{}/{}/{}".format(*t)
+
+
+def consulta(z: int, x: int, y: int) -> dict:
+    # Half-open on both axes like the tile math, so a marker on a tile edge
+    # is drawn (and invalidated) in exactly one tile
+    min_lon, min_lat, max_lon, max_lat = limites(z, x, y)
+    return {
+        "publico": True,
+        "estado": "activo",
+        "latitud": {"$gte": min_lat, "$lt": max_lat},
+        "longitud": {"$gte": min_lon, "$lt": max_lon},
+    }
+
+
+def render(reportes: Iterable[dict]) -> bytes:
+    return dumps({"type": "FeatureCollection", "features": [
+        {
+            "type": "Feature",
+            "id": str(r["_id"]),
+            "geometry": {"type": "Point", "coordinates": [r["longitud"], r["latitud"]]},
+            "properties": {
+                "descripcion": r.get("descripcion"),
+                "fecha": r.get("fecha"),
+                "zona": r.get("zona"),
+            },
+        }
+        for r in reportes
+    ]})
+
+
+class DiskTiles:
+    """Tiles on local disk, shared by the workers of one host.
+
+    Invalidating a tile touches a marker next to it before deleting it. A
+    tile rendered from data read before the marker was touched is dropped
+    right after it is written, so a render racing an invalidation never
+    leaves a stale file behind. ``clear`` does the same with one marker for
+    the whole directory.
+    """
+
+    def __init__(self, raiz: str):
+        self.raiz = Path(raiz)
+        self._global = self.raiz / "todas.inv"
+
+    def _ruta(self, clave: str) -> Path:
+        return self.raiz / f"{clave}.geojson"
+
+    def get(self, clave: str) -> Optional[bytes]:
+        ruta = self._ruta(clave)
+        try:
+            if ruta.stat().st_mtime <= _mtime(self._global):
+                return None
+            return ruta.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def put(self, clave: str, body: bytes, leido_en: float) -> None:
+        ruta = self._ruta(clave)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        temporal = ruta.with_name(f"{ruta.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+        temporal.write_bytes(body)
+        temporal.replace(ruta)
+        invalidado_en = max(_mtime(ruta.with_name(ruta.name + ".inv")), _mtime(self._global))
+        if invalidado_en >= leido_en:
+            ruta.unlink(missing_ok=True)
+
+    def invalidate(self, claves: Iterable[str]) -> None:
+        for clave in claves:
+            ruta = self._ruta(clave)
+            ruta.parent.mkdir(parents=True, exist_ok=True)
+            ruta.with_name(ruta.name + ".inv").touch()
+            ruta.unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        # Older files are ignored from now on and overwritten on next render
+        self.raiz.mkdir(parents=True, exist_ok=True)
+        self._global.touch()
+
+
+def _mtime(ruta: Path) -> float:
+    try:
+        return ruta.stat().st_mtime
+    except FileNotFoundError:
+        return 0.0
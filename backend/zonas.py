@@ -0,0 +1,139 @@
+"""Zone and sector lookup for coordinates in Ventanilla.
+
+Sector polygons come from ``zonas_ventanilla.geojson`` (one Feature per
+sector, with ``zona`` and ``sector`` properties). The shipped boundaries are
+approximate and drawn for development; replace the file with the
+municipality's official polygons, the code does not change.
+
+At load time the district's bounding box is cut into a grid. Each cell
+keeps the sectors whose bounding box touches it, and a cell whose four
+corners fall in the same sector with no polygon vertex inside is marked as
+entirely in that sector: most lookups are a grid access with no geometry
+at all. Points outside the bounding box are rejected before any work, and
+the remaining cells fall back to ray casting over one or two candidates.
+"""
+
+import json
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+ZONAS_PATH = Path(__file__).with_name("zonas_ventanilla.geojson")
+
+Punto = Tuple[float, float]  # (lon, lat), GeoJSON order
+
+
+@dataclass(frozen=True)
+class Sector:
+    zona: str
+    sector: str
+
+
+class _Poligono:
+    __slots__ = ("sector", "anillo", "min_lon", "min_lat", "max_lon", "max_lat")
+
+    def __init__(self, sector: Sector, anillo: Sequence[Punto]):
+        self.sector = sector
+        # Drop the closing point GeoJSON repeats
+        self.anillo = [tuple(p) for p in anillo[:-1]] if anillo[0] == anillo[-1] else [tuple(p) for p in anillo]
+        lons = [p[0] for p in self.anillo]
+        lats = [p[1] for p in self.anillo]
+        self.min_lon, self.max_lon = min(lons), max(lons)
+        self.min_lat, self.max_lat = min(lats), max(lats)
+
+    def contiene(self, lon: float, lat: float) -> bool:
+        if not (self.min_lon <= lon <= self.max_lon and self.min_lat <= lat <= self.max_lat):
+            return False
+        dentro = False
+        anillo = self.anillo
+        x1, y1 = anillo[-1]
+        for x2, y2 in anillo:
+            # Half-open on y, so a point on a shared edge belongs to one sector
+            if (y1 > lat) != (y2 > lat):
+                if lon < x1 + (lat - y1) * (x2 - x1) / (y2 - y1):
+                    dentro = not dentro
+            x1, y1 = x2, y2
+        return dentro
+
+
+class IndiceZonas:
+    def __init__(self, poligonos: List[_Poligono], celdas: int = 64):
+        self.poligonos = poligonos
+        self.celdas = celdas
+        self.min_lon = min(p.min_lon for p in poligonos)
+        self.min_lat = min(p.min_lat for p in poligonos)
+        self.max_lon = max(p.max_lon for p in poligonos)
+        self.max_lat = max(p.max_lat for p in poligonos)
+        self.zonas = frozenset(p.sector.zona for p in poligonos)
+        self.ancho = (self.max_lon - self.min_lon) / celdas
+        self.alto = (self.max_lat - self.min_lat) / celdas
+        # Per cell: a Sector when the whole cell is inside it, otherwise the
+        # tuple of candidate polygons (possibly empty)
+        self._grilla: List[object] = [self._preparar(i, j)
+                                      for j in range(celdas) for i in range(celdas)]
+
+    @classmethod
+    def desde_geojson(cls, datos: dict, celdas: int = 64) -> "IndiceZonas":
+        poligonos = []
+        for feature in datos["features"]:
+            props = feature["properties"]
+            geometria = feature["geometry"]
+            sector = Sector(props["zona"], props["sector"])
+            if geometria["type"] == "Polygon":
+                partes = [geometria["coordinates"]]
+            elif geometria["type"] == "MultiPolygon":
+                partes = geometria["coordinates"]
+            else:
+                raise ValueError(f"unsupported geometry {geometria['type']} for sector {sector.sector}")
+            for anillos in partes:
+                if len(anillos) > 1:
+                    raise ValueError(f"sector {sector.sector} has holes, which are not supported")
+                poligonos.append(_Poligono(sector, anillos[0]))
+        return cls(poligonos, celdas)
+
+    def _preparar(self, i: int, j: int):
+        x0 = self.min_lon + i * self.ancho
+        y0 = self.min_lat + j * self.alto
+        x1, y1 = x0 + self.ancho, y0 + self.alto
+        candidatos = tuple(p for p in self.poligonos
+                           if p.min_lon <= x1 and p.max_lon >= x0
+                           and p.min_lat <= y1 and p.max_lat >= y0)
+        if not candidatos:
+            return candidatos
+        hay_vertices = any(x0 <= x <= x1 and y0 <= y <= y1
+                           for p in candidatos for x, y in p.anillo)
+        if not hay_vertices:
+            # No vertex inside the cell: a polygon edge crossing it would
+            # leave corners on both sides, so equal corners mean full cover
+            esquinas = {self._buscar(candidatos, x, y)
+                        for x, y in ((x0, y0), (x1, y0), (x0, y1), (x1, y1))}
+            if len(esquinas) == 1:
+                unico = esquinas.pop()
+                return unico if unico is not None else ()
+        return candidatos
+
+    @staticmethod
+    def _buscar(candidatos, lon: float, lat: float) -> Optional[Sector]:
+        for poligono in candidatos:
+            if poligono.contiene(lon, lat):
+                return poligono.sector
+        return None
+
+    def localizar(self, lat: float, lon: float) -> Optional[Sector]:
+        """Sector containing the point, or None outside the district."""
+        if not (self.min_lon <= lon <= self.max_lon and self.min_lat <= lat <= self.max_lat):
+            return None
+        i = min(int((lon - self.min_lon) / self.ancho), self.celdas - 1)
+        j = min(int((lat - self.min_lat) / self.alto), self.celdas - 1)
+        celda = self._grilla[j * self.celdas + i]
+        if isinstance(celda, Sector):
+            return celda
+        return self._buscar(celda, lon, lat)
+
+
+@lru_cache(maxsize=1)
+def indice() -> IndiceZonas:
+    """The district index, built on first use (warm-up does it at boot)."""
+    with open(ZONAS_PATH, encoding="utf-8") as f:
+        return IndiceZonas.desde_geojson(json.load(f))
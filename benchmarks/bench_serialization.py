@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: JSON encoding cost of the public report list
+Compares the old path (str(_id) loop + jsonable_encoder + stdlib json) against
+MongoJSONResponse (orjson with native datetime/ObjectId/Decimal handling).
+
+Usage: python benchmarks/bench_serialization.py [--reportes 1000] [--repeticiones 50]
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from serialization import MongoJSONResponse  # noqa: E402
+
+
+def build_reportes(cantidad, foto_bytes):
+    base = datetime(2024, 1, 1)
+    foto = "A" * foto_bytes
+    reportes = []
+    for i in range(cantidad):
+        reportes.append({
+            "_id": ObjectId(),
+            "descripcion": f"Acumulación de residuos en la calle {i} cerca al mercado",
+            "foto_base64": foto,
+            "latitud": -11.87 + random.random() / 100,
+            "longitud": -77.15 + random.random() / 100,
+            "direccion": f"Av. Néstor Gambetta {i}, Ventanilla",
+            "usuario_id": str(ObjectId()),
+            "usuario_nombre": "Carmen Flores",
+            "fecha": base + timedelta(minutes=i),
+            "estado": "activo",
+            "publico": True,
+            "peso_estimado_kg": Decimal("12.50"),
+        })
+    return reportes
+
+
+def encode_old(reportes):
+    # What get_reportes_publicos did before: stringify ids by hand, then let
+    # FastAPI run jsonable_encoder and render with the stdlib json module.
+    for reporte in reportes:
+        reporte["_id"] = str(reporte["_id"])
+    return JSONResponse(jsonable_encoder({"reportes": reportes})).body
+
+
+def encode_new(reportes):
+    return MongoJSONResponse({"reportes": reportes}).body
+
+
+def measure(fn, reportes, repeticiones):
+    # Each run gets fresh documents so the old path pays for its _id loop.
+    copies = [[dict(r) for r in reportes] for _ in range(repeticiones)]
+    it = iter(copies)
+    total = timeit.timeit(lambda: fn(next(it)), number=repeticiones)
+    return total / repeticiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--reportes", type=int, default=1000)
+    parser.add_argument("--repeticiones", type=int, default=50)
+    parser.add_argument("--foto-bytes", type=int, default=0,
+                        help="tamaño del campo foto_base64 (0 = sin foto)")
+    args = parser.parse_args()
+
+    reportes = build_reportes(args.reportes, args.foto_bytes)
+    assert len(encode_new([dict(r) for r in reportes])) > 0
+
+    old = measure(encode_old, reportes, args.repeticiones)
+    new = measure(encode_new, reportes, args.repeticiones)
+    escala = 1000 / args.reportes
+
+    print(f"📊 JSON encoding, {args.reportes} reportes, foto_base64={args.foto_bytes} bytes")
+    print("=" * 60)
+    print(f"  jsonable_encoder + json : {old * 1000 * escala:8.2f} ms / 1000 reportes")
+    print(f"  MongoJSONResponse       : {new * 1000 * escala:8.2f} ms / 1000 reportes")
+    print(f"  speedup                 : {old / new:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
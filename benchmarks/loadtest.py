@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Local load test for VENTANILLA RECICLA CONTIGO
+Starts the API in-process against a local mongod (or an in-memory stand-in),
+seeds users and reports with real-sized photos, and drives a weighted mix of
+traffic scenarios at a target request rate. Prints throughput and
+p50/p95/p99 latency per endpoint.
+
+Usage:
+  python benchmarks/loadtest.py --memoria --rps 50 --duracion 30
+  python benchmarks/loadtest.py --mongo-url mongodb://localhost:27017 --usuarios 500 --reportes 5000
+  python benchmarks/loadtest.py --memoria --mezcla feed=1,login=1 --json resultados.json
+
+Scenarios (weights set with --mezcla):
+  feed      browse the public feed, then open a reporter's profile
+  mapa      open the report map, as when panning around the district
+  reportes  burst of new reports with photos
+  login     login storm against seeded accounts
+
+Latency is measured from each request's scheduled start, so a saturated
+server shows up as queueing delay rather than a silently lower request rate.
+"""
+
+import argparse
+import base64
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+from bson import ObjectId
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+SEED_PASSWORD = "CargaVentanilla2024"
+
+# Ventanilla, Callao: rough bounding box used for seeded coordinates
+LAT_RANGE = (-11.95, -11.84)
+LON_RANGE = (-77.16, -77.10)
+
+DESCRIPCIONES = [
+    "Acumulación de basura en la esquina del parque",
+    "Desmonte abandonado en la vía pública",
+    "Residuos plásticos en la playa",
+    "Quema de basura cerca a viviendas",
+    "Contenedor de reciclaje desbordado",
+    "Aguas servidas en la calle",
+]
+
+
+def random_photo(size_kb, rng):
+    raw = rng.randbytes(size_kb * 1024)
+    return "data:image/jpeg;base64," + base64.b64encode(raw).decode()
+
+
+def random_point(rng):
+    return rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)
+
+
+# Database setup
+
+def open_database(args):
+    if not args.memoria:
+        os.environ["MONGO_URL"] = args.mongo_url
+    os.environ["MONGO_DB_NAME"] = args.db
+    # Every simulated client comes from 127.0.0.1
+    os.environ["RATE_LIMITS_ENABLED"] = "0"
+    import database
+    import server
+    from query_monitor import QueryMonitor
+
+    if args.memoria:
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit("--memoria requiere mongomock (pip install mongomock)")
+        database.use_databases(mongomock.MongoClient()[args.db])
+    else:
+        database.connect(server.settings.mongo, event_listeners=[QueryMonitor()])
+    return server, database.get_db()
+
+
+def seed(server, database, args, rng):
+    print(f"🌱 Seeding {args.usuarios} usuarios and {args.reportes} reportes "
+          f"({args.foto_kb} KB photos) into '{args.db}'")
+    database.usuarios.delete_many({})
+    database.reportes.delete_many({})
+
+    password = server.hash_password(SEED_PASSWORD)
+    now = datetime.utcnow()
+    usuarios = []
+    for i in range(args.usuarios):
+        lat, lon = random_point(rng)
+        usuarios.append({
+            "_id": ObjectId(),
+            "nombre": f"Vecino {i}",
+            "email": f"vecino{i}@carga.ventanilla.pe",
+            "password": password,
+            "latitud": lat,
+            "longitud": lon,
+            "foto_perfil": None,
+            "puntos": 0,
+            "reportes_enviados": 0,
+            "fecha_registro": now - timedelta(days=rng.randint(0, 365)),
+            "logros": [],
+        })
+    if usuarios:
+        database.usuarios.insert_many(usuarios)
+
+    # A handful of distinct photos is enough to get real document sizes
+    # without spending the seed phase in the random number generator.
+    fotos = [random_photo(args.foto_kb, rng) for _ in range(8)]
+    lote = []
+    for i in range(args.reportes):
+        lat, lon = random_point(rng)
+        autor = rng.choice(usuarios)
+        lote.append({
+            "descripcion": rng.choice(DESCRIPCIONES),
+            "foto_base64": rng.choice(fotos),
+            "latitud": lat,
+            "longitud": lon,
+            "direccion": f"Calle {rng.randint(1, 300)}, Ventanilla",
+            "usuario_id": str(autor["_id"]),
+            "fecha": now - timedelta(minutes=rng.randint(0, 90 * 24 * 60)),
+            "estado": "activo",
+            "publico": True,
+        })
+        if len(lote) == 500:
+            database.reportes.insert_many(lote)
+            lote = []
+    if lote:
+        database.reportes.insert_many(lote)
+
+    return [
+        {"id": str(u["_id"]), "email": u["email"]} for u in usuarios
+    ], fotos
+
+
+# Server
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app, port):
+    import uvicorn
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    uv_server = uvicorn.Server(config)
+    thread = threading.Thread(target=uv_server.run, daemon=True)
+    thread.start()
+    deadline = time.time() + 15
+    while not uv_server.started:
+        if time.time() > deadline or not thread.is_alive():
+            sys.exit("❌ El servidor no arrancó")
+        time.sleep(0.05)
+    return uv_server, thread
+
+
+# Scenarios
+
+class Contexto:
+    def __init__(self, base_url, usuarios, fotos, rng_seed):
+        self.base_url = base_url
+        self.usuarios = usuarios
+        self.fotos = fotos
+        self._local = threading.local()
+        self._seed = rng_seed
+
+    def _hilo(self):
+        local = self._local
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+            local.rng = random.Random(self._seed + threading.get_ident())
+        return local
+
+    @property
+    def session(self):
+        return self._hilo().session
+
+    @property
+    def rng(self):
+        return self._hilo().rng
+
+
+def escenario_feed(ctx, registrar):
+    registrar("GET /api/reportes-publicos", ctx.session.get(f"{ctx.base_url}/api/reportes-publicos"))
+    if ctx.usuarios:
+        usuario = ctx.rng.choice(ctx.usuarios)
+        registrar("GET /api/usuarios/{user_id}",
+                  ctx.session.get(f"{ctx.base_url}/api/usuarios/{usuario['id']}"))
+
+
+def escenario_mapa(ctx, registrar):
+    registrar("GET /api/mapa-reportes", ctx.session.get(f"{ctx.base_url}/api/mapa-reportes"))
+
+
+def escenario_reportes(ctx, registrar):
+    if not ctx.usuarios:
+        return
+    lat, lon = random_point(ctx.rng)
+    payload = {
+        "descripcion": ctx.rng.choice(DESCRIPCIONES),
+        "foto_base64": ctx.rng.choice(ctx.fotos),
+        "latitud": lat,
+        "longitud": lon,
+        "direccion": "Av. Néstor Gambetta, Ventanilla",
+        "usuario_id": ctx.rng.choice(ctx.usuarios)["id"],
+    }
+    registrar("POST /api/reportes", ctx.session.post(f"{ctx.base_url}/api/reportes", json=payload))
+
+
+def escenario_login(ctx, registrar):
+    if not ctx.usuarios:
+        return
+    usuario = ctx.rng.choice(ctx.usuarios)
+    registrar("POST /api/login", ctx.session.post(
+        f"{ctx.base_url}/api/login",
+        json={"email": usuario["email"], "password": SEED_PASSWORD},
+    ))
+
+
+ESCENARIOS = {
+    "feed": escenario_feed,
+    "mapa": escenario_mapa,
+    "reportes": escenario_reportes,
+    "login": escenario_login,
+}
+MEZCLA_POR_DEFECTO = "feed=50,mapa=30,reportes=10,login=10"
+
+
+def parse_mezcla(texto):
+    mezcla = {}
+    for parte in texto.split(","):
+        nombre, _, peso = parte.partition("=")
+        nombre = nombre.strip()
+        if nombre not in ESCENARIOS:
+            raise argparse.ArgumentTypeError(f"escenario desconocido: {nombre}")
+        mezcla[nombre] = float(peso or 1)
+    return mezcla
+
+
+# Measurement
+
+class Resultados:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = defaultdict(list)
+        self.errores = defaultdict(int)
+        self.bytes = defaultdict(int)
+
+    def registrar(self, endpoint, inicio_programado, response):
+        latencia = time.perf_counter() - inicio_programado
+        with self._lock:
+            self.latencias[endpoint].append(latencia)
+            self.bytes[endpoint] += len(response.content)
+            if response.status_code >= 400:
+                self.errores[endpoint] += 1
+
+    def fallo(self, endpoint):
+        with self._lock:
+            self.errores[endpoint] += 1
+
+
+def percentil(valores_ordenados, p):
+    if not valores_ordenados:
+        return 0.0
+    indice = min(len(valores_ordenados) - 1, int(round(p / 100 * (len(valores_ordenados) - 1))))
+    return valores_ordenados[indice]
+
+
+def resumen(resultados, duracion):
+    filas = {}
+    for endpoint, latencias in sorted(resultados.latencias.items()):
+        ordenadas = sorted(latencias)
+        filas[endpoint] = {
+            "peticiones": len(ordenadas),
+            "errores": resultados.errores.get(endpoint, 0),
+            "rps": len(ordenadas) / duracion,
+            "kb_promedio": resultados.bytes[endpoint] / len(ordenadas) / 1024,
+            "p50_ms": percentil(ordenadas, 50) * 1000,
+            "p95_ms": percentil(ordenadas, 95) * 1000,
+            "p99_ms": percentil(ordenadas, 99) * 1000,
+            "max_ms": ordenadas[-1] * 1000,
+        }
+    return filas
+
+
+def imprimir(filas, duracion, objetivo_rps):
+    total = sum(f["peticiones"] for f in filas.values())
+    print(f"\n📊 RESULTADOS ({duracion:.1f}s, objetivo {objetivo_rps} escenarios/s, "
+          f"{total / duracion:.1f} peticiones/s)")
+    print("=" * 108)
+    print(f"{'endpoint':<34}{'req':>7}{'err':>6}{'req/s':>8}{'KB':>9}"
+          f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    print("-" * 108)
+    for endpoint, f in filas.items():
+        print(f"{endpoint:<34}{f['peticiones']:>7}{f['errores']:>6}{f['rps']:>8.1f}"
+              f"{f['kb_promedio']:>9.1f}{f['p50_ms']:>10.1f}{f['p95_ms']:>10.1f}"
+              f"{f['p99_ms']:>10.1f}{f['max_ms']:>10.1f}")
+    print("=" * 108)
+
+
+def ejecutar(ctx, mezcla, args):
+    resultados = Resultados()
+    nombres = list(mezcla)
+    pesos = [mezcla[n] for n in nombres]
+    rng = random.Random(args.semilla)
+    intervalo = 1.0 / args.rps
+
+    def correr(nombre, inicio_programado):
+        def registrar(endpoint, response):
+            resultados.registrar(endpoint, inicio_programado, response)
+        try:
+            ESCENARIOS[nombre](ctx, registrar)
+        except requests.RequestException:
+            resultados.fallo(f"{nombre} (conexión)")
+
+    print(f"🚀 {args.rps} escenarios/s durante {args.duracion}s con mezcla {mezcla}")
+    inicio = time.perf_counter()
+    fin = inicio + args.duracion
+    programado = inicio
+    with ThreadPoolExecutor(max_workers=args.hilos) as pool:
+        while programado < fin:
+            ahora = time.perf_counter()
+            if programado > ahora:
+                time.sleep(programado - ahora)
+            pool.submit(correr, rng.choices(nombres, pesos)[0], programado)
+            programado += intervalo
+    return resultados, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga local de la API")
+    origen = parser.add_mutually_exclusive_group()
+    origen.add_argument("--mongo-url", default=os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    origen.add_argument("--memoria", action="store_true", help="usar mongomock en memoria")
+    parser.add_argument("--db", default="recicla_contigo_carga",
+                        help="base de datos de prueba (se vacía al sembrar)")
+    parser.add_argument("--usuarios", type=int, default=200)
+    parser.add_argument("--reportes", type=int, default=2000)
+    parser.add_argument("--foto-kb", type=int, default=120, help="tamaño de cada foto en KB")
+    parser.add_argument("--rps", type=float, default=20, help="escenarios iniciados por segundo")
+    parser.add_argument("--duracion", type=float, default=30, help="segundos de carga")
+    parser.add_argument("--hilos", type=int, default=64, help="clientes concurrentes máximos")
+    parser.add_argument("--mezcla", type=parse_mezcla, default=parse_mezcla(MEZCLA_POR_DEFECTO))
+    parser.add_argument("--semilla", type=int, default=2024)
+    parser.add_argument("--json", help="guardar resultados en este archivo")
+    args = parser.parse_args()
+    if args.reportes and not args.usuarios:
+        parser.error("--reportes necesita al menos un usuario para asignarlos")
+
+    rng = random.Random(args.semilla)
+    server, database = open_database(args)
+    usuarios, fotos = seed(server, database, args, rng)
+
+    port = free_port()
+    uv_server, thread = start_server(server.app, port)
+    ctx = Contexto(f"http://127.0.0.1:{port}", usuarios, fotos, args.semilla)
+    try:
+        resultados, duracion = ejecutar(ctx, args.mezcla, args)
+    finally:
+        uv_server.should_exit = True
+        thread.join(timeout=10)
+
+    filas = resumen(resultados, duracion)
+    imprimir(filas, duracion, args.rps)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "fecha": datetime.utcnow().isoformat(),
+                "parametros": {k: v for k, v in vars(args).items() if k != "mezcla"} | {"mezcla": args.mezcla},
+                "duracion_s": duracion,
+                "endpoints": filas,
+            }, f, indent=2)
+        print(f"💾 Resultados guardados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -84,9 +84,11 @@ export default function IncentivosScreen() {
           text: 'Canjear',
           onPress: async () => {
             try {
+              const token = await AsyncStorage.getItem('token');
               const response = await axios.post(`${API_URL}/api/canjear`, {
-                incentivo_id: incentivo.id,
-                usuario_id: user.id
+                incentivo_id: incentivo.id
+              }, {
+                headers: { Authorization: `Bearer ${token}` }
               });
 
               Alert.alert(
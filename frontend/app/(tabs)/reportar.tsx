@@ -162,14 +162,16 @@ export default function ReportarScreen() {
         latitud: location.coords.latitude,
         longitud: location.coords.longitude,
         direccion: direccion,
-        usuario_id: user?.id || '',
       };
 
-      const response = await axios.post(`${API_URL}/api/reportes`, reportData);
+      const token = await AsyncStorage.getItem('token');
+      const response = await axios.post(`${API_URL}/api/reportes`, reportData, {
+        headers: { Authorization: `Bearer ${token}` }
+      });
 
       Alert.alert(
         '¡Reporte Enviado!',
-        `Tu reporte ha sido enviado exitosamente. Has ganado ${response.data.puntos_ganados} puntos por ayudar al medio ambiente.`,
+        `Tu reporte ha sido enviado exitosamente. Ganarás ${response.data.puntos_pendientes} puntos cuando un moderador lo apruebe.`,
         [
           {
             text: 'Continuar',
@@ -131,7 +131,9 @@ def test_profile_photo_functionality():
         if response.status_code == 200:
             user_data = response.json()
             
-            if user_data.get("foto_perfil") == PROFILE_PHOTO_2:
+            # The profile links the avatar instead of inlining it
+            foto = requests.get(f"{BASE_URL}{user_data.get('foto_perfil')}")
+            if foto.content == base64.b64decode(PROFILE_PHOTO_2.split(",", 1)[1]):
                 print("✅ Photo update verified in database")
             else:
                 print("❌ Photo update not persisted in database")
@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import database  # noqa: E402
+from query_monitor import QueryMonitor, current_stats  # noqa: E402
+
+TEST_DB_NAME = "recicla_contigo_test"
+
+# Methods that issue one Mongo command each. Used to count queries on the
+# in-memory stand-in, which never fires pymongo's command listeners.
+_COMMAND_METHODS = frozenset({
+    "find", "find_one", "insert_one", "insert_many", "update_one", "update_many",
+    "delete_one", "delete_many", "replace_one", "aggregate", "count_documents",
+    "distinct", "find_one_and_update", "find_one_and_delete", "bulk_write",
+})
+
+
+class _CountingCollection:
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in _COMMAND_METHODS:
+            return attr
+
+        def counted(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                stats = current_stats()
+                if stats is not None:
+                    stats.count += 1
+                    stats.time_ms += (time.perf_counter() - start) * 1000
+        return counted
+
+
+class _CountingDatabase:
+    def __init__(self, database):
+        self._database = database
+
+    def __getattr__(self, name):
+        if name.startswith("_") or hasattr(type(self._database), name):
+            return getattr(self._database, name)
+        return _CountingCollection(self._database[name])
+
+    def __getitem__(self, name):
+        return _CountingCollection(self._database[name])
+
+
+def _open_test_database():
+    url = os.getenv("MONGO_TEST_URL")
+    if url:
+        client = database.connect(
+            database.MongoSettings(url=url, db_name=TEST_DB_NAME, server_selection_timeout_ms=2000),
+            event_listeners=[QueryMonitor()],
+        )
+        client.admin.command("ping")
+        return "mongodb", database.get_db()
+    mongomock = pytest.importorskip(
+        "mongomock", reason="set MONGO_TEST_URL or install mongomock to run these tests"
+    )
+    return "mongomock", _CountingDatabase(mongomock.MongoClient()[TEST_DB_NAME])
+
+
+@pytest.fixture(scope="session")
+def test_database():
+    original = (database.get_db(), database.get_read_db())
+    backend, test_db = _open_test_database()
+    database.use_databases(test_db)
+    try:
+        yield backend, test_db
+    finally:
+        if backend == "mongodb":
+            test_db.client.drop_database(TEST_DB_NAME)
+        database.use_databases(*original)
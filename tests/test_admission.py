@@ -0,0 +1,75 @@
+import asyncio
+
+from fastapi.middleware.cors import CORSMiddleware
+
+import server
+from admission import AUTH, READS, UPLOADS, AdmissionController, AdmissionMiddleware, route_class
+from config import Settings
+from ratelimit import RateLimitMiddleware
+
+
+def controller(**overrides):
+    options = dict(
+        max_concurrency=3,
+        reserved={AUTH: 1, UPLOADS: 1},
+        queue_budget_s={AUTH: 1.0, UPLOADS: 1.0, READS: 0.02},
+    )
+    options.update(overrides)
+    return AdmissionController(**options)
+
+
+def test_route_classes():
+    assert route_class("POST", "/api/login") == AUTH
+    assert route_class("POST", "/api/reportes") == UPLOADS
+    assert route_class("GET", "/api/reportes-publicos") == READS
+    assert route_class("GET", "/api/health/ready") is None
+
+
+def test_reads_cannot_take_reserved_slots():
+    async def scenario():
+        admission = controller()
+        assert await admission.acquire(READS) is not None
+        # Only one shared slot: the second read queues past its budget
+        assert await admission.acquire(READS) is None
+        assert await admission.acquire(AUTH) is not None
+        assert await admission.acquire(UPLOADS) is not None
+
+    asyncio.run(scenario())
+
+
+def test_freed_shared_slot_goes_to_auth_before_reads():
+    async def scenario():
+        admission = controller(queue_budget_s={AUTH: 1.0, UPLOADS: 1.0, READS: 1.0})
+        pools = [await admission.acquire(c) for c in (READS, AUTH, UPLOADS)]
+        lectura = asyncio.create_task(admission.acquire(READS))
+        login = asyncio.create_task(admission.acquire(AUTH))
+        await asyncio.sleep(0)
+        admission.release(READS, pools[0])
+        assert await login is not None
+        assert not lectura.done()
+        lectura.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_queue_limit_sheds_immediately():
+    async def scenario():
+        admission = controller(max_queue=0)
+        await admission.acquire(READS)
+        assert await admission.acquire(READS) is None
+        assert admission.queued(READS) == 0
+
+    asyncio.run(scenario())
+
+
+def test_rejections_pass_through_cors():
+    anterior = server.settings
+    try:
+        app = server.create_app(Settings())
+    finally:
+        server.settings = anterior
+        server.rate_limiter.enabled = anterior.rate_limits_enabled
+    # Outermost first: CORS must wrap the middlewares that answer 503 and 429
+    clases = [m.cls for m in app.user_middleware]
+    assert clases.index(CORSMiddleware) < clases.index(AdmissionMiddleware)
+    assert clases.index(CORSMiddleware) < clases.index(RateLimitMiddleware)
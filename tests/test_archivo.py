@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+
+import orjson
+import pytest
+from bson import ObjectId
+
+import archivo
+import server
+from fotos import DirectorioFotos, data_url
+
+
+@pytest.fixture
+def db(test_database):
+    _, db = test_database
+    db.reportes.delete_many({})
+    db[archivo.ARCHIVO].delete_many({})
+    db.trabajos.delete_many({})
+    return db
+
+
+def reporte(db, dias, estado="activo", usuario_id="u1", **campos):
+    fecha = datetime.utcnow() - timedelta(days=dias)
+    return db.reportes.insert_one({
+        "descripcion": "Basura", "usuario_id": usuario_id, "zona": "Sur",
+        "latitud": -11.94, "longitud": -77.13,
+        "fecha": fecha, "actualizado_en": fecha, "estado": estado, "publico": True,
+        "foto_base64": data_url(b"\xff\xd8foto", "image/jpeg"), **campos,
+    }).inserted_id
+
+
+def test_lifecycle_expires_then_archives_with_photos(db, tmp_path):
+    reciente = reporte(db, 10)
+    viejo = reporte(db, 200)
+    resuelto_viejo = reporte(db, 45, estado="resuelto")
+    pendiente = reporte(db, 45, estado="resuelto", outbox={"tipo": "reporte_creado"})
+
+    ahora = datetime.utcnow()
+    assert archivo.expirar(db, ahora - timedelta(days=90), ahora) == 1
+    expirado = db.reportes.find_one({"_id": viejo})
+    assert expirado["estado"] == "expirado"
+    assert expirado["actualizado_en"] > ahora - timedelta(seconds=1)
+
+    # Just expired: stays hot until it has been out of the feed for a while
+    movidos = archivo.archivar(db, ahora - timedelta(days=30), DirectorioFotos(str(tmp_path)), lote=1, pausa_s=0)
+    assert movidos == 1
+    assert {d["_id"] for d in db.reportes.find()} == {reciente, viejo, pendiente}
+    archivado = db[archivo.ARCHIVO].find_one({"_id": resuelto_viejo})
+    assert "foto_base64" not in archivado and archivado["foto_tipo"] == "image/jpeg"
+    assert DirectorioFotos(str(tmp_path)).leer(archivado["foto_ref"]) == b"\xff\xd8foto"
+
+
+def test_archival_run_takes_a_lease(db):
+    reporte(db, 45, estado="resuelto")
+    assert server.run_archival()["archivados"] == 1
+    reporte(db, 45, estado="resuelto")
+    assert server.run_archival()["archivados"] == 0  # another run holds the lease
+
+
+def test_only_the_author_resolves_and_sync_sends_a_tombstone(db):
+    autor = str(ObjectId())
+    reporte_id = str(reporte(db, 1, usuario_id=autor))
+    token = orjson.loads(server.sync_reportes().body)["token"]
+    # The author is whoever the Bearer token says, never a body field
+    with pytest.raises(server.HTTPException) as error:
+        server.usuario_actual(None)
+    assert error.value.status_code == 401
+    otro = server.usuario_actual("Bearer " + server.create_access_token(str(ObjectId())))
+    with pytest.raises(server.HTTPException) as error:
+        server.update_reporte_estado(reporte_id, server.ReporteEstado(estado="resuelto"), usuario_id=otro)
+    assert error.value.status_code == 403
+    usuario_id = server.usuario_actual("Bearer " + server.create_access_token(autor))
+    server.update_reporte_estado(reporte_id, server.ReporteEstado(estado="resuelto"), usuario_id=usuario_id)
+    resuelto_en = db.reportes.find_one({"_id": ObjectId(reporte_id)})["resuelto_en"]
+    assert resuelto_en.microsecond % 1000 == 0
+    with pytest.raises(server.HTTPException) as error:
+        server.update_reporte_estado(reporte_id, server.ReporteEstado(estado="resuelto"), usuario_id=usuario_id)
+    assert error.value.status_code == 409
+    cambios = orjson.loads(server.sync_reportes(since=token).body)
+    assert reporte_id in cambios["eliminados"] and not cambios["reinicio"]
+
+
+def test_tokens_older_than_the_archive_horizon_reset(db):
+    reporte(db, 1)
+    viejo = server.encode_sync_token(datetime.utcnow() - timedelta(days=60), server.ZERO_OID)
+    respuesta = orjson.loads(server.sync_reportes(since=viejo).body)
+    assert respuesta["reinicio"] and len(respuesta["reportes"]) == 1
+
+
+def test_archive_search_filters(db):
+    db[archivo.ARCHIVO].insert_many([
+        {"descripcion": "Llanta", "usuario_id": "u1", "zona": "Sur", "publico": True,
+         "fecha": datetime(2023, 3, 1), "estado": "resuelto", "foto_ref": "s3://b/k.jpg"},
+        {"descripcion": "Desmonte", "usuario_id": "u2", "zona": "Norte", "publico": True,
+         "fecha": datetime(2023, 6, 1), "estado": "expirado"},
+    ])
+    respuesta = orjson.loads(server.buscar_archivo(zona="Sur", desde=datetime(2023, 1, 1)).body)
+    assert [r["descripcion"] for r in respuesta["reportes"]] == ["Llanta"]
+    assert "foto_ref" not in respuesta["reportes"][0]
+    with pytest.raises(server.HTTPException):
+        server.buscar_archivo(zona="Atlantida")
@@ -0,0 +1,34 @@
+import pytest
+
+from busqueda import parse_bbox, plegar, resaltar, terminos
+
+
+def test_terms_are_folded_and_stemmed():
+    assert terminos("Desmontes en la PLAYA") == terminos("desmonte en la playa")
+    assert plegar("Néstor Gambetta") == "nestor gambetta"
+
+
+def test_highlight_offsets_point_into_original_text():
+    texto = "Desmonte junto a la Playa Márquez; más desmontes cerca"
+    offsets = resaltar(texto, terminos("desmonte marquez"))
+    assert [texto[a:b] for a, b in offsets] == ["Desmonte", "Márquez", "desmontes"]
+
+
+def test_stopwords_are_not_highlighted():
+    assert terminos("basura en la playa") == terminos("basura playa")
+    texto = "Basura en la orilla de la playa"
+    offsets = resaltar(texto, terminos("basura en la playa"))
+    assert [texto[a:b] for a, b in offsets] == ["Basura", "playa"]
+
+
+def test_no_highlight_without_match():
+    assert resaltar("Basura acumulada", terminos("playa")) == []
+    assert resaltar(None, terminos("playa")) == []
+
+
+def test_bbox():
+    assert parse_bbox("-77.16,-11.95,-77.10,-11.84") == (-77.16, -11.95, -77.10, -11.84)
+    with pytest.raises(ValueError):
+        parse_bbox("-77.10,-11.95,-77.16,-11.84")
+    with pytest.raises(ValueError):
+        parse_bbox("1,2,3")
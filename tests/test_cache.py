@@ -0,0 +1,84 @@
+import threading
+import time
+
+from cache import LocalSharedStore, SingleFlight, TwoLevelCache
+
+
+def test_single_flight_shares_one_call():
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return b"ok"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do("k", slow)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flights.do("k", slow)))
+                 for _ in range(5)]
+    for t in followers:
+        t.start()
+    while flights.coalesced < 5:
+        time.sleep(0.001)
+    release.set()
+    for t in [leader, *followers]:
+        t.join(5)
+    assert calls == [1]
+    assert results == [b"ok"] * 6
+
+
+def test_stale_value_served_while_refreshing():
+    cache = TwoLevelCache("prueba-swr", store=LocalSharedStore())
+    version = iter([b"v1", b"v2"])
+    assert cache.get_or_set("k", lambda: next(version), ttl=0.01, stale_ttl=10) == b"v1"
+    time.sleep(0.02)
+    cache.store.delete([cache._store_key("k", cache._current_version())])
+    # Expired: the old value comes back immediately, the reload runs behind it
+    assert cache.get_or_set("k", lambda: next(version), ttl=0.01, stale_ttl=10) == b"v1"
+    deadline = time.monotonic() + 5
+    while cache.l1.get("k")[0] != b"v2" and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert cache.l1.get("k")[0] == b"v2"
+
+
+def test_invalidated_key_is_not_served_stale():
+    cache = TwoLevelCache("prueba-inv", store=LocalSharedStore())
+    cache.get_or_set("k", lambda: b"viejo", ttl=60, stale_ttl=60)
+    cache.invalidate()
+    assert cache.get_or_set("k", lambda: b"nuevo") == b"nuevo"
+
+
+def test_invalidation_reaches_other_workers():
+    store = LocalSharedStore()
+    worker_a = TwoLevelCache("prueba-bus", store=store)
+    worker_b = TwoLevelCache("prueba-bus", store=store)
+    worker_a.set("perfil", b"antes")
+    worker_b.get("perfil")
+    worker_a.invalidate("perfil")
+    assert worker_b.l1.get("perfil") is None
+
+
+def test_namespace_invalidation_is_one_write():
+    store = LocalSharedStore()
+    worker_a = TwoLevelCache("prueba-ver", store=store)
+    worker_b = TwoLevelCache("prueba-ver", store=store)
+    for i in range(50):
+        worker_a.set(i, b"viejo")
+    escrituras = []
+    original = store.set
+    store.set = lambda *args: escrituras.append(args[0]) or original(*args)
+    worker_a.invalidate()
+    store.set = original
+    assert escrituras == ["prueba-ver:@version"]
+    # Entries under the old version are never read again, from any worker
+    worker_b.l1.clear()
+    assert worker_b.get(7) is None
+    assert worker_b.get_or_set(7, lambda: b"nuevo") == b"nuevo"
+    worker_a.l1.clear()
+    assert worker_a.get(7) == b"nuevo"
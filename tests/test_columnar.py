@@ -0,0 +1,50 @@
+import random
+from datetime import datetime, timedelta
+
+import orjson
+import pytest
+
+import columnar
+import server
+
+
+@pytest.fixture
+def marcadores(test_database):
+    _, db = test_database
+    db.reportes.delete_many({})
+    server.mapa_cache.invalidate()
+    rng = random.Random(7)
+    autores = [str(db.usuarios.insert_one({"nombre": f"Vecino {i}"}).inserted_id) for i in range(20)]
+    ahora = datetime(2024, 5, 6, 12)
+    db.reportes.insert_many([{
+        "descripcion": "Basura acumulada", "direccion": f"Calle {i}",
+        "latitud": rng.uniform(-11.95, -11.84), "longitud": rng.uniform(-77.16, -77.10),
+        "usuario_id": rng.choice(autores), "fecha": ahora - timedelta(minutes=7 * i),
+        "estado": "activo", "publico": True,
+    } for i in range(1000)])
+    yield db
+    server.mapa_cache.invalidate()
+
+
+def test_binary_round_trips(marcadores):
+    legado = orjson.loads(server.get_mapa_reportes().body)["reportes"]
+    col = columnar.leer_binario(server.get_mapa_reportes(format="binario").body)
+    assert col["ids"] == [r["_id"] for r in legado]
+    assert col["lat"] == pytest.approx([r["latitud"] for r in legado], abs=1e-5)
+    fechas, actual = [], col["fecha_base"]
+    for delta in col["fecha_delta"]:
+        actual -= delta
+        fechas.append(datetime(1970, 1, 1) + timedelta(seconds=actual))
+    assert fechas == [datetime.fromisoformat(r["fecha"]) for r in legado]
+    assert [col["autores"][i] for i in col["autor"]] == [r["usuario_nombre"] for r in legado]
+
+
+def test_columnar_payloads_are_a_fraction_of_the_original(marcadores):
+    legado = len(server.get_mapa_reportes().body)
+    compacto = server.get_mapa_reportes(accept=columnar.JSON_COLUMNAR)
+    assert compacto.media_type == columnar.JSON_COLUMNAR
+    assert compacto.headers["vary"] == "Accept"
+    assert len(compacto.body) < legado * 0.6
+    assert len(server.get_mapa_reportes(format="binario").body) < legado * 0.5
+    # Unknown or generic Accept values keep the original layout
+    assert len(server.get_mapa_reportes(accept="application/json, */*").body) == legado
@@ -0,0 +1,47 @@
+import pytest
+from pymongo.read_preferences import ReadPreference, SecondaryPreferred
+
+import database
+from database import MongoSettings
+
+
+def test_read_staleness_from_env():
+    settings = MongoSettings.from_env({"MONGO_READ_MAX_STALENESS_S": "300"})
+    assert settings.read_preference() == SecondaryPreferred(max_staleness=300)
+    assert MongoSettings.from_env({}).read_preference() == SecondaryPreferred(max_staleness=120)
+    # Empty means unset, as for every other variable
+    assert MongoSettings.from_env({"MONGO_READ_MAX_STALENESS_S": ""}).read_max_staleness_s == 120
+
+
+def test_staleness_below_the_server_minimum_is_refused():
+    with pytest.raises(ValueError):
+        MongoSettings.from_env({"MONGO_READ_MAX_STALENESS_S": "30"})
+    MongoSettings(read_max_staleness_s=database.MIN_MAX_STALENESS_S)
+
+
+@pytest.fixture
+def restaurar():
+    original = (database.get_client(), database.get_db(), database.get_read_db())
+    yield
+    database.close()
+    database._connection.client, database._connection.primary, database._connection.lecturas = original
+
+
+@pytest.mark.parametrize("staleness, esperada", [
+    ("120", SecondaryPreferred(max_staleness=120)),
+    ("0", ReadPreference.PRIMARY),
+])
+def test_reads_are_routed_by_the_setting(restaurar, staleness, esperada):
+    # The driver connects lazily: no server is needed to inspect the handles
+    database.connect(MongoSettings.from_env({
+        "MONGO_URL": "mongodb://localhost:27017", "MONGO_READ_MAX_STALENESS_S": staleness,
+    }))
+    assert database.get_db().read_preference == ReadPreference.PRIMARY
+    assert database.get_read_db().read_preference == esperada
+    assert database.get_read_db().name == database.get_db().name
+
+
+def test_without_a_read_handle_reads_go_to_the_primary(restaurar):
+    primario = object()
+    database.use_databases(primario)
+    assert database.get_read_db() is primario
@@ -0,0 +1,83 @@
+import asyncio
+import csv
+import io
+from datetime import datetime, timedelta
+
+import orjson
+import pytest
+
+import archivo
+import exportar
+import server
+from fotos import DirectorioFotos, data_url
+
+FOTO = b"\xff\xd8foto"
+
+
+@pytest.fixture
+def db(test_database):
+    _, db = test_database
+    db.reportes.delete_many({})
+    db[archivo.ARCHIVO].delete_many({})
+    return db
+
+
+def reporte(db, dias, estado="activo", coleccion="reportes", **campos):
+    fecha = datetime(2024, 5, 6) - timedelta(days=dias)
+    return db[coleccion].insert_one({
+        "descripcion": "Basura, vidrios", "usuario_id": "u1", "zona": "Sur",
+        "latitud": -11.94, "longitud": -77.13, "fecha": fecha, "actualizado_en": fecha,
+        "estado": estado, "publico": estado != "rechazado", **campos,
+    }).inserted_id
+
+
+def cuerpo(respuesta) -> bytes:
+    async def leer():
+        return b"".join([parte async for parte in respuesta.body_iterator])
+    return asyncio.run(leer())
+
+
+def test_exports_stream_without_photos(db):
+    vivo = reporte(db, 1, foto_base64=data_url(FOTO, "image/jpeg"))
+    reporte(db, 2, estado="rechazado")
+    archivado = reporte(db, 300, estado="resuelto", coleccion=archivo.ARCHIVO)
+
+    filas = [orjson.loads(l) for l in cuerpo(server.exportar_reportes("a1")).splitlines()]
+    assert [f["id"] for f in filas if f["estado"] != "rechazado"] == [str(vivo), str(archivado)]
+    assert all("foto_base64" not in f for f in filas)
+    assert filas[0]["foto_url"] == f"/api/reportes/{vivo}/foto"
+
+    respuesta = server.exportar_reportes(
+        "a1", formato="csv", estado="activo", desde=datetime(2024, 5, 1), incluir_archivo=False)
+    assert respuesta.headers["content-disposition"] == 'attachment; filename="reportes.csv"'
+    filas = list(csv.DictReader(io.StringIO(cuerpo(respuesta).decode())))
+    assert [f["id"] for f in filas] == [str(vivo)]
+    assert filas[0]["descripcion"] == "Basura, vidrios"
+    assert filas[0]["fecha"] == "2024-05-05T00:00:00"
+
+    # Batches are written as they are read
+    partes = list(exportar.csv_filas(db.reportes.find({}, exportar.PROYECCION), lote=1))
+    assert len(partes) == 2 and partes[0].startswith(b"id,fecha,")
+
+
+def test_export_rejects_unknown_filters(db):
+    with pytest.raises(server.HTTPException) as error:
+        server.exportar_reportes("a1", estado="borrado")
+    assert error.value.status_code == 400
+
+
+def test_photo_endpoint_serves_live_and_archived_photos(db, tmp_path):
+    vivo = reporte(db, 1, foto_base64=data_url(FOTO, "image/jpeg"))
+    ref = DirectorioFotos(str(tmp_path)).guardar("reportes/x", FOTO, "image/png")
+    archivado = reporte(db, 300, estado="resuelto", coleccion=archivo.ARCHIVO,
+                        foto_ref=ref, foto_tipo="image/png")
+    oculto = reporte(db, 1, estado="rechazado", foto_base64=data_url(FOTO, "image/jpeg"))
+
+    respuesta = server.get_foto_reporte(str(vivo))
+    assert respuesta.body == FOTO and respuesta.media_type == "image/jpeg"
+    respuesta = server.get_foto_reporte(str(archivado))
+    assert respuesta.body == FOTO and respuesta.media_type == "image/png"
+    for reporte_id in (str(oculto), str(reporte(db, 1)), "nope"):
+        with pytest.raises(server.HTTPException) as error:
+            server.get_foto_reporte(reporte_id)
+        assert error.value.status_code == 404
@@ -0,0 +1,45 @@
+import threading
+import time
+from dataclasses import replace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from config import Settings
+
+
+@pytest.fixture
+def app(test_database):
+    anterior = server.settings
+    # No background workers, and the lifespan waits a second at most for warm-up
+    ajustes = Settings(outbox_workers=0, archivo_intervalo_s=0, rate_limits_enabled=False,
+                       mongo=replace(anterior.mongo, server_selection_timeout_ms=0))
+    try:
+        yield server.create_app(ajustes)
+    finally:
+        server.settings = anterior
+        server.rate_limiter.enabled = anterior.rate_limits_enabled
+
+
+def test_ready_only_once_warm_up_has_finished(app, monkeypatch):
+    seguir = threading.Event()
+    calentado = server.warm_up
+
+    def warm_up_lento():
+        assert seguir.wait(10)
+        calentado()
+
+    monkeypatch.setattr(server, "warm_up", warm_up_lento)
+    with TestClient(app) as cliente:
+        respuesta = cliente.get("/api/health/ready")
+        assert (respuesta.status_code, respuesta.json()["estado"]) == (503, "calentando")
+        assert cliente.get("/api/health/live").status_code == 200
+
+        seguir.set()
+        limite = time.monotonic() + 10
+        while not app.state.ready and time.monotonic() < limite:
+            time.sleep(0.01)
+        respuesta = cliente.get("/api/health/ready")
+        assert (respuesta.status_code, respuesta.json()["estado"]) == (200, "listo")
+    assert app.state.ready is False
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+import logros
+import server
+from eventos import INCENTIVO_CANJEADO, REPORTE_CREADO, Evento
+
+
+@pytest.fixture
+def db(test_database):
+    _, db = test_database
+    db.notificaciones.delete_many({})
+    return db
+
+
+def nuevo_usuario(db, **campos):
+    return str(db.usuarios.insert_one({"nombre": "Ana", "puntos": 0, "logros": [], **campos}).inserted_id)
+
+
+def reporte(usuario_id, fecha, zona="Norte"):
+    return Evento(REPORTE_CREADO, usuario_id, fecha, {"zona": zona})
+
+
+def test_streak_counts_local_days_and_resets_on_a_gap(db):
+    usuario_id = nuevo_usuario(db)
+    # 02:00 UTC on the 2nd is still the 1st in Lima
+    inicio = datetime(2024, 3, 2, 2)
+    for dia in range(6):
+        logros.procesar(db, reporte(usuario_id, inicio + timedelta(days=dia)))
+        logros.procesar(db, reporte(usuario_id, inicio + timedelta(days=dia, hours=1)))
+    progreso = db.usuarios.find_one({"_id": ObjectId(usuario_id)})["logros_progreso"]
+    assert (progreso["racha"], progreso["ultimo_dia"], progreso["reportes"]) == (6, "2024-03-06", 12)
+
+    nuevos = logros.procesar(db, reporte(usuario_id, inicio + timedelta(days=6)))
+    assert [l.id for l in nuevos] == ["racha_7_dias"]
+
+    logros.procesar(db, reporte(usuario_id, inicio + timedelta(days=9)))
+    progreso = db.usuarios.find_one({"_id": ObjectId(usuario_id)})["logros_progreso"]
+    assert progreso["racha"] == 1
+
+
+def test_each_unlock_is_awarded_and_notified_once(db):
+    usuario_id = nuevo_usuario(db)
+    fecha = datetime(2024, 5, 6, 12)
+    desbloqueados = []
+    for zona in ("Norte", "Norte", "Centro", "Sur", "Sur"):
+        desbloqueados += [l.id for l in logros.procesar(db, reporte(usuario_id, fecha, zona))]
+    desbloqueados += [l.id for l in logros.procesar(db, Evento(INCENTIVO_CANJEADO, usuario_id, fecha))]
+    assert desbloqueados == ["primer_reporte", "tres_zonas", "primer_canje"]
+
+    usuario = db.usuarios.find_one({"_id": ObjectId(usuario_id)})
+    assert sorted(usuario["logros"]) == sorted(desbloqueados)
+    avisos = list(db.notificaciones.find({"usuario_id": usuario_id}))
+    assert sorted(n["logro"] for n in avisos) == sorted(desbloqueados)
+
+
+def test_redelivered_report_counts_once(db):
+    usuario_id = nuevo_usuario(db)
+    fecha = datetime(2024, 5, 6, 12)
+    for reporte_id in ("r1", "r1", "r2", "r1"):
+        logros.procesar(db, Evento(REPORTE_CREADO, usuario_id, fecha, {"zona": "Sur", "reporte_id": reporte_id}))
+    progreso = db.usuarios.find_one({"_id": ObjectId(usuario_id)})["logros_progreso"]
+    assert (progreso["reportes"], progreso["contados"]) == (2, ["r1", "r2"])
+
+    # Only the last reports are remembered
+    for i in range(logros.RECORDADOS + 5):
+        logros.procesar(db, Evento(REPORTE_CREADO, usuario_id, fecha, {"reporte_id": f"n{i}"}))
+    progreso = db.usuarios.find_one({"_id": ObjectId(usuario_id)})["logros_progreso"]
+    assert len(progreso["contados"]) == logros.RECORDADOS
+    assert progreso["contados"][-1] == f"n{logros.RECORDADOS + 4}"
+
+
+def test_existing_report_count_seeds_progress(db):
+    usuario_id = nuevo_usuario(db, reportes_enviados=9)
+    nuevos = logros.procesar(db, reporte(usuario_id, datetime(2024, 5, 6, 12)))
+    assert {l.id for l in nuevos} == {"primer_reporte"}
+    nuevos = logros.procesar(db, reporte(usuario_id, datetime(2024, 5, 6, 13)))
+    assert [l.id for l in nuevos] == ["diez_reportes"]
+
+
+def test_notifications_endpoints(db):
+    server.rate_limiter.enabled = False
+    try:
+        usuario_id = nuevo_usuario(db)
+        respuesta = server.create_reporte(server.ReporteCreate(
+            descripcion="Basura", foto_base64="", latitud=-11.94, longitud=-77.13,
+        ), usuario_id=usuario_id)
+        server.moderar_reporte(respuesta["reporte_id"], server.Decision(decision="aprobar"), moderador="m1")
+        server.outbox_worker.drenar()
+    finally:
+        server.rate_limiter.enabled = True
+    notificaciones = server.get_notificaciones(usuario_id)["notificaciones"]
+    assert [n["tipo"] for n in notificaciones] == ["logro"]
+    server.delete_notificacion(notificaciones[0]["id"])
+    assert server.get_notificaciones(usuario_id)["notificaciones"] == []
+    with pytest.raises(server.HTTPException):
+        server.delete_notificacion(notificaciones[0]["id"])
@@ -0,0 +1,65 @@
+import re
+
+from fastapi.testclient import TestClient
+
+import server
+from metrics import MetricsRegistry
+
+MUESTRA = re.compile(r'^(?P<nombre>[a-z_]+)(?:\{(?P<etiquetas>.*)\})? (?P<valor>\S+)$')
+
+
+def parsear(texto):
+    """Exposition text to {(name, frozenset of labels): value}."""
+    muestras = {}
+    for linea in texto.splitlines():
+        if linea.startswith("#") or not linea:
+            continue
+        m = MUESTRA.match(linea)
+        assert m, linea
+        etiquetas = frozenset(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', m["etiquetas"] or ""))
+        muestras[(m["nombre"], etiquetas)] = float(m["valor"])
+    return muestras
+
+
+def test_rendering():
+    registro = MetricsRegistry()
+    contador = registro.counter("eventos_total", "Eventos.", ("tipo",))
+    contador.inc(('con "comillas"\n',), 2)
+    histograma = registro.histogram("duracion_seconds", "Duración.", ("ruta",), buckets=(0.1, 1.0))
+    for valor in (0.05, 0.5, 5):
+        histograma.observe(("/x",), valor)
+    texto = registro.render()
+    assert "# TYPE eventos_total counter\n" in texto
+    assert 'eventos_total{tipo="con \\"comillas\\"\\n"} 2\n' in texto
+    muestras = parsear(texto)
+    ruta = ("ruta", "/x")
+    assert [muestras[("duracion_seconds_bucket", frozenset({ruta, ("le", le)}))]
+            for le in ("0.1", "1", "+Inf")] == [1, 2, 3]
+    assert muestras[("duracion_seconds_count", frozenset({ruta}))] == 3
+    assert muestras[("duracion_seconds_sum", frozenset({ruta}))] == 5.55
+
+
+def test_requests_are_recorded_per_route_template():
+    cliente = TestClient(server.app)
+
+    def leer():
+        respuesta = cliente.get("/metrics")
+        assert respuesta.headers["content-type"].startswith("text/plain; version=0.0.4")
+        return parsear(respuesta.text)
+
+    antes = leer()
+    for _ in range(2):
+        assert cliente.get("/api/terminos").status_code == 200
+    for usuario in ("a", "b"):
+        assert cliente.get(f"/api/usuarios/{usuario}/foto").status_code == 404
+    despues = leer()
+
+    def delta(nombre, **etiquetas):
+        clave = (nombre, frozenset(etiquetas.items()))
+        return despues.get(clave, 0) - antes.get(clave, 0)
+
+    assert delta("http_requests_total", method="GET", route="/api/terminos", status="200") == 2
+    assert delta("http_request_duration_seconds_count", method="GET", route="/api/terminos") == 2
+    assert delta("http_response_size_bytes_count", method="GET", route="/api/terminos") == 2
+    # One series for the route, not one per user
+    assert delta("http_requests_total", method="GET", route="/api/usuarios/{user_id}/foto", status="404") == 2
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+import orjson
+import pytest
+from bson import ObjectId
+
+import server
+
+
+@pytest.fixture
+def pendientes(test_database):
+    _, db = test_database
+    db.reportes.delete_many({})
+    server.feed_cache.invalidate()
+    server.rate_limiter.enabled = False
+    usuario_id = str(db.usuarios.insert_one({"nombre": "Ana", "puntos": 0}).inserted_id)
+    ids = [server.create_reporte(server.ReporteCreate(
+        descripcion=f"Basura {i}", foto_base64="", latitud=-11.94, longitud=-77.13,
+    ), usuario_id=usuario_id)["reporte_id"] for i in range(5)]
+    yield db, ids
+    server.rate_limiter.enabled = True
+
+
+def reclamar(moderador, limite):
+    respuesta = orjson.loads(server.reclamar_reportes(moderador=moderador, limite=limite).body)
+    return [r["_id"] for r in respuesta["reportes"]]
+
+
+def feed():
+    return orjson.loads(server.get_reportes_publicos(limite=50).body)["reportes"]
+
+
+def test_moderators_claim_disjoint_batches_oldest_first(pendientes):
+    db, ids = pendientes
+    assert feed() == []
+    assert reclamar("m1", 2) == ids[:2]
+    assert reclamar("m2", 10) == ids[2:]
+    assert reclamar("m3", 10) == []
+    # An expired lease puts the report back in the queue
+    db.reportes.update_one({"_id": ObjectId(ids[0])},
+                           {"$set": {"revision_hasta": datetime.utcnow() - timedelta(seconds=1)}})
+    assert reclamar("m3", 10) == [ids[0]]
+
+
+def test_decisions_update_visibility(pendientes):
+    db, ids = pendientes
+    reclamar("m1", 2)
+    with pytest.raises(server.HTTPException) as error:
+        server.moderar_reporte(ids[0], server.Decision(decision="aprobar"), moderador="m2")
+    assert error.value.status_code == 409
+
+    server.moderar_reporte(ids[0], server.Decision(decision="aprobar"), moderador="m1")
+    server.moderar_reporte(ids[1], server.Decision(decision="rechazar", motivo="Foto borrosa"),
+                           moderador="m1")
+    assert [r["_id"] for r in feed()] == [ids[0]]
+    rechazado = db.reportes.find_one({"_id": ObjectId(ids[1])})
+    assert (rechazado["estado"], rechazado["publico"]) == ("rechazado", False)
+    assert "revisor" not in rechazado
+    aviso = db.notificaciones.find_one({"tipo": "moderacion", "usuario_id": rechazado["usuario_id"]})
+    assert aviso["mensaje"].endswith("Foto borrosa")
+    with pytest.raises(server.HTTPException) as error:
+        server.moderar_reporte(ids[1], server.Decision(decision="aprobar"), moderador="m1")
+    assert error.value.detail == "El reporte ya fue moderado"
+
+
+def test_only_moderators_pass(pendientes):
+    db, _ = pendientes
+    vecino = str(db.usuarios.insert_one({"nombre": "Beto"}).inserted_id)
+    moderador = str(db.usuarios.insert_one({"nombre": "Carla", "rol": "moderador"}).inserted_id)
+    with pytest.raises(server.HTTPException) as error:
+        server.moderador_actual(None)
+    assert error.value.status_code == 401
+    with pytest.raises(server.HTTPException) as error:
+        server.moderador_actual("Bearer " + server.create_access_token(vecino))
+    assert error.value.status_code == 403
+    assert server.moderador_actual("Bearer " + server.create_access_token(moderador)) == moderador
@@ -0,0 +1,97 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+import outbox
+import server
+from eventos import REPORTE_CREADO, Evento
+
+
+@pytest.fixture
+def db(test_database):
+    _, db = test_database
+    db.outbox_prueba.delete_many({})
+    db.outbox_muertos.delete_many({})
+    return db
+
+
+def encolar(db, ahora):
+    evento = Evento(REPORTE_CREADO, "u1", ahora, {"zona": "Sur"})
+    return db.outbox_prueba.insert_one({outbox.CAMPO: outbox.pendiente(evento)}).inserted_id
+
+
+def test_approval_is_one_write_and_points_are_paid_once(db):
+    server.rate_limiter.enabled = False
+    try:
+        usuario_id = str(db.usuarios.insert_one({"nombre": "Ana", "puntos": 0}).inserted_id)
+        respuesta = server.create_reporte(server.ReporteCreate(
+            descripcion="Basura", foto_base64="", latitud=-11.94, longitud=-77.13,
+        ), usuario_id=usuario_id)
+    finally:
+        server.rate_limiter.enabled = True
+    reporte_id = ObjectId(respuesta["reporte_id"])
+    server.moderar_reporte(respuesta["reporte_id"], server.Decision(decision="aprobar"), moderador="m1")
+    assert db.reportes.find_one({"_id": reporte_id})[outbox.CAMPO]["hechos"] == []
+    assert db.usuarios.find_one({"_id": ObjectId(usuario_id)})["puntos"] == 0
+
+    server.outbox_worker.drenar()
+    assert outbox.CAMPO not in db.reportes.find_one({"_id": reporte_id})
+    # A replayed entry (worker died before recording it) does not pay twice
+    evento = Evento(REPORTE_CREADO, usuario_id, datetime.utcnow(),
+                    {"reporte_id": str(reporte_id), "zona": "Sur"})
+    server.premiar_reporte(evento)
+    usuario = db.usuarios.find_one({"_id": ObjectId(usuario_id)})
+    assert (usuario["puntos"], usuario["reportes_enviados"]) == (20, 1)
+
+
+def test_failures_back_off_rerun_only_what_failed_and_dead_letter(db):
+    llamadas = {"ok": 0, "falla": 0}
+
+    def ok(evento):
+        llamadas["ok"] += 1
+
+    def falla(evento):
+        llamadas["falla"] += 1
+        raise RuntimeError("sin conexión")
+
+    worker = outbox.OutboxWorker(lambda: db, "outbox_prueba",
+                                 {REPORTE_CREADO: {"ok": ok, "falla": falla}},
+                                 max_intentos=3, backoff_s=10)
+    ahora = datetime(2024, 5, 6, 12)
+    doc_id = encolar(db, ahora)
+
+    assert worker.procesar_uno(ahora) == outbox.REINTENTO
+    entrada = db.outbox_prueba.find_one({"_id": doc_id})[outbox.CAMPO]
+    assert entrada["hechos"] == ["ok"] and entrada["intentos"] == 1
+    assert ahora + timedelta(seconds=5) <= entrada["disponible_en"] <= ahora + timedelta(seconds=10)
+    assert worker.procesar_uno(ahora) is None  # not due yet
+
+    assert worker.procesar_uno(ahora + timedelta(minutes=1)) == outbox.REINTENTO
+    assert worker.procesar_uno(ahora + timedelta(minutes=5)) == outbox.MUERTO
+    assert llamadas == {"ok": 1, "falla": 3}
+    assert outbox.CAMPO not in db.outbox_prueba.find_one({"_id": doc_id})
+    muerto = db.outbox_muertos.find_one({"documento_id": doc_id})
+    assert (muerto["manejador"], muerto["intentos"]) == ("falla", 3)
+
+
+def test_workers_wake_up_on_notice(db):
+    procesados = []
+    worker = outbox.OutboxWorker(lambda: db, "outbox_prueba",
+                                 {REPORTE_CREADO: {"anotar": procesados.append}}, poll_s=30)
+
+    async def escenario():
+        await worker.start(2)
+        try:
+            encolar(db, datetime.utcnow())
+            worker.avisar()
+            for _ in range(100):
+                if procesados:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await worker.stop()
+
+    asyncio.run(escenario())
+    assert [e.datos["zona"] for e in procesados] == ["Sur"]
@@ -0,0 +1,99 @@
+import orjson
+import pytest
+from bson import ObjectId
+from fastapi.testclient import TestClient
+
+import server
+from fotos import data_url
+from query_monitor import track_queries
+
+AVATAR = b"\x89PNG" + bytes(range(256)) * 40
+FOTO = data_url(AVATAR, "image/png")
+
+
+@pytest.fixture
+def usuario(test_database):
+    _, db = test_database
+    server.perfiles_cache.invalidate()
+    usuario_id = str(db.usuarios.insert_one({
+        "nombre": "Ana", "email": "ana@example.com", "puntos": 500, "foto_perfil": FOTO,
+    }).inserted_id)
+    yield db, usuario_id
+    server.perfiles_cache.invalidate()
+
+
+def perfil(usuario_id, **kwargs):
+    with track_queries() as stats:
+        respuesta = server.get_user(usuario_id, **kwargs)
+    return respuesta, stats.count
+
+
+def test_profiles_are_cached_without_the_avatar(usuario):
+    _, usuario_id = usuario
+    respuesta, consultas = perfil(usuario_id)
+    assert consultas == 1
+    datos = orjson.loads(respuesta.body)
+    assert datos["foto_perfil"].startswith(f"/api/usuarios/{usuario_id}/foto?v=")
+    assert len(respuesta.body) < len(FOTO)
+    assert respuesta.headers["cache-control"] == "private, no-cache"
+
+    otra, consultas = perfil(usuario_id, if_none_match=respuesta.headers["etag"])
+    assert (otra.status_code, consultas) == (304, 0)
+
+    version = datos["foto_perfil"].split("?v=")[1]
+    foto = server.get_foto_perfil(usuario_id, v=version)
+    assert foto.body == AVATAR and foto.media_type == "image/png"
+    assert "immutable" in foto.headers["cache-control"]
+    # A version that is not the stored photo's is not cached for good
+    for otra_version in (None, "0" * 16):
+        foto = server.get_foto_perfil(usuario_id, v=otra_version)
+        assert foto.body == AVATAR and foto.headers["cache-control"] == "no-cache"
+
+
+def test_writes_update_or_invalidate_the_cached_profile(usuario):
+    _, usuario_id = usuario
+    antes, _ = perfil(usuario_id)
+
+    actualizado = server.update_user(
+        usuario_id, server.UserUpdate(nombre="Ana María", foto_perfil=data_url(b"otra", "image/png")))
+    respuesta, consultas = perfil(usuario_id)
+    datos = orjson.loads(respuesta.body)
+    assert consultas == 0  # written through
+    assert actualizado["foto_perfil"] == datos["foto_perfil"]
+    assert datos["nombre"] == "Ana María"
+    assert datos["foto_perfil"] != orjson.loads(antes.body)["foto_perfil"]
+
+    incentivo = server.INCENTIVOS[0]
+    server.canjear_incentivo(server.CanjearIncentivo(incentivo_id=incentivo["id"]), usuario_id=usuario_id)
+    respuesta, consultas = perfil(usuario_id)
+    assert consultas == 1
+    assert orjson.loads(respuesta.body)["puntos"] == 500 - incentivo["puntos_requeridos"]
+
+
+def test_redemptions_spend_the_token_holders_points(usuario):
+    db, usuario_id = usuario
+    cliente = TestClient(server.app)
+    incentivo = server.INCENTIVOS[0]
+    # The body names no user: an anonymous request cannot spend anyone's points
+    anonimo = cliente.post("/api/canjear", json={"incentivo_id": incentivo["id"], "usuario_id": usuario_id})
+    assert anonimo.status_code == 401
+    assert db.usuarios.find_one({"_id": ObjectId(usuario_id)})["puntos"] == 500
+
+    respuesta = cliente.post("/api/canjear", json={"incentivo_id": incentivo["id"]},
+                             headers={"Authorization": "Bearer " + server.create_access_token(usuario_id)})
+    assert respuesta.status_code == 200
+    assert respuesta.json()["puntos_restantes"] == 500 - incentivo["puntos_requeridos"]
+
+
+def test_renames_are_not_undone_by_a_lagging_secondary(usuario, monkeypatch):
+    db, usuario_id = usuario
+    server.nombres_cache.invalidate()
+    assert server.usuario_nombres({usuario_id}) == {usuario_id: "Ana"}
+    # A secondary that has not seen the rename yet
+    secundario = pytest.importorskip("mongomock").MongoClient()["secundario"]
+    secundario.usuarios.insert_one(db.usuarios.find_one({"_id": ObjectId(usuario_id)}))
+    monkeypatch.setattr(server, "get_read_db", lambda: secundario)
+
+    server.update_user(usuario_id, server.UserUpdate(nombre="Ana María"))
+    server.nombres_cache.l1.clear()
+    assert server.usuario_nombres({usuario_id}) == {usuario_id: "Ana María"}
@@ -0,0 +1,171 @@
+"""
+Performance regression gate for the hot handlers.
+
+Each handler runs against a seeded database and must stay within its Mongo
+query budget on every call; its median time is compared to the stored
+baseline in perf_baseline.json (per database backend) with a tolerance.
+A handler with no baseline for the backend only has its query budget
+checked; the file is never rewritten unless asked to.
+
+  PERF_UPDATE_BASELINE=1  rewrite the baseline with this run's timings
+  PERF_TOLERANCE=1.5      allowed slowdown factor against the baseline
+  PERF_SLACK_MS=2         absolute slack added to every limit
+  MONGO_TEST_URL=...      run against a real mongod instead of mongomock
+"""
+
+import json
+import os
+import random
+import statistics
+import time
+import warnings
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from bson import ObjectId
+
+import database
+import server
+from query_monitor import track_queries
+
+BASELINE_PATH = Path(__file__).with_name("perf_baseline.json")
+TOLERANCE = float(os.getenv("PERF_TOLERANCE", "1.5"))
+SLACK_MS = float(os.getenv("PERF_SLACK_MS", "2"))
+UPDATE_BASELINE = os.getenv("PERF_UPDATE_BASELINE") == "1"
+REPETITIONS = 5
+
+SEED_USERS = 200
+SEED_REPORTS = 1000
+SEED_PASSWORD = "RendimientoVentanilla2024"
+
+
+@pytest.fixture(scope="module")
+def seeded(test_database):
+    backend, db = test_database
+    rng = random.Random(2024)
+    db.usuarios.delete_many({})
+    db.reportes.delete_many({})
+    server.ensure_indexes()
+
+    now = datetime.utcnow()
+    password = server.hash_password(SEED_PASSWORD)
+    usuarios = [{
+        "_id": ObjectId(),
+        "nombre": f"Vecino {i}",
+        "email": f"vecino{i}@rendimiento.ventanilla.pe",
+        "password": password,
+        "puntos": 0,
+        "reportes_enviados": 0,
+        "fecha_registro": now,
+        "logros": [],
+    } for i in range(SEED_USERS)]
+    db.usuarios.insert_many(usuarios)
+
+    foto = "data:image/jpeg;base64," + "A" * 2048
+    db.reportes.insert_many([{
+        "descripcion": "Basura acumulada en la vía pública",
+        "foto_base64": foto,
+        "latitud": rng.uniform(-11.95, -11.84),
+        "longitud": rng.uniform(-77.16, -77.10),
+        "direccion": f"Calle {i}, Ventanilla",
+        "usuario_id": str(rng.choice(usuarios)["_id"]),
+        "fecha": now - timedelta(minutes=i),
+        "estado": "activo",
+        "publico": True,
+    } for i in range(SEED_REPORTS)])
+    # Repetitions would otherwise spend the per-account and per-user buckets
+    server.rate_limiter.enabled = False
+    yield backend, usuarios
+    server.rate_limiter.enabled = True
+
+
+@pytest.fixture(scope="session")
+def baseline():
+    data = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    original = json.dumps(data, sort_keys=True)
+    yield data
+    # The file is tracked: only an explicit update may rewrite it
+    if UPDATE_BASELINE and json.dumps(data, sort_keys=True) != original:
+        BASELINE_PATH.write_text(json.dumps(data, indent=2, sort_keys=True) + "\n")
+
+
+def run_handler(fn, max_queries):
+    timings = []
+    for _ in range(REPETITIONS):
+        with track_queries() as stats:
+            start = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - start) * 1000)
+        assert stats.count <= max_queries, (
+            f"{stats.count} Mongo queries, budget is {max_queries} (N+1 or extra lookup?)"
+        )
+    return statistics.median(timings)
+
+
+def check_baseline(baseline, backend, name, median_ms):
+    key = f"{backend}:{name}"
+    reference = baseline.get(key)
+    if UPDATE_BASELINE:
+        baseline[key] = round(median_ms, 3)
+        return
+    if reference is None:
+        # Only the query budget is checked; PERF_UPDATE_BASELINE=1 records one
+        warnings.warn(f"no perf baseline for {key} ({median_ms:.2f} ms); timing not checked")
+        return
+    limit = reference * TOLERANCE + SLACK_MS
+    assert median_ms <= limit, (
+        f"{name} took {median_ms:.2f} ms, baseline {reference:.2f} ms (limit {limit:.2f} ms)"
+    )
+
+
+def test_reportes_publicos(seeded, baseline):
+    backend, _ = seeded
+    def first_page_uncached():
+        server.feed_cache.invalidate()
+        server.get_reportes_publicos()
+
+    median = run_handler(first_page_uncached, max_queries=2)
+    check_baseline(baseline, backend, "get_reportes_publicos", median)
+
+
+def test_mapa_reportes(seeded, baseline):
+    backend, _ = seeded
+    def uncached():
+        server.mapa_cache.invalidate()
+        server.get_mapa_reportes()
+
+    median = run_handler(uncached, max_queries=2)
+    check_baseline(baseline, backend, "get_mapa_reportes", median)
+
+
+def test_create_reporte(seeded, baseline):
+    backend, usuarios = seeded
+    reporte = server.ReporteCreate(
+        descripcion="Desmonte en la esquina",
+        foto_base64="data:image/jpeg;base64," + "B" * 2048,
+        latitud=-11.8746,
+        longitud=-77.1539,
+        direccion="Av. Néstor Gambetta, Ventanilla",
+    )
+    # A single insert: the report waits for moderation, and the outbox entry
+    # with its side effects is only added on approval
+    median = run_handler(lambda: server.create_reporte(reporte, usuario_id=str(usuarios[0]["_id"])), max_queries=1)
+    check_baseline(baseline, backend, "create_reporte", median)
+
+
+def test_login_user(seeded, baseline):
+    backend, usuarios = seeded
+    login = server.UserLogin(email=usuarios[7]["email"], password=SEED_PASSWORD)
+    median = run_handler(lambda: server.login_user(login, ip="10.0.0.1"), max_queries=1)
+    check_baseline(baseline, backend, "login_user", median)
+
+
+def test_feed_query_uses_index(seeded):
+    backend, _ = seeded
+    if backend != "mongodb":
+        pytest.skip("query plans need a real mongod (MONGO_TEST_URL)")
+    plan = database.get_read_db().reportes.find(
+        {"publico": True, "estado": "activo"}
+    ).sort("fecha", -1).explain()
+    assert "COLLSCAN" not in json.dumps(plan["queryPlanner"]["winningPlan"])
@@ -0,0 +1,93 @@
+from datetime import datetime
+
+import orjson
+import pytest
+from bson import ObjectId
+
+import puntajes
+import server
+
+
+def test_windows_roll_over_at_peru_midnight():
+    # 2024-01-01 03:00 UTC is still Sunday 2023-12-31 in Lima
+    assert puntajes.ventana("semana", datetime(2024, 1, 1, 3))[0] == "semana:2023-W52"
+    assert puntajes.ventana("mes", datetime(2024, 1, 1, 3))[0] == "mes:2023-12"
+    assert puntajes.ventana("semana", datetime(2024, 1, 1, 6))[0] == "semana:2024-W01"
+    assert puntajes.ventana("total", datetime(2024, 1, 1, 6)) == ("total", None)
+
+
+def test_award_touches_zone_and_district_buckets():
+    operaciones = puntajes.incrementos("u1", "Sur", 20, datetime(2024, 5, 6, 12))
+    filtros = {(op._filter["ventana"], op._filter["zona"]) for op in operaciones}
+    assert filtros == {
+        ("semana:2024-W19", "todas"), ("semana:2024-W19", "Sur"),
+        ("mes:2024-05", "todas"), ("mes:2024-05", "Sur"),
+        ("total", "todas"), ("total", "Sur"),
+    }
+
+
+@pytest.fixture
+def usuarios(test_database):
+    _, db = test_database
+    # Reports left by other tests would otherwise land in this week's buckets
+    server.outbox_worker.drenar()
+    db.puntajes.delete_many({})
+    server.ranking_cache.invalidate()
+    server.rate_limiter.enabled = False
+    ids = [str(db.usuarios.insert_one({"nombre": n, "puntos": 0}).inserted_id)
+           for n in ("Ana", "Beto")]
+    yield ids
+    server.rate_limiter.enabled = True
+
+
+def reportar(usuario_id, latitud):
+    respuesta = server.create_reporte(server.ReporteCreate(
+        descripcion="Basura", foto_base64="", latitud=latitud, longitud=-77.13,
+    ), usuario_id=usuario_id)
+    server.moderar_reporte(respuesta["reporte_id"], server.Decision(decision="aprobar"), moderador="m1")
+    server.outbox_worker.drenar()
+
+
+def test_zone_leaderboard_from_buckets(usuarios):
+    ana, beto = usuarios
+    reportar(ana, -11.94)   # Sur
+    reportar(beto, -11.94)
+    reportar(beto, -11.82)  # Norte
+    sur = orjson.loads(server.get_ranking(periodo="semana", zona="Sur").body)["ranking"]
+    assert [(r["nombre"], r["puntos"]) for r in sur] == [("Ana", 20), ("Beto", 20)]
+    semana = orjson.loads(server.get_ranking(periodo="semana").body)["ranking"]
+    assert semana[0] == {"posicion": 1, "nombre": "Beto", "puntos": 40}
+    with pytest.raises(server.HTTPException):
+        server.get_ranking(zona="Atlantida")
+
+
+def test_redemptions_do_not_lower_the_leaderboard(usuarios, test_database):
+    _, db = test_database
+    ana, beto = usuarios
+    for _ in range(3):
+        reportar(ana, -11.94)
+    reportar(beto, -11.94)
+    incentivo = min(server.INCENTIVOS, key=lambda i: i["puntos_requeridos"])
+    db.usuarios.update_one({"_id": ObjectId(ana)}, {"$inc": {"puntos": incentivo["puntos_requeridos"]}})
+    server.canjear_incentivo(server.CanjearIncentivo(incentivo_id=incentivo["id"]), usuario_id=ana)
+    server.ranking_cache.invalidate()
+    total = orjson.loads(server.get_ranking().body)["ranking"]
+    assert [(r["nombre"], r["puntos"]) for r in total] == [("Ana", 60), ("Beto", 20)]
+
+    db.puntajes.delete_many({"ventana": "total", "zona": "todas"})
+    # Seeding counts balance plus redemptions, the top-up above included
+    puntajes.sembrar_total(db)
+    sembrados = {f["usuario_id"]: f["puntos"] for f in db.puntajes.find({"ventana": "total", "zona": "todas"})}
+    assert (sembrados[ana], sembrados[beto]) == (60 + incentivo["puntos_requeridos"], 20)
+
+
+def test_retried_award_counts_once(usuarios, test_database):
+    _, db = test_database
+    server.ensure_indexes()
+    ana, _ = usuarios
+    evento = server.eventos.Evento(server.eventos.REPORTE_CREADO, ana, datetime.utcnow(),
+                                   {"reporte_id": "r1", "zona": "Sur"})
+    for _ in range(2):
+        server.sumar_puntajes(evento)
+    puntos = {(f["ventana"], f["zona"]): f["puntos"] for f in db.puntajes.find({"usuario_id": ana})}
+    assert len(puntos) == 6 and set(puntos.values()) == {server.PUNTOS_REPORTE}
@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from config import Settings
+from query_monitor import QueryMonitor, track_queries
+
+
+def evento(nombre, request_id, **campos):
+    return SimpleNamespace(command_name=nombre, connection_id=("localhost", 27017),
+                           request_id=request_id, database_name="prueba",
+                           command={nombre: "usuarios"}, duration_micros=1500, **campos)
+
+
+def test_listener_counts_application_commands_only():
+    monitor = QueryMonitor(slow_ms=1000)
+    with track_queries() as stats:
+        for i, nombre in enumerate(("find", "ping", "update", "hello")):
+            monitor.started(evento(nombre, i))
+            monitor.succeeded(evento(nombre, i))
+        monitor.started(evento("insert", 9))
+        monitor.failed(evento("insert", 9))
+    assert stats.count == 3
+    assert stats.time_ms == pytest.approx(4.5)
+
+
+@pytest.fixture
+def usuario_id(test_database):
+    _, db = test_database
+    return str(db.usuarios.insert_one({"nombre": "Ana", "email": "ana.q@example.com"}).inserted_id)
+
+
+@pytest.fixture
+def cliente(usuario_id):
+    anterior = server.settings
+    try:
+        yield lambda dev: TestClient(server.create_app(Settings(
+            dev_mode=dev, admission_max_concurrency=0, rate_limits_enabled=False,
+        )))
+    finally:
+        server.settings = anterior
+        server.rate_limiter.enabled = anterior.rate_limits_enabled
+
+
+def test_dev_mode_reports_the_queries_of_each_request(cliente, usuario_id):
+    server.perfiles_cache.invalidate()
+    dev = cliente(True)
+    respuesta = dev.get(f"/api/usuarios/{usuario_id}")
+    assert respuesta.headers["x-mongo-queries"] == "1"
+    assert float(respuesta.headers["x-mongo-time-ms"]) >= 0
+    # Served from the profile cache
+    assert dev.get(f"/api/usuarios/{usuario_id}").headers["x-mongo-queries"] == "0"
+
+    assert "x-mongo-queries" not in cliente(False).get(f"/api/usuarios/{usuario_id}").headers
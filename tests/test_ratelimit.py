@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from ratelimit import LocalBuckets, RateLimited, RateLimiter, RateLimitMiddleware, Rule
+
+LOGIN = Rule("login", capacity=3, period_s=60)
+
+
+def test_burst_then_refused_with_retry_after():
+    limiter = RateLimiter(LocalBuckets())
+    for _ in range(3):
+        limiter.check(LOGIN, "10.0.0.1")
+    with pytest.raises(RateLimited) as exc:
+        limiter.check(LOGIN, "10.0.0.1")
+    assert 0 < exc.value.retry_after_s <= LOGIN.interval
+    # Other keys have their own bucket
+    limiter.check(LOGIN, "10.0.0.2")
+
+
+def test_refill_over_time(monkeypatch):
+    reloj = [1000.0]
+    monkeypatch.setattr("ratelimit.time.monotonic", lambda: reloj[0])
+    buckets = LocalBuckets()
+    for _ in range(3):
+        assert buckets.take(LOGIN, "ip") == 0
+    assert buckets.take(LOGIN, "ip") > 0
+    reloj[0] += LOGIN.interval
+    assert buckets.take(LOGIN, "ip") == 0
+
+
+def test_sweep_drops_full_buckets(monkeypatch):
+    reloj = [1000.0]
+    monkeypatch.setattr("ratelimit.time.monotonic", lambda: reloj[0])
+    buckets = LocalBuckets(sweep_interval_s=10)
+    for i in range(50):
+        buckets.take(LOGIN, f"ip{i}")
+    reloj[0] += LOGIN.period_s + 10
+    buckets.take(LOGIN, "nuevo")
+    assert len(buckets) == 1
+
+
+def test_key_cap_bounds_memory():
+    buckets = LocalBuckets(max_keys=100)
+    for i in range(1000):
+        buckets.take(LOGIN, f"ip{i}")
+    assert len(buckets) <= 100
+
+
+def test_failed_logins_lock_one_address_out_of_one_account(test_database, monkeypatch):
+    _, db = test_database
+    monkeypatch.setattr(server, "rate_limiter", RateLimiter(LocalBuckets()))
+    db.usuarios.insert_one({"nombre": "Rosa", "email": "rosa@example.com",
+                            "password": server.hash_password("correcta")})
+    mala = server.UserLogin(email="rosa@example.com", password="mala")
+    buena = server.UserLogin(email="rosa@example.com", password="correcta")
+
+    for _ in range(server.LOGIN_POR_CUENTA.capacity):
+        with pytest.raises(server.HTTPException):
+            server.login_user(mala, ip="10.0.0.66")
+    with pytest.raises(RateLimited):
+        server.login_user(buena, ip="10.0.0.66")
+    # The owner, from another address, is not locked out by someone else's failures
+    assert server.login_user(buena, ip="10.0.0.7")["token"]
+
+    # A successful login refills the bucket: only failures add up
+    for _ in range(server.LOGIN_POR_CUENTA.capacity - 1):
+        with pytest.raises(server.HTTPException):
+            server.login_user(mala, ip="10.0.0.7")
+    server.login_user(buena, ip="10.0.0.7")
+    for _ in range(server.LOGIN_POR_CUENTA.capacity - 1):
+        with pytest.raises(server.HTTPException):
+            server.login_user(mala, ip="10.0.0.7")
+    assert server.login_user(buena, ip="10.0.0.7")["token"]
+
+
+def test_middleware_takes_tokens_off_the_event_loop():
+    en_el_loop = []
+
+    class Remotos(LocalBuckets):
+        # Stands in for Redis: a blocking call must not run on the loop
+        def take(self, rule, key):
+            try:
+                asyncio.get_running_loop()
+                en_el_loop.append(key)
+            except RuntimeError:
+                pass
+            return super().take(rule, key)
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 204, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    limiter = RateLimiter(Remotos())
+    cliente = TestClient(RateLimitMiddleware(app, limiter, {("POST", "/api/login"): LOGIN}))
+    estados = [cliente.post("/api/login").status_code for _ in range(LOGIN.capacity + 1)]
+    assert estados == [204] * LOGIN.capacity + [429]
+    assert en_el_loop == []
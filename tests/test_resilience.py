@@ -0,0 +1,90 @@
+import pytest
+from fastapi.testclient import TestClient
+from pymongo.errors import ServerSelectionTimeoutError
+
+import server
+from resilience import CLOSED, HALF_OPEN, OPEN, BreakerOpen, CircuitBreaker, Snapshots
+
+
+class Caida(Exception):
+    pass
+
+
+def fail(breaker):
+    with pytest.raises(Caida):
+        with breaker.guard():
+            raise Caida()
+
+
+def test_opens_after_consecutive_failures_and_fails_fast():
+    breaker = CircuitBreaker("prueba", failure_types=(Caida,), failure_threshold=3)
+    for _ in range(3):
+        fail(breaker)
+    assert breaker.state == OPEN
+    with pytest.raises(BreakerOpen):
+        with breaker.guard():
+            pytest.fail("dependency called while the breaker is open")
+
+
+def test_other_errors_do_not_count():
+    breaker = CircuitBreaker("prueba", failure_types=(Caida,), failure_threshold=1)
+    with pytest.raises(KeyError):
+        with breaker.guard():
+            raise KeyError("no encontrado")
+    assert breaker.state == CLOSED
+
+
+def test_single_probe_after_reset_timeout():
+    breaker = CircuitBreaker("prueba", failure_types=(Caida,), failure_threshold=1,
+                             reset_timeout_s=0)
+    fail(breaker)
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    # Only one probe at a time
+    with pytest.raises(BreakerOpen):
+        breaker.before_call()
+    breaker.record_success(1.0)
+    assert breaker.state == CLOSED
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker("prueba", failure_types=(Caida,), failure_threshold=5,
+                             reset_timeout_s=0)
+    for _ in range(5):
+        fail(breaker)
+    fail(breaker)
+    assert breaker.state == OPEN
+    assert breaker.opened_total == 2
+
+
+def mongo_caido(limite, cursor):
+    raise ServerSelectionTimeoutError("sin primario")
+
+
+@pytest.fixture
+def feed_caido(test_database, monkeypatch):
+    server.feed_cache.invalidate()
+    monkeypatch.setattr(server, "feed_snapshots", Snapshots(maxsize=32))
+
+    def caer():
+        monkeypatch.setattr(server, "load_feed_page", mongo_caido)
+        server.feed_cache.invalidate()
+    yield caer
+    server.feed_cache.invalidate()
+
+
+def test_reads_fall_back_to_the_last_snapshot(feed_caido):
+    bueno = server.get_reportes_publicos(limite=5)
+    assert "warning" not in bueno.headers
+    feed_caido()
+    respuesta = server.get_reportes_publicos(limite=5)
+    assert respuesta.body == bueno.body
+    assert respuesta.headers["warning"] == '110 - "Response is Stale"'
+    assert int(respuesta.headers["age"]) >= 0
+
+
+def test_reads_without_a_snapshot_answer_503(feed_caido):
+    feed_caido()
+    respuesta = TestClient(server.app).get("/api/reportes-publicos?limite=5")
+    assert respuesta.status_code == 503
+    assert int(respuesta.headers["retry-after"]) >= 1
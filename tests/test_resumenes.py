@@ -0,0 +1,105 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+import archivo
+import resumenes
+import server
+
+
+@pytest.fixture
+def db(test_database):
+    _, db = test_database
+    db.reportes.delete_many({})
+    db[archivo.ARCHIVO].delete_many({})
+    db[resumenes.COLECCION].delete_many({})
+    server.outbox_worker.drenar()
+    return db
+
+
+def test_lima_days():
+    assert resumenes.dia(datetime(2024, 5, 7, 3)) == "2024-05-06"
+    assert resumenes.inicio(date(2024, 5, 7)) == datetime(2024, 5, 7, 5)
+
+
+def filas(db):
+    return sorted(db[resumenes.COLECCION].find({}, {"_id": 0}), key=lambda f: (f["dia"], f["zona"]))
+
+
+def limpias(filas):
+    # Counters moved to zero and back are equivalent to counters never set
+    for fila in filas:
+        fila["estados"] = {k: v for k, v in fila["estados"].items() if v}
+    return filas
+
+
+def test_incremental_rollups_match_a_rebuild(db):
+    server.rate_limiter.enabled = False
+    try:
+        usuario_id = str(db.usuarios.insert_one({"nombre": "Ana", "puntos": 0}).inserted_id)
+        ids = [server.create_reporte(server.ReporteCreate(
+            descripcion=f"Basura {i}", foto_base64="", latitud=-11.94, longitud=-77.13,
+        ), usuario_id=usuario_id)["reporte_id"] for i in range(4)]
+    finally:
+        server.rate_limiter.enabled = True
+    assert filas(db) == []  # pending reports are not counted
+
+    for reporte_id in ids[:3]:
+        server.moderar_reporte(reporte_id, server.Decision(decision="aprobar"), moderador="m1")
+    server.moderar_reporte(ids[3], server.Decision(decision="rechazar"), moderador="m1")
+    server.outbox_worker.drenar()
+    server.update_reporte_estado(ids[0], server.ReporteEstado(estado="resuelto"), usuario_id=usuario_id)
+    db.reportes.update_one({"_id": ObjectId(ids[1])},
+                           {"$set": {"actualizado_en": datetime.utcnow() - timedelta(days=100)}})
+    ahora = datetime.utcnow()
+    assert archivo.expirar(db, ahora - timedelta(days=90), ahora) == 1
+
+    hoy = date.fromisoformat(resumenes.dia(ahora))
+    incrementales = limpias(filas(db))
+    todas = [f for f in incrementales if f["zona"] == "todas"]
+    assert len(todas) == 1 and todas[0]["total"] == 4
+    assert todas[0]["estados"] == {"activo": 1, "resuelto": 1, "expirado": 1, "rechazado": 1}
+    assert todas[0]["resolucion"]["n"] == 1
+
+    assert resumenes.reconstruir(db, hoy - timedelta(days=1), hoy, ("reportes", archivo.ARCHIVO)) == 4
+    reconstruidas = filas(db)
+    for fila in incrementales:
+        fila.pop("reportes", None)
+    assert reconstruidas == incrementales
+
+    respuesta = server.get_dashboard_diario("a1", desde=hoy - timedelta(days=6), hasta=hoy)
+    assert [d["dia"] for d in respuesta["dias"]] == [hoy.isoformat()]
+    assert respuesta["dias"][0]["resolucion_media_h"] is not None
+    zonas = server.get_dashboard_zonas("a1", desde=hoy, hasta=hoy)["zonas"]
+    assert [(z["zona"], z["total"]) for z in zonas] == [("Sur", 4)]
+
+
+def test_rebuild_works_window_by_window(db):
+    base = datetime(2024, 1, 1, 12)
+    db[archivo.ARCHIVO].insert_many([{
+        "fecha": base + timedelta(days=i), "zona": "Sur", "estado": archivo.RESUELTO,
+        "resuelto_en": base + timedelta(days=i, hours=6),
+    } for i in range(40)])
+    db.reportes.insert_one({"fecha": base, "zona": "Sur", "estado": archivo.PENDIENTE})
+    db[resumenes.COLECCION].insert_one({"dia": "2024-01-05", "zona": "Norte", "total": 99, "estados": {}})
+
+    contados = resumenes.reconstruir(db, date(2024, 1, 1), date(2024, 2, 9),
+                                     ("reportes", archivo.ARCHIVO), ventana_dias=7)
+    assert contados == 40
+    assert db[resumenes.COLECCION].count_documents({"zona": "Norte"}) == 0
+    serie = resumenes.serie(db, date(2024, 1, 1), date(2024, 12, 31), "Sur")
+    assert len(serie) == 40
+    assert resumenes.con_promedio(serie[0])["resolucion_media_h"] == 6.0
+    with pytest.raises(server.HTTPException):
+        server.get_dashboard_diario("a1", desde=date(2020, 1, 1), hasta=date(2024, 1, 1))
+
+
+def test_a_retried_approval_counts_once(db):
+    server.ensure_indexes()
+    evento = server.eventos.Evento(server.eventos.REPORTE_CREADO, "u1", datetime(2024, 5, 6, 12),
+                                   {"reporte_id": "r1", "zona": "Sur"})
+    for _ in range(2):
+        server.resumir_reporte(evento)
+    assert [(f["zona"], f["total"]) for f in filas(db)] == [("Sur", 1), ("todas", 1)]
+    assert "reportes" not in resumenes.serie(db, date(2024, 5, 6), date(2024, 5, 6))[0]
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+import orjson
+import pytest
+from bson import ObjectId
+
+import server
+
+
+@pytest.fixture
+def reportes(test_database):
+    _, db = test_database
+    db.reportes.delete_many({})
+    base = datetime.utcnow() - timedelta(hours=1)
+    docs = [{
+        "_id": ObjectId(),
+        "descripcion": f"Reporte {i}",
+        "usuario_id": "",
+        "fecha": base + timedelta(minutes=i),
+        "actualizado_en": base + timedelta(minutes=i),
+        "estado": "activo",
+        "publico": True,
+        "foto_base64": "data:image/jpeg;base64," + "A" * 4096,
+    } for i in range(5)]
+    db.reportes.insert_many(docs)
+    return db, docs
+
+
+def sync(since=None, limite=100):
+    return orjson.loads(server.sync_reportes(since=since, limite=limite).body)
+
+
+def test_first_sync_pages_through_everything(reportes):
+    _, docs = reportes
+    primera = sync(limite=3)
+    assert primera["hay_mas"]
+    segunda = sync(primera["token"], limite=3)
+    assert not segunda["hay_mas"]
+    ids = [r["_id"] for r in primera["reportes"] + segunda["reportes"]]
+    assert ids == [str(d["_id"]) for d in docs]
+    # Photos are fetched separately, never inlined in the page
+    for reporte in primera["reportes"]:
+        assert "foto_base64" not in reporte
+        assert reporte["foto_url"] == f"/api/reportes/{reporte['_id']}/foto"
+    foto = server.get_foto_reporte(primera["reportes"][0]["_id"])
+    assert foto.media_type == "image/jpeg"
+
+
+def test_delta_has_only_changes_and_tombstones(reportes):
+    db, docs = reportes
+    token = sync()["token"]
+    assert sync(token)["reportes"] == []
+
+    ahora = datetime.utcnow()
+    db.reportes.update_one({"_id": docs[1]["_id"]},
+                           {"$set": {"estado": "resuelto", "actualizado_en": ahora}})
+    db.reportes.update_one({"_id": docs[3]["_id"]},
+                           {"$set": {"descripcion": "Editado", "actualizado_en": ahora}})
+    delta = sync(token)
+    assert [r["descripcion"] for r in delta["reportes"]] == ["Editado"]
+    assert delta["eliminados"] == [str(docs[1]["_id"])]
+
+
+def test_invalid_token_is_rejected(reportes):
+    with pytest.raises(server.HTTPException) as exc:
+        server.sync_reportes(since="no-es-un-token", limite=10)
+    assert exc.value.status_code == 400
@@ -0,0 +1,77 @@
+import time
+
+import orjson
+import pytest
+from bson import ObjectId
+
+import server
+import tiles
+
+
+def test_tile_math_round_trips():
+    for z in (0, 12, 20):
+        _, x, y = tiles.tile(-11.87, -77.15, z)
+        min_lon, min_lat, max_lon, max_lat = tiles.limites(z, x, y)
+        assert min_lon <= -77.15 < max_lon and min_lat <= -11.87 < max_lat
+    assert len(tiles.afectados(-11.87, -77.15)) == tiles.MAX_ZOOM + 1
+    assert not tiles.valida(3, 8, 0)
+
+
+def test_disk_drops_a_render_that_raced_an_invalidation(tmp_path):
+    disco = tiles.DiskTiles(str(tmp_path))
+    leido_en = time.time()
+    time.sleep(0.01)
+    disco.invalidate(["14/4580/8652"])
+    disco.put("14/4580/8652", b"viejo", leido_en)
+    assert disco.get("14/4580/8652") is None
+    disco.put("14/4580/8652", b"nuevo", time.time())
+    assert disco.get("14/4580/8652") == b"nuevo"
+    time.sleep(0.01)
+    disco.clear()
+    assert disco.get("14/4580/8652") is None
+
+
+@pytest.fixture
+def mapa(test_database, tmp_path):
+    _, db = test_database
+    db.reportes.delete_many({})
+    server.tiles_cache.invalidate()
+    server.tiles_disk = tiles.DiskTiles(str(tmp_path))
+    yield db
+    server.tiles_disk = None
+
+
+def features(z, x, y):
+    return orjson.loads(server.get_tile(z, x, y).body)["features"]
+
+
+def test_approval_invalidates_only_its_tiles(mapa):
+    server.rate_limiter.enabled = False
+    try:
+        usuario_id = str(mapa.usuarios.insert_one({"nombre": "Ana"}).inserted_id)
+        reporte_id = server.create_reporte(server.ReporteCreate(
+            descripcion="Llantas", foto_base64="", latitud=-11.94, longitud=-77.13,
+        ), usuario_id=usuario_id)["reporte_id"]
+    finally:
+        server.rate_limiter.enabled = True
+    propio = tiles.tile(-11.94, -77.13, 15)
+    vecino = (15, propio[1] + 1, propio[2])
+    assert features(*propio) == [] and features(*vecino) == []
+
+    server.moderar_reporte(reporte_id, server.Decision(decision="aprobar"), moderador="m1")
+    assert [f["id"] for f in features(*propio)] == [reporte_id]
+    assert server.tiles_disk.get(tiles.clave(vecino)) is not None  # untouched
+
+    server.update_reporte_estado(reporte_id, server.ReporteEstado(estado="resuelto"), usuario_id=usuario_id)
+    assert features(*propio) == []
+    assert mapa.reportes.find_one({"_id": ObjectId(reporte_id)})["estado"] == "resuelto"
+
+
+def test_tiles_revalidate_with_etags(mapa):
+    respuesta = server.get_tile(0, 0, 0)
+    etag = respuesta.headers["etag"]
+    assert respuesta.headers["cache-control"] == "public, no-cache"
+    assert server.get_tile(0, 0, 0, if_none_match=f'W/{etag}').status_code == 304
+    assert server.get_tile(0, 0, 0, if_none_match='"otro"').status_code == 200
+    # Outside Ventanilla: no query, always the same empty tile
+    assert server.get_tile(3, 0, 0).body == tiles.VACIA
@@ -0,0 +1,53 @@
+import random
+from dataclasses import replace
+
+import pytest
+from bson import ObjectId
+
+import server
+from zonas import indice
+
+
+def test_grid_matches_plain_ray_casting():
+    zonas = indice()
+    rng = random.Random(7)
+    for _ in range(20_000):
+        lat = rng.uniform(zonas.min_lat - 0.01, zonas.max_lat + 0.01)
+        lon = rng.uniform(zonas.min_lon - 0.01, zonas.max_lon + 0.01)
+        esperado = next((p.sector for p in zonas.poligonos if p.contiene(lon, lat)), None)
+        assert zonas.localizar(lat, lon) == esperado
+
+
+def test_most_cells_need_no_geometry():
+    zonas = indice()
+    llenas = sum(1 for celda in zonas._grilla if not isinstance(celda, tuple))
+    vacias = sum(1 for celda in zonas._grilla if celda == ())
+    assert llenas + vacias > 0.8 * len(zonas._grilla)
+
+
+def test_out_of_district():
+    assert indice().localizar(-12.0464, -77.0428) is None  # Plaza de Armas de Lima
+
+
+def test_zona_endpoint_returns_schedule():
+    respuesta = server.get_zona(-11.8746, -77.1539)
+    assert respuesta["zona"] == "Centro"
+    assert respuesta["horario"]["hora"] == "07:00"
+    with pytest.raises(server.HTTPException) as exc:
+        server.get_zona(-12.0464, -77.0428)
+    assert exc.value.status_code == 404
+
+
+def test_reports_outside_the_polygons_are_kept_without_zone(test_database, monkeypatch):
+    _, db = test_database
+    monkeypatch.setattr(server.rate_limiter, "enabled", False)
+    fuera = server.ReporteCreate(descripcion="Basura", foto_base64="", latitud=-11.80, longitud=-77.20)
+    usuario_id = str(db.usuarios.insert_one({"nombre": "Ana"}).inserted_id)
+    reporte_id = server.create_reporte(fuera, usuario_id=usuario_id)["reporte_id"]
+    guardado = db.reportes.find_one({"_id": ObjectId(reporte_id)})
+    assert (guardado["zona"], guardado["sector"]) == (None, None)
+
+    monkeypatch.setattr(server, "settings", replace(server.settings, rechazar_fuera_de_zonas=True))
+    with pytest.raises(server.HTTPException) as exc:
+        server.create_reporte(fuera, usuario_id=usuario_id)
+    assert exc.value.status_code == 400